@@ -0,0 +1,258 @@
+"""
+Controle de admissão das rotas caras (treinamento, cortes de despesas e chatbot).
+
+Cada rota protegida tem um limite de requisições simultâneas e uma fila de
+espera curta e limitada; além disso, cada cliente tem um balde de fichas
+(token bucket) por rota. Uma requisição acima da capacidade é recusada
+antes de qualquer trabalho:
+
+    429 Too Many Requests: o cliente excedeu sua taxa na rota
+    503 Service Unavailable: a rota está no limite e a fila está cheia (ou a
+        espera na fila esgotou)
+
+As duas respostas trazem Retry-After. Como as rotas caras nunca ocupam
+mais do que seus limites, as rotas baratas continuam com threads livres e
+baixa latência mesmo durante picos de análises ou retreinamentos. A
+profundidade das filas fica disponível em get_admission_stats
+(GET /api/admission/stats) e no cabeçalho X-Queue-Depth das recusas.
+
+Configuração (variáveis de ambiente):
+    ADMISSION_TRUST_PROXY: se '1', identifica o cliente pelo primeiro
+        endereço de X-Forwarded-For (use apenas atrás de um proxy confiável)
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request
+
+ADMISSION_TRUST_PROXY = os.environ.get('ADMISSION_TRUST_PROXY') == '1'
+
+# Limites por rota: simultâneas, fila de espera, espera máxima na fila
+# (segundos) e taxa por cliente (fichas por segundo e rajada)
+ADMISSION_LIMITS = {
+    'ml_train': {'concurrency': 1, 'queue': 0, 'queue_timeout': 0, 'rate': 1 / 60, 'burst': 2},
+    'expense_cuts': {'concurrency': 2, 'queue': 4, 'queue_timeout': 5, 'rate': 0.5, 'burst': 5},
+    'chatbot': {'concurrency': 8, 'queue': 16, 'queue_timeout': 10, 'rate': 1, 'burst': 10}
+}
+
+# Clientes com balde de fichas mantidos por rota (os menos recentes são descartados)
+MAX_TRACKED_CLIENTS = 10000
+
+# Peso da última duração na média móvel usada para estimar o Retry-After
+_DURATION_SMOOTHING = 0.2
+
+class Rejected(Exception):
+    """Requisição recusada pelo controle de admissão"""
+
+    def __init__(self, status, message, retry_after, queue_depth):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+        self.queue_depth = queue_depth
+
+    def headers(self):
+        return {'Retry-After': str(self.retry_after), 'X-Queue-Depth': str(self.queue_depth)}
+
+class TokenBucket:
+    """Baldes de fichas por cliente: `rate` fichas por segundo, acumulando até `burst`"""
+
+    def __init__(self, rate, burst, max_clients=MAX_TRACKED_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """
+        Consome uma ficha do cliente.
+
+        Returns:
+            0 se havia ficha; caso contrário, segundos até a próxima ficha
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+class RouteLimiter:
+    """
+    Limite de execuções simultâneas de uma rota com fila de espera limitada.
+    Mantém uma média móvel da duração das execuções para estimar o Retry-After.
+    """
+
+    def __init__(self, name, concurrency, queue, queue_timeout, rate, burst):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = queue
+        self.queue_timeout = queue_timeout
+        self.buckets = TokenBucket(rate, burst)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.rate_limited = 0
+        self.avg_duration = None
+        self._condition = threading.Condition()
+
+    def _retry_after(self):
+        # Tempo estimado até a fila atual ser atendida
+        duration = self.avg_duration or 1.0
+        return max(1, math.ceil(duration * (self.waiting + 1) / self.concurrency))
+
+    def check_rate(self, client):
+        """Aplica o balde de fichas do cliente (Rejected com 429 se esgotado)"""
+        wait = self.buckets.take(client)
+        if wait:
+            with self._condition:
+                self.rate_limited += 1
+                depth = self.waiting
+            raise Rejected(429, "Muitas requisições. Tente novamente em instantes.", max(1, math.ceil(wait)), depth)
+
+    def try_acquire(self):
+        """Ocupa uma vaga se houver uma livre, sem esperar"""
+        with self._condition:
+            if self.active < self.concurrency:
+                self.active += 1
+                self.admitted += 1
+                return True
+            return False
+
+    def acquire(self):
+        """
+        Ocupa uma vaga, esperando na fila por até queue_timeout segundos.
+
+        Raises:
+            Rejected: 503 se a fila está cheia ou a espera esgotou
+        """
+        with self._condition:
+            if self.active < self.concurrency:
+                self.active += 1
+                self.admitted += 1
+                return
+
+            if self.waiting >= self.max_queue:
+                self.shed += 1
+                raise Rejected(503, "Serviço ocupado. Tente novamente em instantes.", self._retry_after(), self.waiting)
+
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.queue_timeout
+                while self.active >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed += 1
+                        raise Rejected(503, "Serviço ocupado. Tente novamente em instantes.", self._retry_after(),
+                                       self.waiting)
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+            self.active += 1
+            self.admitted += 1
+
+    async def acquire_async(self):
+        """Versão para corrotinas de acquire (só ocupa um thread se precisar esperar na fila)"""
+        if self.try_acquire():
+            return
+        waiting = asyncio.ensure_future(asyncio.to_thread(self.acquire))
+        try:
+            await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            # A espera continua no thread: a vaga obtida depois é devolvida
+            waiting.add_done_callback(lambda future: future.cancelled() or future.exception() or self.release())
+            raise
+
+    def release(self, duration=None):
+        """Libera a vaga e registra a duração da execução"""
+        with self._condition:
+            self.active -= 1
+            if duration is not None:
+                if self.avg_duration is None:
+                    self.avg_duration = duration
+                else:
+                    self.avg_duration += _DURATION_SMOOTHING * (duration - self.avg_duration)
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'active': self.active,
+                'queue_depth': self.waiting,
+                'concurrency': self.concurrency,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'shed': self.shed,
+                'rate_limited': self.rate_limited,
+                'avg_duration_ms': round(self.avg_duration * 1000, 1) if self.avg_duration is not None else None
+            }
+
+# Limitadores compartilhados pelo processo
+limiters = {name: RouteLimiter(name, **limits) for name, limits in ADMISSION_LIMITS.items()}
+
+def get_admission_stats():
+    """Vagas ocupadas, profundidade da fila e contadores de cada rota protegida"""
+    return {name: limiter.stats() for name, limiter in limiters.items()}
+
+def get_client_key():
+    """Identifica o cliente da requisição Flask atual (endereço de origem)"""
+    if ADMISSION_TRUST_PROXY and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or 'unknown'
+
+def rejection_response(rejected):
+    """Resposta JSON de uma requisição recusada"""
+    response = jsonify({"error": rejected.message, "retry_after": rejected.retry_after})
+    response.status_code = rejected.status
+    response.headers.update(rejected.headers())
+    return response
+
+def admission_control(name):
+    """
+    Decorator de rotas caras: aplica a taxa por cliente e o limite de
+    execuções simultâneas de ADMISSION_LIMITS[name] antes de executar a
+    rota. Em respostas em streaming a vaga fica ocupada até o fim do envio.
+
+    Args:
+        name: Chave de ADMISSION_LIMITS
+    """
+    limiter = limiters[name]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                limiter.check_rate(get_client_key())
+                limiter.acquire()
+            except Rejected as rejected:
+                return rejection_response(rejected)
+
+            start = time.perf_counter()
+            try:
+                response = make_response(current_app.ensure_sync(view)(*args, **kwargs))
+            except BaseException:
+                limiter.release(time.perf_counter() - start)
+                raise
+
+            if response.is_streamed:
+                response.call_on_close(lambda: limiter.release(time.perf_counter() - start))
+            else:
+                limiter.release(time.perf_counter() - start)
+            return response
+        return wrapper
+    return decorator
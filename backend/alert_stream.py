@@ -0,0 +1,219 @@
+"""
+Entrega de alertas em tempo real (Server-Sent Events).
+
+Os alertas são publicados no processo, no momento em que são gravados
+(limites de categoria, gastos incomuns, importações), e distribuídos a
+todos os clientes conectados em /api/alerts/stream. Um cliente conectado
+não gera consultas: ele recebe os alertas não lidos ao conectar e, depois
+disso, apenas o que for publicado, além de um heartbeat periódico.
+
+Cada assinante tem uma fila limitada. Um cliente lento que deixa a fila
+encher perde os alertas acumulados e recebe um evento 'resync', indicando
+que deve recarregar a lista; a publicação nunca espera por um cliente.
+
+Os alertas só são publicados depois que a transação que os gravou é
+confirmada (defer_alert + flush_alerts), para que um cliente nunca receba
+um alerta desfeito por rollback.
+"""
+import asyncio
+import logging
+import threading
+from collections import deque
+
+# Eventos pendentes por assinante antes de descartar e pedir ressincronização
+MAX_PENDING_EVENTS = 100
+
+# Clientes conectados simultaneamente por processo
+MAX_SUBSCRIBERS = 200
+
+# Intervalo (segundos) entre heartbeats de uma conexão ociosa
+HEARTBEAT_SECONDS = 15
+
+# Alertas enviados na conexão (não lidos ou posteriores ao Last-Event-ID)
+INITIAL_ALERTS = 50
+
+class AlertSubscription:
+    """
+    Fila de eventos de um cliente conectado. Consumida por um thread
+    (wait) ou por uma corrotina (wait_async, se criada com um event loop).
+    """
+
+    def __init__(self, max_pending=MAX_PENDING_EVENTS, loop=None):
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._loop = loop
+        self._events = deque()
+        self._overflowed = False
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event() if loop is not None else threading.Event()
+
+    def push(self, alert):
+        """Enfileira um alerta sem bloquear (chamado pelo publicador, em qualquer thread)"""
+        with self._lock:
+            if len(self._events) >= self.max_pending:
+                # Cliente lento: a fila é descartada e o cliente recarrega a lista
+                self.dropped += len(self._events) + 1
+                self._events.clear()
+                self._overflowed = True
+            else:
+                self._events.append(alert)
+
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        else:
+            self._ready.set()
+
+    def _drain(self):
+        with self._lock:
+            events = list(self._events)
+            overflowed = self._overflowed
+            self._events.clear()
+            self._overflowed = False
+            self._ready.clear()
+        return events, overflowed
+
+    def wait(self, timeout=HEARTBEAT_SECONDS):
+        """
+        Aguarda eventos por até `timeout` segundos.
+
+        Returns:
+            Tupla (alertas recebidos, True se houve descarte por fila cheia);
+            ([], False) se o tempo esgotou
+        """
+        self._ready.wait(timeout)
+        return self._drain()
+
+    async def wait_async(self, timeout=HEARTBEAT_SECONDS):
+        """Versão para corrotinas de wait (a assinatura deve ter sido criada com o loop)"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._drain()
+
+class AlertBroker:
+    """Distribuição (pub/sub) dos alertas publicados para os assinantes do processo"""
+
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self, loop=None):
+        """
+        Registra um novo assinante.
+
+        Args:
+            loop: Event loop do consumidor, se ele for uma corrotina
+
+        Returns:
+            A AlertSubscription criada, ou None se o limite de assinantes foi atingido
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscription = AlertSubscription(loop=loop)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, alert):
+        """Entrega um alerta a todos os assinantes (não bloqueia em clientes lentos)"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published += 1
+
+        for subscription in subscribers:
+            try:
+                subscription.push(alert)
+            except RuntimeError:
+                # Event loop do assinante já encerrado
+                self.unsubscribe(subscription)
+
+    def get_stats(self):
+        """Assinantes conectados, alertas publicados e eventos descartados por fila cheia"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        return {
+            'subscribers': len(subscribers),
+            'published': self.published,
+            'dropped': sum(subscription.dropped for subscription in subscribers)
+        }
+
+# Instância compartilhada pelo processo
+alert_broker = AlertBroker()
+
+# Alertas gravados na transação em andamento de cada thread, publicados após o commit
+_pending = threading.local()
+
+def defer_alert(alert):
+    """Agenda a publicação de um alerta para depois do commit (flush_alerts)"""
+    if not hasattr(_pending, 'alerts'):
+        _pending.alerts = []
+    _pending.alerts.append({'is_read': False, **alert})
+
+def flush_alerts():
+    """Publica os alertas agendados pelo thread atual (chamar após o commit)"""
+    alerts = getattr(_pending, 'alerts', None)
+    if not alerts:
+        return
+    _pending.alerts = []
+    for alert in alerts:
+        try:
+            alert_broker.publish(alert)
+        except Exception as e:
+            logging.error(f"Erro ao publicar alerta: {str(e)}")
+
+def discard_alerts(keep=0):
+    """
+    Descarta os alertas agendados pelo thread atual (chamar após o rollback).
+
+    Args:
+        keep: Alertas agendados antes do savepoint desfeito, que são mantidos
+            (ver pending_alert_count)
+    """
+    _pending.alerts = getattr(_pending, 'alerts', [])[:keep]
+
+def pending_alert_count():
+    """Número de alertas agendados pelo thread atual e ainda não publicados"""
+    return len(getattr(_pending, 'alerts', ()))
+
+def get_initial_alerts(conn, last_event_id=None, limit=INITIAL_ALERTS):
+    """
+    Alertas enviados quando o cliente conecta: os posteriores ao último
+    recebido (reconexão com Last-Event-ID) ou, na primeira conexão, os não
+    lidos, em ordem de criação.
+    """
+    cursor = conn.cursor()
+    if last_event_id is not None:
+        cursor.execute('''
+            SELECT id, type, message, date, is_read FROM alerts
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (last_event_id, limit))
+    else:
+        cursor.execute('''
+            SELECT id, type, message, date, is_read FROM (
+                SELECT id, type, message, date, is_read FROM alerts
+                WHERE is_read = 0
+                ORDER BY id DESC
+                LIMIT ?
+            ) ORDER BY id
+        ''', (limit,))
+    return [{'id': alert_id, 'type': alert_type, 'message': message, 'date': date, 'is_read': bool(is_read)}
+            for alert_id, alert_type, message, date, is_read in cursor.fetchall()]
+
+def parse_last_event_id(value):
+    """Id do último alerta recebido pelo cliente (cabeçalho Last-Event-ID), ou None"""
+    if value and value.strip().isdigit():
+        return int(value.strip())
+    return None
@@ -0,0 +1,140 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+# Tabelas cujas escritas incrementam a versão dos dados (via triggers)
+VERSIONED_TABLES = ('transactions', 'category_limits', 'categories')
+
+# Número máximo de resultados mantidos em memória
+MAX_CACHE_ENTRIES = 128
+
+def init_data_versions(cursor, tables=VERSIONED_TABLES):
+    """
+    Cria a tabela de versões dos dados e os triggers que a incrementam a cada
+    INSERT, UPDATE ou DELETE nas tabelas monitoradas. Como a contagem fica no
+    banco, escritas de qualquer processo (ou script) invalidam os caches.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS data_versions (
+        scope TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    for table in tables:
+        cursor.execute('INSERT OR IGNORE INTO data_versions (scope) VALUES (?)', (table,))
+        for operation in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{operation.lower()}
+            AFTER {operation} ON {table}
+            BEGIN
+                UPDATE data_versions
+                SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE scope = '{table}';
+            END
+            ''')
+
+def get_data_versions(conn):
+    """Retorna as versões atuais dos dados por tabela ({scope: version})"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT scope, version FROM data_versions')
+    return {scope: version for scope, version in cursor.fetchall()}
+
+class AnalysisCache:
+    """Cache LRU em memória, com limite de entradas e métricas de acerto"""
+
+    def __init__(self, max_entries=MAX_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Retorna (True, valor) em caso de acerto ou (False, None)"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Métricas do cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+# Cache compartilhado pelas funções de análise do processo
+analysis_cache = AnalysisCache()
+
+def cached_analysis(scopes=VERSIONED_TABLES):
+    """
+    Decorator para funções de análise puras no formato f(conn, *args).
+
+    A chave combina a função, os argumentos, as versões das tabelas das quais
+    o resultado depende e o dia atual (as janelas de análise são relativas a
+    hoje). Qualquer escrita nessas tabelas muda a versão e invalida a entrada;
+    um acerto custa apenas a leitura das versões.
+
+    Os resultados em cache são compartilhados e devem ser tratados como
+    somente leitura pelos chamadores.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(conn, *args, **kwargs):
+            try:
+                versions = get_data_versions(conn)
+            except sqlite3.OperationalError:
+                # Banco ainda sem a tabela de versões: não há como invalidar, então não cachear
+                return func(conn, *args, **kwargs)
+
+            key = (
+                func.__name__,
+                args,
+                tuple(sorted(kwargs.items())),
+                tuple(versions.get(scope, 0) for scope in scopes),
+                datetime.now().strftime('%Y-%m-%d')
+            )
+
+            try:
+                hit, value = analysis_cache.get(key)
+            except TypeError:
+                # Argumentos não hasheáveis: calcular sem cache
+                return func(conn, *args, **kwargs)
+            if hit:
+                return value
+
+            value = func(conn, *args, **kwargs)
+            analysis_cache.put(key, value)
+            return value
+        return wrapper
+    return decorator
+
+def get_cache_stats():
+    """Métricas do cache de análises"""
+    return analysis_cache.stats()
@@ -0,0 +1,263 @@
+import json
+import math
+from datetime import datetime
+
+# Quantil acompanhado por categoria (despesas acima dele são candidatas a anomalia)
+ANOMALY_QUANTILE = 0.9
+
+# Desvios-padrão acima da média necessários para confirmar uma anomalia
+ANOMALY_Z_SCORE = 2.0
+
+# Número mínimo de despesas na categoria antes de sinalizar anomalias
+MIN_BASELINE = 10
+
+# Versão do cálculo das estatísticas: linhas gravadas por uma versão anterior
+# levam o init_db a recalcular tudo (e a remarcar transactions.is_anomaly)
+STATS_VERSION = 2
+
+class P2Quantile:
+    """
+    Estimador P² (Jain & Chlamtac) de um quantil em fluxo contínuo.
+
+    Mantém apenas cinco marcadores, então cada atualização é O(1) em tempo e
+    memória, independentemente do número de observações.
+    """
+
+    def __init__(self, p=ANOMALY_QUANTILE, state=None):
+        self.p = p
+        self.count = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+        if state:
+            self.count = state['count']
+            self.heights = state['heights']
+            self.positions = state['positions']
+            self.desired = state['desired']
+
+    def to_state(self):
+        """Estado serializável do estimador"""
+        return {
+            'count': self.count,
+            'heights': self.heights,
+            'positions': self.positions,
+            'desired': self.desired
+        }
+
+    def value(self):
+        """Estimativa atual do quantil (None se ainda não houver observações)"""
+        if not self.heights:
+            return None
+        if self.count < 5:
+            ordered = sorted(self.heights)
+            return ordered[min(len(ordered) - 1, int(math.ceil(self.p * len(ordered))) - 1)]
+        return self.heights[2]
+
+    def add(self, x):
+        """Incorpora uma nova observação ao estimador"""
+        self.count += 1
+
+        if self.count <= 5:
+            self.heights.append(x)
+            self.heights.sort()
+            return
+
+        q = self.heights
+        n = self.positions
+
+        # Encontrar a célula da observação, ajustando os extremos se necessário
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Ajustar os marcadores centrais com interpolação parabólica (ou linear)
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    q[i] = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+class CategoryStats:
+    """Média e variância (Welford) e quantil (P²) das despesas de uma categoria"""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, quantile_state=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.quantile = P2Quantile(state=quantile_state)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def is_anomaly(self, amount):
+        """Verifica se um valor é incomum em relação à linha de base atual"""
+        if self.count < MIN_BASELINE:
+            return False
+
+        threshold = self.quantile.value()
+        if threshold is None or amount <= threshold:
+            return False
+
+        std = self.std
+        return std > 0 and (amount - self.mean) / std >= ANOMALY_Z_SCORE
+
+    def add(self, amount):
+        """Atualiza as estatísticas com uma nova despesa em O(1) (algoritmo de Welford)"""
+        self.count += 1
+        delta = amount - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (amount - self.mean)
+        self.quantile.add(amount)
+
+def _category_key(category_id):
+    return str(category_id) if category_id is not None else 'none'
+
+def init_anomaly_tables(cursor):
+    """Cria a tabela de estatísticas por categoria, se não existir"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS category_stats (
+        category_key TEXT PRIMARY KEY,
+        count INTEGER NOT NULL,
+        mean REAL NOT NULL,
+        m2 REAL NOT NULL,
+        quantile_state TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        version INTEGER NOT NULL DEFAULT 1
+    )
+    ''')
+    # Tabelas criadas antes da coluna de versão
+    cursor.execute('PRAGMA table_info(category_stats)')
+    if 'version' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute('ALTER TABLE category_stats ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+
+def category_stats_outdated(cursor):
+    """Verifica se as estatísticas precisam ser recalculadas (ausentes ou de uma versão anterior)"""
+    cursor.execute('SELECT COUNT(*) FROM category_stats WHERE version = ?', (STATS_VERSION,))
+    return cursor.fetchone()[0] == 0
+
+def _load_stats(cursor, category_key):
+    cursor.execute('SELECT count, mean, m2, quantile_state FROM category_stats WHERE category_key = ?',
+                   (category_key,))
+    row = cursor.fetchone()
+    if not row:
+        return CategoryStats()
+    return CategoryStats(row[0], row[1], row[2], json.loads(row[3]))
+
+def _save_stats(cursor, category_key, stats):
+    cursor.execute('''
+        INSERT INTO category_stats (category_key, count, mean, m2, quantile_state, updated_at, version)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (category_key) DO UPDATE SET
+            count = excluded.count, mean = excluded.mean, m2 = excluded.m2,
+            quantile_state = excluded.quantile_state, updated_at = excluded.updated_at,
+            version = excluded.version
+    ''', (category_key, stats.count, stats.mean, stats.m2, json.dumps(stats.quantile.to_state()),
+          datetime.now().strftime('%Y-%m-%d %H:%M:%S'), STATS_VERSION))
+
+def rebuild_category_stats(conn):
+    """
+    Recalcula as estatísticas de todas as categorias a partir do histórico
+    completo de despesas e remarca transactions.is_anomaly (sem gerar alertas
+    para transações antigas).
+
+    Cada despesa é avaliada contra a linha de base anterior a ela, na ordem
+    de data, como se tivesse sido gravada por record_expense.
+
+    Returns:
+        Número de categorias com estatísticas
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, category_id, amount FROM transactions WHERE type = 'expense' ORDER BY date, id")
+
+    all_stats = {}
+    anomalies = []
+    for transaction_id, category_id, amount in cursor.fetchall():
+        stats = all_stats.setdefault(_category_key(category_id), CategoryStats())
+        if stats.is_anomaly(amount):
+            anomalies.append((transaction_id,))
+        stats.add(amount)
+
+    cursor.execute('UPDATE transactions SET is_anomaly = 0 WHERE is_anomaly != 0')
+    cursor.executemany('UPDATE transactions SET is_anomaly = 1 WHERE id = ?', anomalies)
+
+    cursor.execute('DELETE FROM category_stats')
+    for category_key, stats in all_stats.items():
+        _save_stats(cursor, category_key, stats)
+
+    conn.commit()
+    return len(all_stats)
+
+def record_expense(conn, transaction_id, category_id, amount, description):
+    """
+    Avalia uma nova despesa contra a linha de base da categoria e atualiza as
+    estatísticas em O(1). Despesas incomuns são marcadas em transactions.is_anomaly
+    e geram um alerta.
+
+    Args:
+        conn: Conexão com o banco de dados
+        transaction_id: Id da transação recém-gravada
+        category_id: Categoria da despesa
+        amount: Valor da despesa
+        description: Descrição da despesa (usada na mensagem do alerta)
+
+    Returns:
+        O alerta criado (dicionário) ou None se a despesa não for incomum
+    """
+    cursor = conn.cursor()
+    category_key = _category_key(category_id)
+    stats = _load_stats(cursor, category_key)
+
+    # A comparação usa a linha de base anterior à própria despesa
+    anomalous = stats.is_anomaly(amount)
+    baseline_mean = stats.mean
+
+    stats.add(amount)
+    _save_stats(cursor, category_key, stats)
+
+    if not anomalous:
+        return None
+
+    cursor.execute('UPDATE transactions SET is_anomaly = 1 WHERE id = ?', (transaction_id,))
+
+    category_name = 'Sem categoria'
+    if category_id is not None:
+        cursor.execute('SELECT name FROM categories WHERE id = ?', (category_id,))
+        row = cursor.fetchone()
+        if row:
+            category_name = row[0]
+
+    alert = {
+        'type': 'anomaly',
+        'message': (f"Gasto incomum em {category_name}: {description} (R$ {amount:.2f}), "
+                    f"acima da sua média de R$ {baseline_mean:.2f} na categoria"),
+        'date': datetime.now().strftime('%Y-%m-%d')
+    }
+    cursor.execute('INSERT INTO alerts (type, message, date) VALUES (?, ?, ?)',
+                   (alert['type'], alert['message'], alert['date']))
+    alert['id'] = cursor.lastrowid
+    return alert
@@ -1,36 +1,80 @@
-from flask import Flask, request, jsonify, g
+from flask import Flask, Response, request, jsonify, g, stream_with_context, url_for
 from flask_cors import CORS
 import logging
 import json
 import asyncio
-from db import get_db_connection, close_db_connection, analyze_financial_situation
-from finance_agent import get_financial_agent
+from logging_setup import setup_logging, init_request_logging
+from db import init_db, get_db_connection, close_db_connection, analyze_financial_situation, insert_transaction, run_with_connection
+from finance_agent import get_financial_agent, evict_financial_agent, agent_cache, resolve_session_id
+from recurring_detector import get_recurring_series, get_upcoming_recurring, MAX_FORECAST_DAYS
+from analysis_cache import get_cache_stats
+from llm_cache import llm_cache
+from intent_router import route_message
+from chat_actions import respond_with_actions, submit_chat_actions, collect_chat_actions
+from time_index import get_window_summary, get_rolling_comparison, MAX_ROLLING_WINDOW_DAYS, MAX_ROLLING_PERIODS
+from http_cache import conditional_get
+from serialization import init_serialization, dumps, dumps_bytes
+from dashboard import build_dashboard, DASHBOARD_FIELDS, RECENT_TRANSACTIONS
+from transaction_query import parse_filters, list_transactions, iter_transactions
+from alert_stream import alert_broker, get_initial_alerts, parse_last_event_id, HEARTBEAT_SECONDS
+from admission import admission_control, get_admission_stats
+from ml_prediction import train_prediction_models, get_models_version
+from metrics import init_metrics, register_collector
+from sync_feed import get_changes, parse_sync_token, apply_transaction_batch, DEFAULT_SYNC_PAGE, MAX_SYNC_PAGE, MAX_SYNC_BATCH
 
-# Configuração de logging
-logging.basicConfig(
-    filename='financial_agent.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configuração de logging (registros em JSON gravados por um thread dedicado)
+setup_logging()
 
 app = Flask(__name__)
-CORS(app)
+# Cabeçalhos de paginação, rastreio e admissão legíveis pelo frontend
+# Cabeçalhos de resposta legíveis pelo frontend (também enviados pelas rotas nativas do asgi.py)
+CORS_EXPOSE_HEADERS = ['X-Next-Cursor', 'Link', 'X-Request-Id', 'Retry-After', 'X-Queue-Depth', 'X-Session-Id']
+CORS(app, expose_headers=CORS_EXPOSE_HEADERS)
+init_request_logging(app)
+
+# Métricas por rota e GET /metrics (formato do Prometheus)
+init_metrics(app)
+
+# Serialização JSON rápida (orjson) e compressão das respostas grandes
+init_serialization(app)
+
+# Criar/migrar tabelas (inclui a classificação de comerciante das transações)
+init_db()
 
 # Registrar função para fechar conexão com banco de dados
 app.teardown_appcontext(close_db_connection)
 
+def get_session_id():
+    """
+    Identifica a sessão do agente (cabeçalho X-Session-Id ou parâmetro session_id).
+    Sem identificação, uma sessão nova é criada e devolvida no cabeçalho
+    X-Session-Id da resposta, para o cliente reenviá-la nas próximas requisições.
+    """
+    if 'session_id' not in g:
+        g.session_id = resolve_session_id(request.headers.get('X-Session-Id') or request.args.get('session_id'))
+    return g.session_id
+
+@app.after_request
+def add_session_header(response):
+    """Devolve ao cliente a sessão do agente usada na requisição"""
+    if 'session_id' in g:
+        response.headers['X-Session-Id'] = g.session_id
+    return response
+
 @app.route('/api/finance-agent/insights', methods=['GET'])
+@conditional_get('transactions', 'categories', 'category_limits', 'savings_goals', 'investment_suggestions',
+                 period='month')
 def get_insights():
     """Retorna insights financeiros do agente inteligente"""
     try:
         # Obter conexão com o banco de dados
         db_conn = get_db_connection()
         
-        # Inicializar o agente financeiro
-        agent = get_financial_agent(db_conn)
+        # Obter o agente financeiro da sessão
+        agent = get_financial_agent(db_conn, get_session_id())
         
         # Obter insights
-        insights = agent.get_financial_insights()
+        insights = agent.get_financial_insights(db_conn)
         
         return jsonify(insights)
     except Exception as e:
@@ -38,17 +82,15 @@ def get_insights():
         return jsonify({"error": "Erro ao processar insights financeiros"}), 500
 
 @app.route('/api/finance-agent/preferences', methods=['GET'])
+@conditional_get('user_preferences')
 def get_preferences():
     """Retorna preferências do usuário"""
     try:
         # Obter conexão com o banco de dados
         db_conn = get_db_connection()
         
-        # Inicializar o agente financeiro
-        agent = get_financial_agent(db_conn)
-        
-        # Carregar preferências (isso garante que serão carregadas do banco de dados)
-        agent.load_user_preferences()
+        # Obter o agente financeiro da sessão
+        agent = get_financial_agent(db_conn, get_session_id())
         
         return jsonify(agent.user_preferences)
     except Exception as e:
@@ -67,12 +109,11 @@ def save_preferences():
         # Obter conexão com o banco de dados
         db_conn = get_db_connection()
         
-        # Inicializar o agente financeiro
-        agent = get_financial_agent(db_conn)
+        # Obter o agente financeiro da sessão
+        agent = get_financial_agent(db_conn, get_session_id())
         
-        # Salvar cada preferência
-        for key, value in data.items():
-            agent.save_preference(key, value)
+        # Salvar todas as preferências em uma única transação
+        agent.save_preferences(db_conn, data)
         
         return jsonify({"success": True, "message": "Preferências salvas com sucesso"})
     except Exception as e:
@@ -80,6 +121,7 @@ def save_preferences():
         return jsonify({"error": "Erro ao salvar preferências do usuário"}), 500
 
 @app.route('/api/finance-agent/chatbot', methods=['POST'])
+@admission_control('chatbot')
 async def chatbot():
     """Processa mensagens para o chatbot inteligente"""
     try:
@@ -90,83 +132,157 @@ async def chatbot():
             
         user_message = data['message']
         
-        # Obter conexão com o banco de dados
-        db_conn = get_db_connection()
+        # Obter o agente financeiro da sessão. A view assíncrona roda no
+        # thread do event loop, então as leituras usam uma conexão própria em
+        # outro thread (não a conexão da requisição)
+        agent = await asyncio.to_thread(run_with_connection, get_financial_agent, get_session_id())
         
-        # Inicializar o agente financeiro
-        agent = get_financial_agent(db_conn)
+        # Obter a resposta do modelo e executar as análises disparadas pela
+        # mensagem ao mesmo tempo (cada uma com seu próprio prazo)
+        route = route_message(user_message)
+        response, actions, partial = await respond_with_actions(agent, user_message, route)
         
-        # Obter resposta do agente (função assíncrona)
-        response = await agent.get_ai_response(user_message)
-        
-        # Extrair possíveis comandos ou ações a serem executados
-        # (Essa parte pode ser expandida no futuro para executar ações baseadas no chat)
-        actions = []
-        if "economizar" in user_message.lower() or "economia" in user_message.lower():
-            try:
-                savings_recommendations = agent.suggest_expense_cuts()
-                if savings_recommendations:
-                    actions.append({
-                        "type": "savings_recommendation",
-                        "data": savings_recommendations
-                    })
-            except Exception as e:
-                logging.error(f"Erro ao gerar recomendações de economia: {str(e)}")
-        
-        if "investir" in user_message.lower() or "investimento" in user_message.lower():
-            try:
-                investment_recommendation = agent.get_investment_recommendation()
-                if investment_recommendation:
-                    actions.append({
-                        "type": "investment_recommendation",
-                        "data": investment_recommendation
-                    })
-            except Exception as e:
-                logging.error(f"Erro ao gerar recomendações de investimento: {str(e)}")
-        
-        # Verificar se o usuário informou seu nome
-        name_indicators = [
-            "meu nome é ", "me chamo ", "sou o ", "sou a ", 
-            "pode me chamar de ", "me chame de "
-        ]
-        
-        for indicator in name_indicators:
-            if indicator in user_message.lower():
-                message_lower = user_message.lower()
-                name_start = message_lower.find(indicator) + len(indicator)
-                name_end = message_lower.find(" ", name_start)
-                if name_end == -1:  # Nome é a última palavra da mensagem
-                    name_end = len(message_lower)
-                    
-                name = user_message[name_start:name_end].strip()
-                if name and len(name) > 1:  # Nome deve ter pelo menos 2 caracteres
-                    agent.save_preference('user_name', name.capitalize())
-                    actions.append({
-                        "type": "user_name_updated",
-                        "data": {"name": name.capitalize()}
-                    })
-        
-        return jsonify({
+        result = {
             "response": response,
             "actions": actions
-        })
+        }
+        if partial:
+            result["partial"] = True
+        return jsonify(result)
         
     except Exception as e:
         logging.error(f"Erro no chatbot: {str(e)}")
         return jsonify({"error": "Erro ao processar mensagem", "response": "Desculpe, tive um problema ao processar sua mensagem. Por favor, tente novamente."}), 500
 
+def iterate_async(async_gen):
+    """Consome um gerador assíncrono a partir de código síncrono (respostas em streaming do Flask)"""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(async_gen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(async_gen.aclose())
+        loop.close()
+
+def sse_event(event, data, event_id=None):
+    """Formata um evento Server-Sent Events com dados em JSON (e id, se informado)"""
+    if event_id is not None:
+        return f"id: {event_id}\nevent: {event}\ndata: {dumps(data)}\n\n"
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+# Comentário SSE enviado às conexões ociosas (mantém proxies abertos e detecta clientes desconectados)
+SSE_HEARTBEAT = ": heartbeat\n\n"
+
+@app.route('/api/finance-agent/chatbot/stream', methods=['POST'])
+@admission_control('chatbot')
+def chatbot_stream():
+    """
+    Versão em streaming do chatbot (Server-Sent Events): envia os trechos da
+    resposta à medida que o modelo os gera (eventos 'token'), depois as ações
+    disparadas pela mensagem (evento 'actions') e por fim o evento 'done'.
+    """
+    data = request.get_json(silent=True)
+    
+    if not data or 'message' not in data:
+        return jsonify({"error": "Mensagem não fornecida"}), 400
+    
+    user_message = data['message']
+    session_id = get_session_id()
+    
+    def generate():
+        try:
+            # Obter conexão com o banco de dados
+            db_conn = get_db_connection()
+            
+            # Obter o agente financeiro da sessão
+            agent = get_financial_agent(db_conn, session_id)
+            
+            # As análises rodam em paralelo enquanto os trechos da resposta são enviados
+            route = route_message(user_message)
+            jobs = submit_chat_actions(agent, route)
+            
+            for text in iterate_async(agent.stream_ai_response(user_message)):
+                yield sse_event('token', {"text": text})
+            
+            actions, partial = collect_chat_actions(agent, route, jobs)
+            yield sse_event('actions', actions)
+            yield sse_event('done', {"partial": partial})
+        except Exception as e:
+            logging.error(f"Erro no chatbot (streaming): {str(e)}")
+            yield sse_event('error', {"response": "Desculpe, tive um problema ao processar sua mensagem. Por favor, tente novamente."})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/alerts/stream', methods=['GET'])
+def alerts_stream():
+    """
+    Canal de alertas em tempo real (Server-Sent Events). Na conexão são
+    enviados os alertas não lidos (ou, na reconexão, os posteriores ao
+    Last-Event-ID); depois, cada alerta criado é enviado como evento 'alert',
+    sem consultas ao banco. O evento 'resync' pede que o cliente recarregue a
+    lista (fila do cliente cheia) e heartbeats mantêm a conexão ativa.
+    """
+    subscription = None
+    try:
+        last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+        
+        subscription = alert_broker.subscribe()
+        if subscription is None:
+            response = jsonify({"error": "Limite de conexões de alertas atingido"})
+            response.headers['Retry-After'] = str(HEARTBEAT_SECONDS)
+            return response, 503
+        
+        # Os alertas iniciais são lidos depois da assinatura: nenhum alerta criado entre os dois se perde
+        db_conn = get_db_connection()
+        initial = get_initial_alerts(db_conn, last_event_id)
+    except Exception as e:
+        if subscription is not None:
+            alert_broker.unsubscribe(subscription)
+        logging.error(f"Erro ao abrir o canal de alertas: {str(e)}")
+        return jsonify({"error": "Erro ao abrir o canal de alertas"}), 500
+    
+    def generate():
+        sent = 0
+        for alert in initial:
+            sent = max(sent, alert['id'])
+            yield sse_event('alert', alert, alert['id'])
+        yield sse_event('ready', {"subscribers": alert_broker.subscriber_count})
+        
+        while True:
+            alerts, overflowed = subscription.wait(HEARTBEAT_SECONDS)
+            if overflowed:
+                yield sse_event('resync', {"reason": "overflow"})
+            for alert in alerts:
+                # Alertas já enviados na carga inicial não se repetem
+                if alert['id'] > sent:
+                    yield sse_event('alert', alert, alert['id'])
+            if not alerts and not overflowed:
+                yield SSE_HEARTBEAT
+    
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Chamado quando o servidor encerra a resposta, inclusive se o cliente desconectar antes do primeiro evento
+    response.call_on_close(lambda: alert_broker.unsubscribe(subscription))
+    return response
+
 @app.route('/api/finance-agent/alerts', methods=['GET'])
+@conditional_get('transactions', 'categories', 'category_limits', 'savings_goals', 'alerts', 'user_preferences',
+                 period='day')
 def get_alerts():
     """Retorna alertas financeiros personalizados"""
     try:
         # Obter conexão com o banco de dados
         db_conn = get_db_connection()
         
-        # Inicializar o agente financeiro
-        agent = get_financial_agent(db_conn)
+        # Obter o agente financeiro da sessão
+        agent = get_financial_agent(db_conn, get_session_id())
         
         # Obter alerta personalizado
-        alert = agent.get_personalized_alert()
+        alert = agent.get_personalized_alert(db_conn)
         
         return jsonify(alert)
     except Exception as e:
@@ -174,6 +290,7 @@ def get_alerts():
         return jsonify({"error": "Erro ao processar alertas financeiros"}), 500
 
 @app.route('/api/finance-agent/expense-cuts', methods=['GET'])
+@admission_control('expense_cuts')
 def get_expense_cuts():
     """Retorna sugestões de corte de despesas"""
     try:
@@ -181,33 +298,65 @@ def get_expense_cuts():
         savings_target = request.args.get('target')
         if savings_target:
             savings_target = float(savings_target)
+        
+        # Várias metas (ex.: ?targets=100,200,300) são respondidas a partir
+        # de uma única fronteira de economia
+        targets = request.args.get('targets')
+        if targets:
+            targets = [float(t) for t in targets.split(',') if t.strip()]
             
         # Obter conexão com o banco de dados
         db_conn = get_db_connection()
         
-        # Inicializar o agente financeiro
-        agent = get_financial_agent(db_conn)
+        # Obter o agente financeiro da sessão
+        agent = get_financial_agent(db_conn, get_session_id())
+        
+        if targets:
+            frontier = agent.get_savings_frontier(db_conn)
+            if frontier["status"] != "success":
+                return jsonify(frontier)
+            
+            plans = [agent.suggest_expense_cuts(db_conn, target, frontier=frontier) for target in targets]
+            return jsonify({"status": "success", "plans": plans})
         
         # Obter sugestões de corte
-        cuts = agent.suggest_expense_cuts(savings_target)
+        cuts = agent.suggest_expense_cuts(db_conn, savings_target)
         
         return jsonify(cuts)
+    except ValueError:
+        return jsonify({"error": "Meta de economia inválida"}), 400
     except Exception as e:
         logging.error(f"Erro ao obter sugestões de corte: {str(e)}")
         return jsonify({"error": "Erro ao processar sugestões de corte de despesas"}), 500
 
+@app.route('/api/finance-agent/savings-frontier', methods=['GET'])
+def get_savings_frontier_route():
+    """Retorna a fronteira de economia completa (segmentos e tetos por categoria)"""
+    try:
+        # Obter conexão com o banco de dados
+        db_conn = get_db_connection()
+        
+        # Obter o agente financeiro da sessão
+        agent = get_financial_agent(db_conn, get_session_id())
+        
+        return jsonify(agent.get_savings_frontier(db_conn))
+    except Exception as e:
+        logging.error(f"Erro ao obter fronteira de economia: {str(e)}")
+        return jsonify({"error": "Erro ao processar fronteira de economia"}), 500
+
 @app.route('/api/finance-agent/investments', methods=['GET'])
+@conditional_get('transactions', 'investment_suggestions', 'user_preferences', period='month')
 def get_investments():
     """Retorna recomendações de investimento"""
     try:
         # Obter conexão com o banco de dados
         db_conn = get_db_connection()
         
-        # Inicializar o agente financeiro
-        agent = get_financial_agent(db_conn)
+        # Obter o agente financeiro da sessão
+        agent = get_financial_agent(db_conn, get_session_id())
         
         # Obter recomendações de investimento
-        recommendations = agent.get_investment_recommendation()
+        recommendations = agent.get_investment_recommendation(db_conn)
         
         return jsonify(recommendations)
     except Exception as e:
@@ -215,22 +364,316 @@ def get_investments():
         return jsonify({"error": "Erro ao processar recomendações de investimento"}), 500
 
 @app.route('/api/finance-agent/goals', methods=['GET'])
+@conditional_get('savings_goals')
 def get_goals():
     """Retorna progresso das metas financeiras"""
     try:
         # Obter conexão com o banco de dados
         db_conn = get_db_connection()
         
-        # Inicializar o agente financeiro
-        agent = get_financial_agent(db_conn)
+        # Obter o agente financeiro da sessão
+        agent = get_financial_agent(db_conn, get_session_id())
         
         # Obter progresso das metas
-        goals = agent.get_financial_goals_progress()
+        goals = agent.get_financial_goals_progress(db_conn)
         
         return jsonify(goals)
     except Exception as e:
         logging.error(f"Erro ao obter progresso das metas: {str(e)}")
         return jsonify({"error": "Erro ao processar progresso das metas financeiras"}), 500
 
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    """
+    Retorna os dados do painel (resumo, transações recentes, alertas, metas e
+    previsões) em uma única resposta. O parâmetro fields (ex.: ?fields=summary,alerts)
+    seleciona os blocos.
+    """
+    try:
+        fields = request.args.get('fields')
+        if fields:
+            fields = [field.strip() for field in fields.split(',') if field.strip()]
+            invalid = [field for field in fields if field not in DASHBOARD_FIELDS]
+            if invalid:
+                return jsonify({"error": f"Campos inválidos: {', '.join(invalid)}",
+                                "available_fields": list(DASHBOARD_FIELDS)}), 400
+        
+        limit = int(request.args.get('limit', RECENT_TRANSACTIONS))
+        if limit <= 0:
+            return jsonify({"error": "Parâmetro 'limit' deve ser positivo"}), 400
+        
+        # Obter conexão com o banco de dados
+        db_conn = get_db_connection()
+        
+        return jsonify(build_dashboard(db_conn, fields, limit))
+    except ValueError:
+        return jsonify({"error": "Parâmetro 'limit' inválido"}), 400
+    except Exception as e:
+        logging.error(f"Erro ao obter dados do painel: {str(e)}")
+        return jsonify({"error": "Erro ao processar dados do painel"}), 500
+
+def transaction_listing(source):
+    """
+    Listagem paginada (keyset) de transações: o corpo é a lista da página e o
+    cursor da próxima vem nos cabeçalhos X-Next-Cursor e Link. Com
+    format=ndjson (ou Accept: application/x-ndjson), todas as linhas que
+    atendem aos filtros são enviadas em streaming, uma por linha.
+    """
+    filters = parse_filters(request.args, source)
+    
+    ndjson = (request.args.get('format') == 'ndjson' or
+              request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson')
+    if ndjson:
+        def generate():
+            # A conexão é obtida no gerador: a da requisição é fechada quando a rota retorna
+            db_conn = get_db_connection()
+            for row in iter_transactions(db_conn, filters, source):
+                yield dumps_bytes(row) + b'\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    # Obter conexão com o banco de dados
+    db_conn = get_db_connection()
+    
+    rows, next_cursor = list_transactions(db_conn, filters, source)
+    response = jsonify(rows)
+    if next_cursor:
+        next_url = url_for(request.endpoint, **{**request.args.to_dict(), 'cursor': next_cursor})
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+@app.route('/api/transactions', methods=['GET'])
+def get_transactions():
+    """Lista as transações com filtros e paginação por cursor"""
+    try:
+        return transaction_listing('transactions')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Erro ao listar transações: {str(e)}")
+        return jsonify({"error": "Erro ao listar transações"}), 500
+
+@app.route('/api/bank-transactions', methods=['GET'])
+def get_bank_transactions():
+    """Lista as transações bancárias (filtro por conta) com paginação por cursor"""
+    try:
+        return transaction_listing('bank_transactions')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Erro ao listar transações bancárias: {str(e)}")
+        return jsonify({"error": "Erro ao listar transações bancárias"}), 500
+
+@app.route('/api/sync', methods=['GET'])
+def get_sync_changes():
+    """
+    Feed de alterações para os clientes móveis: inserções, atualizações e
+    exclusões desde o token 'since' (sem token, todo o conteúdo atual). O
+    cliente guarda o 'sync_token' retornado e repete enquanto 'has_more'.
+    """
+    try:
+        since = parse_sync_token(request.args.get('since'))
+        limit = request.args.get('limit', DEFAULT_SYNC_PAGE, type=int)
+        if limit <= 0:
+            return jsonify({"error": "Parâmetro 'limit' deve ser positivo"}), 400
+        
+        # Obter conexão com o banco de dados
+        db_conn = get_db_connection()
+        
+        return jsonify(get_changes(db_conn, since, min(limit, MAX_SYNC_PAGE)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Erro ao obter alterações para sincronização: {str(e)}")
+        return jsonify({"error": "Erro ao processar sincronização"}), 500
+
+@app.route('/api/sync/transactions', methods=['POST'])
+def post_sync_transactions():
+    """
+    Recebe em lote as transações criadas offline. Cada item tem uma
+    'idempotency_key': reenviar o mesmo lote não duplica transações.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        items = data.get('transactions')
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Envie uma lista não vazia em 'transactions'"}), 400
+        if len(items) > MAX_SYNC_BATCH:
+            return jsonify({"error": f"Lote acima do limite de {MAX_SYNC_BATCH} transações"}), 400
+        
+        # Obter conexão com o banco de dados
+        db_conn = get_db_connection()
+        
+        results = apply_transaction_batch(db_conn, items, insert_transaction)
+        
+        # As transações criadas chegam ao cliente pelo próximo GET /api/sync
+        return jsonify({"results": results})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Erro ao gravar transações sincronizadas: {str(e)}")
+        return jsonify({"error": "Erro ao gravar transações"}), 500
+
+@app.route('/api/recurring', methods=['GET'])
+def get_recurring():
+    """Retorna as séries de transações recorrentes detectadas (auditoria de assinaturas)"""
+    try:
+        period = request.args.get('period')
+        transaction_type = request.args.get('type')
+        subscriptions_only = request.args.get('subscriptions', '').lower() in ('1', 'true', 'yes')
+        
+        # Obter conexão com o banco de dados
+        db_conn = get_db_connection()
+        
+        series = get_recurring_series(db_conn, period=period, subscriptions_only=subscriptions_only,
+                                      type=transaction_type)
+        
+        return jsonify(series)
+    except Exception as e:
+        logging.error(f"Erro ao obter transações recorrentes: {str(e)}")
+        return jsonify({"error": "Erro ao processar transações recorrentes"}), 500
+
+@app.route('/api/recurring/upcoming', methods=['GET'])
+def get_recurring_upcoming():
+    """Retorna a previsão de fluxo de caixa a partir das séries recorrentes"""
+    try:
+        days = int(request.args.get('days', 30))
+        # O custo da projeção cresce com o horizonte: limitado a MAX_FORECAST_DAYS
+        days = max(1, min(days, MAX_FORECAST_DAYS))
+        
+        # Obter conexão com o banco de dados
+        db_conn = get_db_connection()
+        
+        forecast = get_upcoming_recurring(db_conn, days=days)
+        
+        return jsonify(forecast)
+    except ValueError:
+        return jsonify({"error": "Parâmetro 'days' inválido"}), 400
+    except Exception as e:
+        logging.error(f"Erro ao obter previsão de recorrentes: {str(e)}")
+        return jsonify({"error": "Erro ao processar previsão de transações recorrentes"}), 500
+
+@app.route('/api/analysis/window', methods=['GET'])
+def get_analysis_window():
+    """Retorna totais, contagens e médias por categoria em um intervalo [start, end)"""
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        transaction_type = request.args.get('type', 'expense')
+        
+        if not start or not end:
+            return jsonify({"error": "Parâmetros 'start' e 'end' são obrigatórios"}), 400
+        
+        # Obter conexão com o banco de dados
+        db_conn = get_db_connection()
+        
+        return jsonify(get_window_summary(db_conn, start, end, transaction_type))
+    except ValueError:
+        return jsonify({"error": "Datas inválidas. Use o formato YYYY-MM-DD"}), 400
+    except Exception as e:
+        logging.error(f"Erro ao obter resumo do período: {str(e)}")
+        return jsonify({"error": "Erro ao processar resumo do período"}), 500
+
+@app.route('/api/analysis/rolling', methods=['GET'])
+def get_analysis_rolling():
+    """Compara janelas consecutivas de mesmo tamanho (ex.: últimos 6 períodos de 30 dias)"""
+    try:
+        window_days = int(request.args.get('window', 30))
+        periods = int(request.args.get('periods', 6))
+        end = request.args.get('end')
+        transaction_type = request.args.get('type', 'expense')
+        
+        if window_days <= 0 or periods <= 0:
+            return jsonify({"error": "Parâmetros 'window' e 'periods' devem ser positivos"}), 400
+        # O custo cresce com o número de janelas: ambos limitados
+        window_days = min(window_days, MAX_ROLLING_WINDOW_DAYS)
+        periods = min(periods, MAX_ROLLING_PERIODS)
+        
+        # Obter conexão com o banco de dados
+        db_conn = get_db_connection()
+        
+        return jsonify(get_rolling_comparison(db_conn, window_days, periods, end, transaction_type))
+    except (ValueError, OverflowError):
+        # OverflowError: janelas antes do ano 1 (ex.: 'end' muito antigo)
+        return jsonify({"error": "Parâmetros inválidos"}), 400
+    except Exception as e:
+        logging.error(f"Erro ao obter comparação de períodos: {str(e)}")
+        return jsonify({"error": "Erro ao processar comparação de períodos"}), 500
+
+@app.route('/api/finance-agent/session', methods=['DELETE'])
+def end_agent_session():
+    """Encerra a sessão do agente, descartando o histórico da conversa"""
+    evicted = evict_financial_agent(get_session_id())
+    return jsonify({"success": True, "evicted": evicted})
+
+@app.route('/api/ml/train', methods=['POST'])
+@admission_control('ml_train')
+def train_models():
+    """Retreina os modelos de previsão de despesas com o histórico atual"""
+    try:
+        # Obter conexão com o banco de dados
+        db_conn = get_db_connection()
+        
+        models_trained = train_prediction_models(db_conn, force_retrain=True)
+        
+        return jsonify({
+            "success": True,
+            "models_trained": models_trained,
+            "models_version": get_models_version()
+        })
+    except Exception as e:
+        logging.error(f"Erro ao treinar modelos: {str(e)}")
+        return jsonify({"error": "Erro ao treinar modelos de previsão"}), 500
+
+@app.route('/api/admission/stats', methods=['GET'])
+def admission_stats():
+    """Retorna vagas ocupadas, profundidade das filas e recusas das rotas com controle de admissão"""
+    return jsonify(get_admission_stats())
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Retorna as métricas dos caches (análises, sessões do agente e respostas do modelo)"""
+    try:
+        db_conn = get_db_connection()
+        return jsonify({
+            "analysis": get_cache_stats(),
+            "agents": agent_cache.stats(),
+            "llm": llm_cache.stats(db_conn)
+        })
+    except Exception as e:
+        logging.error(f"Erro ao obter métricas dos caches: {str(e)}")
+        return jsonify({"error": "Erro ao obter métricas dos caches"}), 500
+
+@register_collector
+def collect_app_metrics():
+    """Acertos dos caches, filas de admissão e clientes do canal de alertas, lidos na coleta de /metrics"""
+    caches = {
+        'analysis': get_cache_stats(),
+        'agents': agent_cache.stats(),
+        'llm': llm_cache.stats()
+    }
+    admission = get_admission_stats()
+    alerts = alert_broker.get_stats()
+    return [
+        ('cache_hits_total', 'counter', 'Acertos dos caches',
+         [({'cache': name}, stats['hits']) for name, stats in caches.items()]),
+        ('cache_misses_total', 'counter', 'Falhas dos caches',
+         [({'cache': name}, stats['misses']) for name, stats in caches.items()]),
+        ('cache_hit_ratio', 'gauge', 'Proporção de acertos dos caches desde o início do processo',
+         [({'cache': name}, stats['hit_rate']) for name, stats in caches.items()]),
+        ('admission_active', 'gauge', 'Requisições em execução nas rotas com controle de admissão',
+         [({'route': name}, stats['active']) for name, stats in admission.items()]),
+        ('admission_queue_depth', 'gauge', 'Requisições aguardando vaga nas rotas com controle de admissão',
+         [({'route': name}, stats['queue_depth']) for name, stats in admission.items()]),
+        ('admission_rejected_total', 'counter', 'Requisições recusadas pelo controle de admissão',
+         [({'route': name, 'reason': reason}, stats[key]) for name, stats in admission.items()
+          for reason, key in (('overloaded', 'shed'), ('rate_limited', 'rate_limited'))]),
+        ('alert_stream_subscribers', 'gauge', 'Clientes conectados ao canal de alertas',
+         [({}, alerts['subscribers'])]),
+        ('alert_stream_published_total', 'counter', 'Alertas publicados no canal de alertas',
+         [({}, alerts['published'])])
+    ]
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
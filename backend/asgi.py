@@ -0,0 +1,466 @@
+"""
+Modo de produção ASGI da API.
+
+As rotas do chatbot e o canal de alertas (SSE) rodam nativamente em um event
+loop de longa duração: uma conversa aguardando o modelo de linguagem ou um
+cliente conectado aguardando alertas ocupa apenas uma corrotina, e não um
+thread. As demais rotas continuam sendo o app Flask (WSGI), executado em um
+pool de threads de tamanho fixo; o contrato de /api/finance-agent/* é o mesmo
+do servidor de desenvolvimento (python app.py).
+
+Uso:
+    python asgi.py
+    # ou: uvicorn asgi:application --workers 2
+
+Configuração (variáveis de ambiente):
+    ASGI_HOST, ASGI_PORT: endereço do servidor (padrão 127.0.0.1:5000)
+    ASGI_WORKERS: processos servidores (padrão 1). Sessões do agente ficam na
+        memória de cada processo; com mais de um, use afinidade de sessão no
+        balanceador (o resumo da conversa é recuperado do banco de qualquer forma)
+    ASGI_WSGI_THREADS: threads por processo para as rotas Flask (padrão 16)
+    ASGI_LIMIT_CONCURRENCY: conexões simultâneas por processo antes de
+        responder 503 (padrão: sem limite)
+    ASGI_KEEPALIVE: segundos de keep-alive de conexões ociosas (padrão 5)
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from urllib.parse import parse_qs
+
+from app import app, sse_event, SSE_HEARTBEAT, CORS_EXPOSE_HEADERS
+from alert_stream import alert_broker, get_initial_alerts, parse_last_event_id, HEARTBEAT_SECONDS
+from db import run_with_connection
+from finance_agent import get_financial_agent, resolve_session_id
+from intent_router import route_message
+from chat_actions import chat_executor, respond_with_actions, submit_chat_actions, await_chat_actions
+from chat_memory import message_writer
+from logging_setup import start_request_context, clear_request_context, log_access, stop_logging
+from serialization import dumps_bytes, loads
+from admission import limiters, Rejected, ADMISSION_TRUST_PROXY
+from metrics import start_request, finish_request
+
+ASGI_HOST = os.environ.get('ASGI_HOST', '127.0.0.1')
+ASGI_PORT = int(os.environ.get('ASGI_PORT', 5000))
+ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', 1))
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 16))
+ASGI_LIMIT_CONCURRENCY = int(os.environ['ASGI_LIMIT_CONCURRENCY']) if os.environ.get('ASGI_LIMIT_CONCURRENCY') else None
+ASGI_KEEPALIVE = int(os.environ.get('ASGI_KEEPALIVE', 5))
+
+# Tamanho máximo do corpo aceito pelas rotas nativas
+MAX_BODY_BYTES = 1024 * 1024
+
+CHAT_ERROR_MESSAGE = "Desculpe, tive um problema ao processar sua mensagem. Por favor, tente novamente."
+
+# Corpo das requisições Flask mantido em memória até este tamanho (acima dele, em arquivo temporário)
+WSGI_BODY_SPOOL_BYTES = 64 * 1024
+
+# Threads das rotas Flask (cada requisição ocupa um thread do pool durante a execução)
+wsgi_executor = ThreadPoolExecutor(max_workers=ASGI_WSGI_THREADS, thread_name_prefix='wsgi')
+
+def _wsgi_environ(scope, body):
+    """Monta o environ WSGI (PEP 3333) a partir do scope ASGI e do corpo já lido"""
+    script_name = scope.get('root_path', '').encode('utf-8').decode('latin1')
+    path_info = scope['path'].encode('utf-8').decode('latin1')
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+        environ['REMOTE_PORT'] = str(scope['client'][1])
+
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').lower()
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        # Cabeçalhos repetidos são combinados, como no servidor de desenvolvimento
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def run_wsgi(wsgi_application, scope, receive, send):
+    """
+    Executa o app WSGI (Flask) em um thread do wsgi_executor.
+
+    O corpo da requisição é lido no event loop; a resposta é enviada pelo
+    thread à medida que o app a produz, então respostas em streaming continuam
+    chegando ao cliente aos poucos.
+
+    Args:
+        wsgi_application: App WSGI
+        scope, receive, send: Interface ASGI da requisição
+    """
+    if scope['type'] != 'http':
+        raise ValueError(f"Tipo de conexão não suportado: {scope['type']}")
+
+    loop = asyncio.get_running_loop()
+
+    def send_from_thread(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def run(environ):
+        response_start = {}
+        started = False
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and started:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response_start.update({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+            })
+
+        result = wsgi_application(environ, start_response)
+        try:
+            for chunk in result:
+                if not chunk:
+                    continue
+                # Os cabeçalhos seguem junto com o primeiro trecho do corpo
+                if not started:
+                    started = True
+                    send_from_thread(response_start)
+                send_from_thread({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not started:
+                send_from_thread(response_start)
+            send_from_thread({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    with SpooledTemporaryFile(max_size=WSGI_BODY_SPOOL_BYTES) as body:
+        while True:
+            message = await receive()
+            if message['type'] != 'http.request':
+                return
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+        await loop.run_in_executor(wsgi_executor, run, _wsgi_environ(scope, body))
+
+class AsgiRequest:
+    """Dados da requisição HTTP usados pelas rotas nativas"""
+
+    def __init__(self, scope, receive):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin1').lower(): value.decode('latin1')
+                        for name, value in scope.get('headers', [])}
+        self.args = {key: values[0] for key, values in parse_qs(scope.get('query_string', b'').decode('latin1')).items()}
+        self._client = scope['client'][0] if scope.get('client') else None
+        self._receive = receive
+        self._session_id = None
+
+    @property
+    def client(self):
+        """Endereço do cliente (mesma regra de admission.get_client_key)"""
+        forwarded = self.headers.get('x-forwarded-for')
+        if ADMISSION_TRUST_PROXY and forwarded:
+            return forwarded.split(',')[0].strip()
+        return self._client or 'unknown'
+
+    @property
+    def session_id(self):
+        """Sessão do agente (mesma regra de app.get_session_id: sem identificação, uma sessão nova)"""
+        if self._session_id is None:
+            self._session_id = resolve_session_id(self.headers.get('x-session-id') or self.args.get('session_id'))
+        return self._session_id
+
+    async def json(self):
+        """Lê o corpo da requisição como JSON (None se vazio, inválido ou grande demais)"""
+        chunks = []
+        size = 0
+        while True:
+            message = await self._receive()
+            if message['type'] != 'http.request':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                return None
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                break
+        try:
+            return loads(b''.join(chunks) or b'null')
+        except ValueError:
+            return None
+
+    async def wait_disconnect(self):
+        """Aguarda o cliente encerrar a conexão (respostas de longa duração, sem corpo a ler)"""
+        while True:
+            message = await self._receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+def _response_headers(content_type, extra=None):
+    headers = [
+        (b'content-type', content_type.encode('latin1')),
+        # Mesmo comportamento do Flask-CORS configurado no app (origens liberadas)
+        (b'access-control-allow-origin', b'*'),
+        (b'access-control-expose-headers', ', '.join(CORS_EXPOSE_HEADERS).encode('latin1'))
+    ]
+    for name, value in (extra or {}).items():
+        headers.append((name.lower().encode('latin1'), value.encode('latin1')))
+    return headers
+
+async def send_json(send, status, payload, request_id, headers=None):
+    """Envia uma resposta JSON completa"""
+    body = dumps_bytes(payload)
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': _response_headers('application/json', {
+            'Content-Length': str(len(body)),
+            'X-Request-Id': request_id,
+            **(headers or {})
+        })
+    })
+    await send({'type': 'http.response.body', 'body': body})
+    return status
+
+async def chatbot(request, send, request_id):
+    """Versão nativa de POST /api/finance-agent/chatbot"""
+    data = await request.json()
+
+    if not isinstance(data, dict) or 'message' not in data:
+        return await send_json(send, 400, {"error": "Mensagem não fornecida"}, request_id,
+                               {'X-Session-Id': request.session_id})
+
+    user_message = data['message']
+    try:
+        # Obter o agente financeiro da sessão (lê preferências e resumo do banco
+        # em outro thread, com conexão própria)
+        agent = await asyncio.to_thread(run_with_connection, get_financial_agent, request.session_id)
+
+        route = route_message(user_message)
+        response, actions, partial = await respond_with_actions(agent, user_message, route)
+
+        result = {
+            "response": response,
+            "actions": actions
+        }
+        if partial:
+            result["partial"] = True
+        return await send_json(send, 200, result, request_id, {'X-Session-Id': request.session_id})
+    except Exception as e:
+        logging.error(f"Erro no chatbot: {str(e)}")
+        return await send_json(send, 500, {"error": "Erro ao processar mensagem", "response": CHAT_ERROR_MESSAGE},
+                               request_id, {'X-Session-Id': request.session_id})
+
+async def chatbot_stream(request, send, request_id):
+    """Versão nativa de POST /api/finance-agent/chatbot/stream (Server-Sent Events)"""
+    data = await request.json()
+
+    if not isinstance(data, dict) or 'message' not in data:
+        return await send_json(send, 400, {"error": "Mensagem não fornecida"}, request_id,
+                               {'X-Session-Id': request.session_id})
+
+    user_message = data['message']
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': _response_headers('text/event-stream; charset=utf-8', {
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            'X-Request-Id': request_id,
+            'X-Session-Id': request.session_id
+        })
+    })
+
+    async def send_event(event, payload):
+        await send({'type': 'http.response.body', 'body': sse_event(event, payload).encode('utf-8'), 'more_body': True})
+
+    try:
+        # Obter o agente financeiro da sessão
+        agent = await asyncio.to_thread(run_with_connection, get_financial_agent, request.session_id)
+
+        # As análises rodam em paralelo enquanto os trechos da resposta são enviados
+        route = route_message(user_message)
+        jobs = submit_chat_actions(agent, route)
+
+        stream = agent.stream_ai_response(user_message)
+        try:
+            async for text in stream:
+                await send_event('token', {"text": text})
+        finally:
+            await stream.aclose()
+
+        actions, partial = await await_chat_actions(agent, route, jobs)
+        await send_event('actions', actions)
+        await send_event('done', {"partial": partial})
+    except Exception as e:
+        logging.error(f"Erro no chatbot (streaming): {str(e)}")
+        await send_event('error', {"response": CHAT_ERROR_MESSAGE})
+
+    await send({'type': 'http.response.body', 'body': b''})
+    return 200
+
+def with_admission(name, handler):
+    """Aplica às rotas nativas o mesmo controle de admissão das rotas Flask (admission_control)"""
+    limiter = limiters[name]
+
+    async def wrapper(request, send, request_id):
+        try:
+            limiter.check_rate(request.client)
+            await limiter.acquire_async()
+        except Rejected as rejected:
+            return await send_json(send, rejected.status, {"error": rejected.message, "retry_after": rejected.retry_after},
+                                   request_id, rejected.headers())
+
+        start = time.perf_counter()
+        try:
+            return await handler(request, send, request_id)
+        finally:
+            limiter.release(time.perf_counter() - start)
+    return wrapper
+
+async def alerts_stream(request, send, request_id):
+    """Versão nativa de GET /api/alerts/stream (Server-Sent Events)"""
+    last_event_id = parse_last_event_id(request.headers.get('last-event-id') or request.args.get('last_event_id'))
+
+    subscription = alert_broker.subscribe(asyncio.get_running_loop())
+    if subscription is None:
+        return await send_json(send, 503, {"error": "Limite de conexões de alertas atingido"}, request_id)
+
+    # O cliente pode desconectar a qualquer momento; o servidor não falha ao enviar para ele
+    disconnected = asyncio.ensure_future(request.wait_disconnect())
+    try:
+        # Os alertas iniciais são lidos depois da assinatura: nenhum alerta criado entre os dois se perde
+        try:
+            initial = await asyncio.to_thread(run_with_connection, get_initial_alerts, last_event_id)
+        except Exception as e:
+            logging.error(f"Erro ao abrir o canal de alertas: {str(e)}")
+            return await send_json(send, 500, {"error": "Erro ao abrir o canal de alertas"}, request_id)
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': _response_headers('text/event-stream; charset=utf-8', {
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no',
+                'X-Request-Id': request_id
+            })
+        })
+
+        async def send_text(text):
+            await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+        sent = 0
+        for alert in initial:
+            sent = max(sent, alert['id'])
+            await send_text(sse_event('alert', alert, alert['id']))
+        await send_text(sse_event('ready', {"subscribers": alert_broker.subscriber_count}))
+
+        while not disconnected.done():
+            waiting = asyncio.ensure_future(subscription.wait_async(HEARTBEAT_SECONDS))
+            await asyncio.wait({waiting, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not waiting.done():
+                waiting.cancel()
+                break
+
+            alerts, overflowed = waiting.result()
+            if overflowed:
+                await send_text(sse_event('resync', {"reason": "overflow"}))
+            for alert in alerts:
+                # Alertas já enviados na carga inicial não se repetem
+                if alert['id'] > sent:
+                    await send_text(sse_event('alert', alert, alert['id']))
+            if not alerts and not overflowed:
+                await send_text(SSE_HEARTBEAT)
+
+        await send({'type': 'http.response.body', 'body': b''})
+        return 200
+    finally:
+        alert_broker.unsubscribe(subscription)
+        disconnected.cancel()
+
+# Rotas servidas diretamente pelo event loop; o restante vai para o app Flask
+NATIVE_ROUTES = {
+    ('POST', '/api/finance-agent/chatbot'): with_admission('chatbot', chatbot),
+    ('POST', '/api/finance-agent/chatbot/stream'): with_admission('chatbot', chatbot_stream),
+    ('GET', '/api/alerts/stream'): alerts_stream
+}
+
+def _shutdown():
+    """Grava mensagens e registros de log pendentes antes de o processo encerrar"""
+    message_writer.stop()
+    chat_executor.shutdown(wait=False, cancel_futures=True)
+    wsgi_executor.shutdown(wait=False, cancel_futures=True)
+    stop_logging()
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await asyncio.to_thread(_shutdown)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    """Aplicação ASGI: rotas do chatbot nativas e app Flask para as demais"""
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+
+    handler = NATIVE_ROUTES.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+    if handler is None:
+        return await run_wsgi(app, scope, receive, send)
+
+    request = AsgiRequest(scope, receive)
+    request_id = start_request_context(request.headers.get('x-request-id'))
+    start = start_request()
+    try:
+        status = await handler(request, send, request_id)
+        log_access(request.method, request.path, status)
+        finish_request(request.method, request.path, status, start)
+    finally:
+        clear_request_context()
+
+def run():
+    """Inicia o servidor ASGI (uvicorn) com a configuração do ambiente"""
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("O modo ASGI requer o uvicorn: pip install uvicorn")
+
+    uvicorn.run(
+        'asgi:application',
+        host=ASGI_HOST,
+        port=ASGI_PORT,
+        workers=ASGI_WORKERS,
+        limit_concurrency=ASGI_LIMIT_CONCURRENCY,
+        timeout_keep_alive=ASGI_KEEPALIVE,
+        lifespan='on',
+        # Registros do servidor seguem pelo logging da aplicação (logging_setup)
+        log_config=None,
+        access_log=False
+    )
+
+if __name__ == '__main__':
+    run()
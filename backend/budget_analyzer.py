@@ -1,9 +1,111 @@
-import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
+from bisect import bisect_right
 import sqlite3
 import json
+from analysis_cache import cached_analysis
+from time_index import get_time_index
 
+# Número máximo de sugestões retornadas por get_quick_wins
+QUICK_WINS_LIMIT = 10
+
+# Tetos do plano de cortes: cada categoria pode ter o corte sugerido ampliado
+# em até 50%, sem nunca ultrapassar 50% do gasto mensal da categoria
+MAX_CUT_SCALE = 1.5
+MAX_CATEGORY_CUT = 50
+
+# Estatísticas mensais por categoria calculadas inteiramente no SQLite, usadas
+# apenas em bancos antigos sem transactions.category_id (nos demais elas vêm do
+# índice de prefixos, ver _category_monthly_stats).
+# A CTE soma as despesas por mês × categoria; a consulta externa reduz esses
+# totais mensais a total, média, variância amostral e extremos por categoria.
+# Datas inválidas são descartadas porque strftime retorna NULL para elas.
+_CATEGORY_MONTHLY_STATS_QUERY = """
+    WITH monthly AS (
+        SELECT strftime('%Y-%m', t.date) AS month,
+               {category} AS category,
+               SUM(t.amount) AS month_total,
+               COUNT(*) AS tx_count
+        FROM transactions t
+        {join}
+        WHERE t.type = 'expense' AND t.date >= ?
+          AND strftime('%Y-%m', t.date) IS NOT NULL
+        GROUP BY month, category
+    )
+    SELECT category,
+           SUM(month_total) AS amount,
+           AVG(month_total) AS monthly_avg,
+           CASE WHEN COUNT(*) > 1
+                THEN MAX((SUM(month_total * month_total)
+                          - SUM(month_total) * SUM(month_total) / COUNT(*)) / (COUNT(*) - 1), 0)
+                ELSE 0 END AS variance,
+           MAX(month_total) AS max_month,
+           MIN(month_total) AS min_month,
+           COUNT(*) AS months,
+           SUM(tx_count) AS tx_count,
+           (SELECT COUNT(DISTINCT month) FROM monthly WHERE category IS NOT NULL) AS window_months
+    FROM monthly
+    WHERE category IS NOT NULL
+    GROUP BY category
+    ORDER BY amount DESC
+"""
+
+def _execute_with_category_fallback(cursor, query, alternative_query, params):
+    """
+    Executa uma consulta que depende de transactions.category_id, recorrendo à
+    consulta alternativa em bancos antigos que ainda não têm essa coluna.
+    
+    Returns:
+        Lista de dicionários com as linhas retornadas
+    """
+    try:
+        cursor.execute(query, params)
+    except sqlite3.OperationalError as e:
+        # Se o erro for relacionado à coluna category_id, tente uma consulta alternativa
+        if "no such column: t.category_id" in str(e):
+            cursor.execute(alternative_query, params)
+        else:
+            # Se for outro tipo de erro, propague-o
+            raise e
+    
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def _category_monthly_stats(monthly):
+    """
+    Reduz os totais por categoria e mês do índice de prefixos às mesmas
+    estatísticas de _CATEGORY_MONTHLY_STATS_QUERY (total, média mensal,
+    variância amostral e extremos), ordenadas pelo total.
+
+    Args:
+        monthly: Resultado de CategoryPrefixIndex.monthly_totals
+
+    Returns:
+        Lista de dicionários, um por categoria
+    """
+    window_months = len({month for months in monthly.values() for month in months})
+    analysis = []
+    for category, months in monthly.items():
+        totals = [total for total, _ in months.values()]
+        count = len(totals)
+        amount = sum(totals)
+        variance = 0
+        if count > 1:
+            variance = max((sum(total * total for total in totals) - amount * amount / count) / (count - 1), 0)
+        analysis.append({
+            'category': category,
+            'amount': amount,
+            'monthly_avg': amount / count,
+            'variance': variance,
+            'max_month': max(totals),
+            'min_month': min(totals),
+            'months': count,
+            'tx_count': sum(tx_count for _, tx_count in months.values()),
+            'window_months': window_months
+        })
+    analysis.sort(key=lambda row: row['amount'], reverse=True)
+    return analysis
+
+@cached_analysis()
 def get_expense_analysis(conn, months_to_analyze=6):
     """
     Analisa as despesas dos últimos meses e identifica áreas onde cortes podem ser feitos.
@@ -21,121 +123,29 @@ def get_expense_analysis(conn, months_to_analyze=6):
     today = datetime.now()
     start_date = (today - timedelta(days=30*months_to_analyze)).strftime('%Y-%m-%d')
     
-    # Buscar transações de despesas dos últimos meses
-    query = """
-        SELECT t.date, t.amount, t.description, c.name as category
-        FROM transactions t
-        LEFT JOIN categories c ON t.category_id = c.id
-        WHERE t.type = 'expense' AND t.date >= ?
-        ORDER BY t.date DESC
-    """
-    
+    # Totais mês × categoria lidos do índice de prefixos (mantido na escrita),
+    # sem varrer as transações da janela
     try:
-        cursor.execute(query, (start_date,))
-        transactions = cursor.fetchall()
+        analysis = _category_monthly_stats(get_time_index(conn).monthly_totals(start_date))
     except sqlite3.OperationalError as e:
-        # Se o erro for relacionado à coluna category_id, tente uma consulta alternativa
-        if "no such column: t.category_id" in str(e):
-            # Consulta alternativa que não depende da coluna category_id
-            alternative_query = """
-                SELECT t.date, t.amount, t.description, 'Sem categoria' as category
-                FROM transactions t
-                WHERE t.type = 'expense' AND t.date >= ?
-                ORDER BY t.date DESC
-            """
-            cursor.execute(alternative_query, (start_date,))
-            transactions = cursor.fetchall()
-        else:
-            # Se for outro tipo de erro, propague-o
-            raise e
-    
-    # Converter para DataFrame
-    if transactions:
-        # Definindo explicitamente os nomes das colunas
-        df = pd.DataFrame(transactions)
-        if len(df.columns) >= 4:  # Verificamos se temos o número esperado de colunas
-            df.columns = ['date', 'amount', 'description', 'category']
-        else:
-            # Se a resposta não tiver o formato esperado, tentamos inferir melhor as colunas
-            print(f"Aviso: Formato inesperado de dados com {len(df.columns)} colunas")
-            if df.empty:
-                return {
-                    "status": "insufficient_data",
-                    "message": "Não há dados suficientes para análise. Adicione mais transações.",
-                    "suggestions": []
-                }
-            
-            # Se não tivermos coluna 'date', tentamos identificar qual coluna pode ser a data
-            for i, col in enumerate(df.columns):
-                # Verificar se a primeira linha dessa coluna parece uma data
-                first_val = df.iloc[0, i] if len(df) > 0 else None
-                if first_val and isinstance(first_val, str) and ('-' in first_val or '/' in first_val):
-                    # Se parece uma data, reorganizamos as colunas para que esta seja a primeira
-                    cols = list(df.columns)
-                    # Mover esta coluna para a primeira posição e renomear colunas
-                    new_order = [col] + [c for c in cols if c != col]
-                    df = df[new_order]
-                    df.columns = ['date', 'amount', 'description', 'category'][:len(df.columns)]
-                    break
-    else:
-        df = pd.DataFrame()
+        if "category_id" not in str(e):
+            raise
+        # Banco antigo sem a coluna category_id: agregar no SQLite sem categorias
+        alternative_query = _CATEGORY_MONTHLY_STATS_QUERY.format(
+            category="'Sem categoria'",
+            join=""
+        )
+        cursor.execute(alternative_query, (start_date,))
+        columns = [col[0] for col in cursor.description]
+        analysis = [dict(zip(columns, row)) for row in cursor.fetchall()]
     
-    if df.empty:
+    if not analysis:
         return {
             "status": "insufficient_data",
             "message": "Não há dados suficientes para análise. Adicione mais transações.",
             "suggestions": []
         }
     
-    # Verificar se a coluna date existe no DataFrame
-    if 'date' not in df.columns:
-        return {
-            "status": "data_error",
-            "message": "Formato de dados inválido. A coluna 'date' está ausente.",
-            "suggestions": []
-        }
-        
-    # Tentar converter a coluna de data para datetime com tratamento de erros
-    try:
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        # Remover linhas com datas inválidas
-        df = df.dropna(subset=['date'])
-        if df.empty:
-            return {
-                "status": "insufficient_data",
-                "message": "Dados de data inválidos. Verifique o formato das datas nas transações.",
-                "suggestions": []
-            }
-    except Exception as e:
-        return {
-            "status": "data_error",
-            "message": f"Erro ao processar datas: {str(e)}",
-            "suggestions": []
-        }
-    
-    # Agrupar por categoria
-    df['month'] = df['date'].dt.strftime('%Y-%m')
-    
-    # Calcular total de despesas por categoria
-    category_totals = df.groupby('category')['amount'].sum().reset_index()
-    category_totals = category_totals.sort_values('amount', ascending=False)
-    
-    # Calcular média mensal por categoria
-    monthly_avg = df.groupby(['month', 'category'])['amount'].sum().reset_index()
-    monthly_avg = monthly_avg.groupby('category')['amount'].mean().reset_index()
-    monthly_avg.columns = ['category', 'monthly_avg']
-    
-    # Calcular variância para identificar categorias com gastos inconsistentes
-    monthly_var = df.groupby(['month', 'category'])['amount'].sum().reset_index()
-    monthly_var = monthly_var.groupby('category')['amount'].var().reset_index()
-    monthly_var.columns = ['category', 'variance']
-    
-    # Juntar as informações
-    analysis = pd.merge(category_totals, monthly_avg, on='category')
-    analysis = pd.merge(analysis, monthly_var, on='category', how='left')
-    # Corrigido o aviso sobre fillna inplace - mudando para forma recomendada
-    analysis['variance'] = analysis['variance'].fillna(0)
-    
     # Identificar categorias de despesas não essenciais (personalizar conforme necessário)
     non_essential_categories = [
         'lazer', 'entretenimento', 'restaurantes', 'viagens', 
@@ -143,31 +153,28 @@ def get_expense_analysis(conn, months_to_analyze=6):
     ]
     
     # Calcular total gasto e média mensal total
-    total_spent = analysis['amount'].sum()
-    monthly_total_avg = analysis['monthly_avg'].sum()
+    total_spent = sum(row['amount'] for row in analysis)
+    monthly_total_avg = sum(row['monthly_avg'] for row in analysis)
     
     # Classificar categorias para possíveis cortes
     suggestions = []
     
     # Obter limite de orçamento, se definido
-    cursor.execute("SELECT * FROM category_limits")
-    budget_limits = cursor.fetchall()
+    cursor.execute('''
+        SELECT c.name, cl.limit_amount, cl.period
+        FROM category_limits cl
+        JOIN categories c ON c.id = cl.category_id
+    ''')
     budget_limits_dict = {}
     
-    if budget_limits:
-        for limit in budget_limits:
-            category_id = limit['category_id']
-            cursor.execute("SELECT name FROM categories WHERE id = ?", (category_id,))
-            category_name = cursor.fetchone()
-            
-            if category_name:
-                budget_limits_dict[category_name['name']] = {
-                    'limit': limit['limit_amount'],
-                    'period': limit['period']
-                }
+    for name, limit_amount, period in cursor.fetchall():
+        budget_limits_dict[name] = {
+            'limit': limit_amount,
+            'period': period
+        }
     
     # Analisar categorias e gerar sugestões
-    for _, row in analysis.iterrows():
+    for row in analysis:
         category = row['category']
         if not category:
             continue
@@ -255,19 +262,15 @@ def get_expense_analysis(conn, months_to_analyze=6):
     has_seasonal_pattern = False
     seasonal_categories = []
     
-    monthly_trends = df.pivot_table(index='month', columns='category', values='amount', aggfunc='sum')
-    
-    # Verificar variação mês a mês
-    for category in monthly_trends.columns:
-        if len(monthly_trends) > 2:
-            values = monthly_trends[category].dropna()
-            if len(values) > 2:
-                max_val = values.max()
-                min_val = values.min()
-                
-                if min_val > 0 and (max_val / min_val) > 2:
-                    has_seasonal_pattern = True
-                    seasonal_categories.append(category)
+    # Verificar variação mês a mês (extremos mensais já calculados no SQL)
+    for row in sorted(analysis, key=lambda r: r['category']):
+        if row['window_months'] > 2 and row['months'] > 2:
+            max_val = row['max_month']
+            min_val = row['min_month']
+            
+            if min_val > 0 and (max_val / min_val) > 2:
+                has_seasonal_pattern = True
+                seasonal_categories.append(row['category'])
     
     if has_seasonal_pattern and seasonal_categories:
         cats = ", ".join(seasonal_categories[:3])
@@ -287,7 +290,7 @@ def get_expense_analysis(conn, months_to_analyze=6):
     
     for category, percent in avg_household_expenses.items():
         matching_categories = [
-            row for _, row in analysis.iterrows() 
+            row for row in analysis
             if category in str(row['category']).lower()
         ]
         
@@ -312,25 +315,138 @@ def get_expense_analysis(conn, months_to_analyze=6):
         "general_recommendations": general_recommendations
     }
 
-def get_cost_cutting_recommendation(conn, target_savings=None):
+def build_savings_frontier(analysis):
     """
-    Gera um plano de corte de despesas para atingir uma meta de economia.
+    Calcula, em uma única passada, a fronteira de economia de uma análise de despesas.
+    
+    O plano de menor impacto para uma meta escala todos os cortes sugeridos
+    pelo mesmo fator (preservando as prioridades da análise) até o teto de
+    cada categoria. A economia total é linear por partes nesse fator, com uma
+    quebra sempre que uma categoria atinge o teto; guardando esses segmentos,
+    qualquer meta é respondida por busca binária.
+    
+    Args:
+        analysis: Resultado bem-sucedido de get_expense_analysis
+        
+    Returns:
+        Um dicionário serializável com as categorias, os segmentos da fronteira
+        e a economia máxima alcançável
+    """
+    categories = []
+    for s in analysis["suggestions"]:
+        if s["suggested_cut"] <= 0:
+            continue
+        
+        cap = min(s["suggested_cut"] * MAX_CUT_SCALE, MAX_CATEGORY_CUT)
+        categories.append({
+            "category": s["category"],
+            "monthly_avg": s["monthly_avg"],
+            "base_cut": s["suggested_cut"],
+            "cap": cap,
+            "saturation_scale": cap / s["suggested_cut"],
+            "actions": s["suggestions"]
+        })
+    
+    categories.sort(key=lambda c: c["saturation_scale"])
+    
+    # Inclinação inicial: economia por unidade de fator com nenhuma categoria no teto
+    slope = sum(c["monthly_avg"] * c["base_cut"] / 100 for c in categories)
+    segments = []
+    scale = 0
+    savings = 0
+    
+    for c in categories:
+        if c["saturation_scale"] > scale:
+            segments.append({"scale": scale, "savings": savings, "slope": slope})
+            savings += slope * (c["saturation_scale"] - scale)
+            scale = c["saturation_scale"]
+        slope -= c["monthly_avg"] * c["base_cut"] / 100
+    
+    return {
+        "monthly_expenses": analysis["summary"]["total_monthly_expenses"],
+        "max_savings": savings,
+        "max_scale": scale,
+        "segments": segments,
+        "categories": categories,
+        "general_recommendations": analysis.get("general_recommendations", [])
+    }
+
+def allocate_savings(frontier, target_savings):
+    """
+    Consulta a fronteira de economia para uma meta: O(log n) para achar o
+    segmento e O(n) para montar os cortes por categoria.
+    
+    Returns:
+        Lista de sugestões (categoria, corte percentual, economia) para a meta
+    """
+    segments = frontier["segments"]
+    
+    if target_savings >= frontier["max_savings"]:
+        scale = frontier["max_scale"]
+    elif target_savings <= 0 or not segments:
+        scale = 0
+    else:
+        index = bisect_right([segment["savings"] for segment in segments], target_savings) - 1
+        segment = segments[index]
+        scale = segment["scale"] + (target_savings - segment["savings"]) / segment["slope"]
+    
+    suggestions = []
+    for c in frontier["categories"]:
+        cut = min(c["base_cut"] * scale, c["cap"])
+        if cut <= 0:
+            continue
+        
+        suggestions.append({
+            "category": c["category"],
+            "monthly_avg": c["monthly_avg"],
+            "suggested_cut": cut,
+            "savings": (c["monthly_avg"] * cut) / 100,
+            "suggestions": c["actions"]
+        })
+    
+    return suggestions
+
+@cached_analysis()
+def get_savings_frontier(conn):
+    """
+    Executa a análise de despesas uma vez e retorna a fronteira de economia,
+    a partir da qual qualquer meta pode ser consultada com allocate_savings.
     
     Args:
         conn: Conexão com o banco de dados
-        target_savings: Meta de economia mensal (se None, sugerirá um valor)
         
     Returns:
-        Um plano detalhado de cortes de despesas
+        A fronteira de economia ou, se a análise falhar, o resultado da análise
     """
-    # Primeiro, fazer a análise geral
     analysis = get_expense_analysis(conn)
     
     if analysis["status"] != "success":
         return analysis
     
-    monthly_expenses = analysis["summary"]["total_monthly_expenses"]
-    suggestions = analysis["suggestions"]
+    frontier = build_savings_frontier(analysis)
+    frontier["status"] = "success"
+    return frontier
+
+def get_cost_cutting_recommendation(conn, target_savings=None, frontier=None):
+    """
+    Gera um plano de corte de despesas para atingir uma meta de economia.
+    
+    Args:
+        conn: Conexão com o banco de dados
+        target_savings: Meta de economia mensal (se None, sugerirá um valor)
+        frontier: Fronteira já calculada por get_savings_frontier (evita refazer a análise)
+        
+    Returns:
+        Um plano detalhado de cortes de despesas
+    """
+    # Primeiro, obter a fronteira de economia (análise geral feita uma única vez)
+    if frontier is None:
+        frontier = get_savings_frontier(conn)
+    
+    if frontier["status"] != "success":
+        return frontier
+    
+    monthly_expenses = frontier["monthly_expenses"]
     
     # Se não for especificada uma meta de economia, sugere 15% das despesas mensais
     if not target_savings:
@@ -342,25 +458,8 @@ def get_cost_cutting_recommendation(conn, target_savings=None):
         except (TypeError, ValueError):
             target_savings = monthly_expenses * 0.15
     
-    # Calcular o potencial de economia total das sugestões existentes
-    total_potential_savings = sum(s["savings"] for s in suggestions)
-    
-    # Ajustar as sugestões para atingir a meta específica
-    if total_potential_savings < target_savings:
-        # Se a meta for maior do que o potencial atual, aumentamos os cortes proporcionalmente
-        scaling_factor = min(target_savings / total_potential_savings, 1.5)  # Limitar a um aumento máximo de 50%
-        
-        for s in suggestions:
-            s["suggested_cut"] = min(s["suggested_cut"] * scaling_factor, 50)  # Limitar a 50% de corte
-            s["savings"] = (s["monthly_avg"] * s["suggested_cut"]) / 100
-    
-    elif total_potential_savings > target_savings:
-        # Se a meta for menor que o potencial atual, reduzimos os cortes proporcionalmente
-        scaling_factor = max(target_savings / total_potential_savings, 0.3)  # Não reduzir mais de 70%
-        
-        for s in suggestions:
-            s["suggested_cut"] = max(s["suggested_cut"] * scaling_factor, 5)  # Pelo menos 5% de corte
-            s["savings"] = (s["monthly_avg"] * s["suggested_cut"]) / 100
+    # Alocação de menor impacto para a meta, consultada na fronteira
+    suggestions = allocate_savings(frontier, target_savings)
     
     # Ordenar sugestões para maximizar economia
     suggestions.sort(key=lambda x: x["savings"], reverse=True)
@@ -408,8 +507,8 @@ def get_cost_cutting_recommendation(conn, target_savings=None):
         )
     
     # Adicionar outras recomendações relevantes da análise geral
-    if analysis["general_recommendations"]:
-        general_recommendations.extend(analysis["general_recommendations"])
+    if frontier["general_recommendations"]:
+        general_recommendations.extend(frontier["general_recommendations"])
     
     return {
         "status": "success",
@@ -421,6 +520,7 @@ def get_cost_cutting_recommendation(conn, target_savings=None):
         "general_recommendations": general_recommendations
     }
 
+@cached_analysis(scopes=('transactions', 'categories'))
 def get_quick_wins(conn):
     """
     Identifica 'quick wins' - pequenas mudanças que podem ter impacto rápido nas economias
@@ -437,37 +537,13 @@ def get_quick_wins(conn):
     today = datetime.now()
     one_month_ago = (today - timedelta(days=30)).strftime('%Y-%m-%d')
     
-    query = """
-        SELECT t.description, t.amount, t.date, c.name as category
-        FROM transactions t
-        LEFT JOIN categories c ON t.category_id = c.id
-        WHERE t.type = 'expense' AND t.date >= ?
-        ORDER BY t.amount DESC
-    """
-    
-    try:
-        cursor.execute(query, (one_month_ago,))
-        recent_expenses = cursor.fetchall()
-    except sqlite3.OperationalError as e:
-        # Se o erro for relacionado à coluna category_id, tente uma consulta alternativa
-        if "no such column: t.category_id" in str(e):
-            # Consulta alternativa que não depende da coluna category_id
-            alternative_query = """
-                SELECT t.description, t.amount, t.date, 'Sem categoria' as category
-                FROM transactions t
-                WHERE t.type = 'expense' AND t.date >= ?
-                ORDER BY t.amount DESC
-            """
-            cursor.execute(alternative_query, (one_month_ago,))
-            recent_expenses = cursor.fetchall()
-        else:
-            # Se for outro tipo de erro, propague-o
-            raise e
-    
-    # Converter para DataFrame
-    df = pd.DataFrame(recent_expenses)
+    # Verificar se há despesas na janela
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM transactions WHERE type = 'expense' AND date >= ?)",
+        (one_month_ago,)
+    )
     
-    if df.empty:
+    if not cursor.fetchone()[0]:
         return {
             "status": "insufficient_data",
             "quick_wins": []
@@ -476,66 +552,82 @@ def get_quick_wins(conn):
     # Identificar padrões de gastos frequentes
     quick_wins = []
     
-    # 1. Pequenas transações frequentes (ex: cafés, lanches)
-    if 'description' in df.columns:
-        small_recurrent = df[df['amount'] < 50].copy()
-        if not small_recurrent.empty:
-            # Agrupar por descrição para encontrar repetições
-            frequent_small = small_recurrent.groupby('description').agg({
-                'amount': ['count', 'sum']
-            }).reset_index()
-            frequent_small.columns = ['description', 'count', 'total']
-            
-            # Filtrar por frequência
-            frequent_small = frequent_small[frequent_small['count'] >= 3]
-            
-            if not frequent_small.empty:
-                for _, row in frequent_small.iterrows():
-                    quick_wins.append({
-                        "type": "frequent_small_expense",
-                        "description": row['description'],
-                        "frequency": row['count'],
-                        "total_amount": row['total'],
-                        "potential_monthly_savings": row['total'] * 0.75,  # Sugerir reduzir em 75%
-                        "suggestion": f"Reduza gastos frequentes em {row['description']} (R$ {row['total']:.2f} em {row['count']} vezes)"
-                    })
-    
-    # 2. Serviços por assinatura
-    subscription_keywords = ['assinatura', 'mensalidade', 'premium', 'plus', 'pro', 'netflix', 'spotify', 'disney', 
-                           'amazon', 'hbo', 'deezer', 'youtube', 'apple', 'microsoft', 'adobe', 'subscription']
-    
-    if 'description' in df.columns:
-        subscriptions = df[df['description'].str.lower().str.contains('|'.join(subscription_keywords), na=False)].copy()
-        
-        if not subscriptions.empty:
-            for _, row in subscriptions.iterrows():
-                quick_wins.append({
-                    "type": "subscription",
-                    "description": row['description'],
-                    "amount": row['amount'],
-                    "potential_monthly_savings": row['amount'],
-                    "suggestion": f"Reavalie a necessidade da assinatura de {row['description']} (R$ {row['amount']:.2f}/mês)"
-                })
-    
-    # 3. Gastos elevados únicos
-    if not df.empty and 'amount' in df.columns:
-        # Definir gasto elevado como acima do 90º percentil
-        if len(df) >= 10:
-            high_threshold = df['amount'].quantile(0.9)
-            high_expenses = df[df['amount'] > high_threshold].copy()
-            
-            if not high_expenses.empty:
-                for _, row in high_expenses.iterrows():
-                    category = row.get('category', 'desconhecida')
-                    quick_wins.append({
-                        "type": "high_expense",
-                        "description": row['description'],
-                        "category": category,
-                        "amount": row['amount'],
-                        "date": row['date'],
-                        "potential_saving": "variável",
-                        "suggestion": f"Analise despesa elevada: {row['description']} (R$ {row['amount']:.2f})"
-                    })
+    # 1. Pequenas transações frequentes (ex: cafés, lanches), agrupadas pela
+    # chave de comerciante normalizada na escrita (índice merchant_key)
+    cursor.execute("""
+        SELECT MIN(description) AS description, COUNT(*) AS count, SUM(amount) AS total
+        FROM transactions
+        WHERE type = 'expense' AND date >= ? AND amount < 50
+          AND merchant_key IS NOT NULL AND merchant_key != ''
+        GROUP BY merchant_key
+        HAVING COUNT(*) >= 3
+        ORDER BY total DESC, merchant_key
+        LIMIT ?
+    """, (one_month_ago, QUICK_WINS_LIMIT))
+    
+    for description, count, total in cursor.fetchall():
+        quick_wins.append({
+            "type": "frequent_small_expense",
+            "description": description,
+            "frequency": count,
+            "total_amount": total,
+            "potential_monthly_savings": total * 0.75,  # Sugerir reduzir em 75%
+            "suggestion": f"Reduza gastos frequentes em {description} (R$ {total:.2f} em {count} vezes)"
+        })
+    
+    # 2. Serviços por assinatura, classificados na escrita (índice is_subscription)
+    cursor.execute("""
+        SELECT description, amount
+        FROM transactions
+        WHERE is_subscription = 1 AND date >= ? AND type = 'expense'
+        ORDER BY amount DESC
+        LIMIT ?
+    """, (one_month_ago, QUICK_WINS_LIMIT))
+    
+    for description, amount in cursor.fetchall():
+        quick_wins.append({
+            "type": "subscription",
+            "description": description,
+            "amount": amount,
+            "potential_monthly_savings": amount,
+            "suggestion": f"Reavalie a necessidade da assinatura de {description} (R$ {amount:.2f}/mês)"
+        })
+    
+    # 3. Gastos elevados únicos, sinalizados na escrita contra a linha de base
+    # de cada categoria em todo o histórico (índice is_anomaly)
+    query = """
+        SELECT t.description, t.amount, t.date, c.name as category
+        FROM transactions t
+        LEFT JOIN categories c ON t.category_id = c.id
+        WHERE t.is_anomaly = 1 AND t.date >= ? AND t.type = 'expense'
+        ORDER BY t.amount DESC
+        LIMIT ?
+    """
+    
+    # Consulta alternativa que não depende da coluna category_id
+    alternative_query = """
+        SELECT t.description, t.amount, t.date, 'Sem categoria' as category
+        FROM transactions t
+        WHERE t.is_anomaly = 1 AND t.date >= ? AND t.type = 'expense'
+        ORDER BY t.amount DESC
+        LIMIT ?
+    """
+    
+    high_expenses = _execute_with_category_fallback(
+        cursor, query, alternative_query, (one_month_ago, QUICK_WINS_LIMIT)
+    )
+    
+    for row in high_expenses:
+        category = row.get('category') or 'desconhecida'
+        quick_wins.append({
+            "type": "high_expense",
+            "description": row['description'],
+            "category": category,
+            "amount": row['amount'],
+            "date": row['date'],
+            "potential_saving": "variável",
+            "suggestion": f"Analise despesa elevada: {row['description']} (R$ {row['amount']:.2f})"
+        })
     
     # Ordenar quick wins por potencial de economia
     quick_wins.sort(key=lambda x: x.get("potential_monthly_savings", 0) 
@@ -544,5 +636,5 @@ def get_quick_wins(conn):
     
     return {
         "status": "success",
-        "quick_wins": quick_wins[:10]  # Retornar até 10 sugestões
-    }
\ No newline at end of file
+        "quick_wins": quick_wins[:QUICK_WINS_LIMIT]  # Retornar até 10 sugestões
+    }
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from admission import ADMISSION_LIMITS
+from db import run_with_connection, run_with_deadline
+
+# Tempo máximo (segundos) de espera pela resposta do modelo
+LLM_TIMEOUT_SECONDS = 20
+
+# Tempo máximo (segundos) de cada análise disparada pela mensagem
+ACTION_TIMEOUT_SECONDS = 8
+
+# Threads dedicados às análises bloqueantes (SQL) disparadas pelo chat: cada
+# mensagem admitida no chatbot dispara no máximo duas análises, então o executor
+# comporta todas as mensagens em atendimento sem enfileirar
+CHAT_ACTION_WORKERS = 2 * ADMISSION_LIMITS['chatbot']['concurrency']
+
+chat_executor = ThreadPoolExecutor(max_workers=CHAT_ACTION_WORKERS, thread_name_prefix='chat-action')
+
+def submit_chat_actions(agent, route):
+    """
+    Dispara em paralelo as análises pedidas pela mensagem (economia, investimentos).
+
+    Cada análise recebe o prazo ACTION_TIMEOUT_SECONDS contado a partir do envio
+    (run_with_deadline): ao expirar, suas consultas são interrompidas e o
+    thread do executor é liberado, em vez de continuar ocupado com um
+    resultado que ninguém vai esperar.
+
+    Args:
+        agent: Agente financeiro da sessão
+        route: Resultado de intent_router.route_message
+
+    Returns:
+        Lista de (tipo da ação, future, instante do envio)
+    """
+    jobs = []
+    if "savings" in route["triggers"]:
+        jobs.append(("savings_recommendation", agent.suggest_expense_cuts))
+    if "investment" in route["triggers"]:
+        jobs.append(("investment_recommendation", agent.get_investment_recommendation))
+
+    submitted = []
+    for action_type, func in jobs:
+        submitted_at = time.monotonic()
+        future = chat_executor.submit(run_with_deadline, submitted_at + ACTION_TIMEOUT_SECONDS, func)
+        submitted.append((action_type, future, submitted_at))
+    return submitted
+
+def _action_result(action_type, result, error):
+    """Converte o resultado de uma análise em ação (None se falhou, expirou ou veio vazia)"""
+    if isinstance(error, (asyncio.TimeoutError, FutureTimeoutError)):
+        logging.error(f"Tempo esgotado ao gerar a ação {action_type}")
+        return None
+    if error is not None:
+        logging.error(f"Erro ao gerar a ação {action_type}: {str(error)}")
+        return None
+    if not result:
+        return None
+    return {"type": action_type, "data": result}
+
+def _name_action(agent, route):
+    """Grava o nome informado pelo usuário (operação rápida, com conexão própria do thread atual)"""
+    if not route["name"]:
+        return None
+    run_with_connection(agent.save_preference, 'user_name', route["name"])
+    return {"type": "user_name_updated", "data": {"name": route["name"]}}
+
+async def _name_action_async(agent, route):
+    """Versão assíncrona de _name_action: a gravação roda em outro thread, fora do event loop"""
+    if not route["name"]:
+        return None
+    return await asyncio.to_thread(_name_action, agent, route)
+
+def _finish_actions(outcomes, name_action):
+    actions = []
+    partial = False
+    for action_type, result, error in outcomes:
+        action = _action_result(action_type, result, error)
+        if action:
+            actions.append(action)
+        elif error is not None:
+            partial = True
+
+    if name_action:
+        actions.append(name_action)
+    return actions, partial
+
+def collect_chat_actions(agent, route, jobs, timeout=ACTION_TIMEOUT_SECONDS):
+    """
+    Aguarda (bloqueando) as análises disparadas, cada uma com seu prazo contado
+    a partir do envio.
+
+    Returns:
+        Tupla (ações, parcial) — parcial indica que alguma análise falhou ou expirou
+    """
+    outcomes = []
+    for action_type, future, submitted_at in jobs:
+        remaining = max(timeout - (time.monotonic() - submitted_at), 0)
+        try:
+            outcomes.append((action_type, future.result(timeout=remaining), None))
+        except Exception as e:
+            outcomes.append((action_type, None, e))
+    return _finish_actions(outcomes, _name_action(agent, route))
+
+async def _await_job(future, timeout):
+    return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+def _job_outcomes(jobs, results):
+    return [
+        (action_type, None, result) if isinstance(result, BaseException) else (action_type, result, None)
+        for (action_type, _, _), result in zip(jobs, results)
+    ]
+
+async def await_chat_actions(agent, route, jobs, timeout=ACTION_TIMEOUT_SECONDS):
+    """
+    Versão assíncrona de collect_chat_actions: aguarda as análises sem
+    bloquear o event loop (servidor ASGI).
+
+    Returns:
+        Tupla (ações, parcial)
+    """
+    results = await asyncio.gather(
+        *[_await_job(future, max(timeout - (time.monotonic() - submitted_at), 0))
+          for _, future, submitted_at in jobs],
+        return_exceptions=True
+    )
+    return _finish_actions(_job_outcomes(jobs, results), await _name_action_async(agent, route))
+
+async def respond_with_actions(agent, user_message, route):
+    """
+    Executa a chamada ao modelo e as análises disparadas pela mensagem ao mesmo
+    tempo: a latência passa a ser a maior delas, e não a soma. Cada tarefa tem
+    seu próprio prazo; falhas e expirações não impedem as demais.
+
+    Returns:
+        Tupla (resposta, ações, parcial)
+    """
+    jobs = submit_chat_actions(agent, route)
+
+    results = await asyncio.gather(
+        asyncio.wait_for(agent.get_ai_response(user_message), LLM_TIMEOUT_SECONDS),
+        *[_await_job(future, ACTION_TIMEOUT_SECONDS) for _, future, _ in jobs],
+        return_exceptions=True
+    )
+
+    response, action_results = results[0], results[1:]
+    partial = False
+    if isinstance(response, BaseException):
+        logging.error(f"Erro ou tempo esgotado na resposta do modelo: {str(response)}")
+        response = agent.get_fallback_response(user_message)
+        partial = True
+
+    actions, actions_partial = _finish_actions(_job_outcomes(jobs, action_results),
+                                               await _name_action_async(agent, route))
+    return response, actions, partial or actions_partial
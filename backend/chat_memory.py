@@ -0,0 +1,294 @@
+import atexit
+import logging
+import queue
+import threading
+from collections import OrderedDict, deque
+
+# Número máximo de trocas mantidas integralmente por sessão
+HISTORY_MAX_TURNS = 12
+
+# Trocas mais recentes preservadas quando as antigas são compactadas no resumo
+HISTORY_KEEP_TURNS = 6
+
+# Número máximo de tópicos acompanhados por sessão (os menos recentes saem primeiro)
+MAX_CHAT_TOPICS = 8
+
+# Perguntas anteriores guardadas no resumo da conversa
+SUMMARY_MAX_QUESTIONS = 6
+
+# Tamanho máximo (caracteres) de cada pergunta no resumo
+SUMMARY_QUESTION_CHARS = 80
+
+# Orçamento aproximado de tokens do histórico incluído no prompt
+PROMPT_HISTORY_TOKENS = 600
+
+# Mensagens pendentes de gravação antes de novas serem descartadas
+WRITER_QUEUE_SIZE = 1000
+
+# Número máximo de registros gravados por transação
+WRITER_BATCH_SIZE = 100
+
+def estimate_tokens(text):
+    """Estimativa simples de tokens (~4 caracteres por token)"""
+    return len(text) // 4 + 1
+
+def init_chat_memory_tables(cursor):
+    """Cria o índice de mensagens por sessão e a tabela de resumos das conversas"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_chatbot_messages_session ON chatbot_messages (session_id, id)')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS chatbot_summaries (
+        session_id TEXT PRIMARY KEY,
+        topics TEXT NOT NULL,
+        questions TEXT NOT NULL,
+        compacted_turns INTEGER NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    ''')
+
+class ChatTopics:
+    """Tópicos da conversa em ordem de menção mais recente, com tamanho limitado"""
+
+    def __init__(self, max_topics=MAX_CHAT_TOPICS):
+        self.max_topics = max_topics
+        self._topics = OrderedDict()
+
+    def add(self, topic):
+        self._topics[topic] = None
+        self._topics.move_to_end(topic)
+        while len(self._topics) > self.max_topics:
+            self._topics.popitem(last=False)
+
+    def recent(self, count):
+        """Os `count` tópicos mencionados mais recentemente (do mais antigo ao mais novo)"""
+        return list(self._topics)[-count:]
+
+    def __iter__(self):
+        return iter(self._topics)
+
+    def __len__(self):
+        return len(self._topics)
+
+    def __contains__(self, topic):
+        return topic in self._topics
+
+class ConversationMemory:
+    """
+    Histórico de conversa de uma sessão com memória constante.
+
+    As trocas recentes ficam em um buffer circular; quando ele enche, as mais
+    antigas são compactadas em um resumo (perguntas anteriores e tópicos da
+    conversa, ambos limitados), então a memória por sessão e o tamanho do
+    prompt não crescem com a duração da conversa.
+    """
+
+    def __init__(self, max_turns=HISTORY_MAX_TURNS, keep_turns=HISTORY_KEEP_TURNS):
+        self.keep_turns = keep_turns
+        self.turns = deque(maxlen=max_turns)
+        self.topics = ChatTopics()
+        self.summary_questions = deque(maxlen=SUMMARY_MAX_QUESTIONS)
+        self.compacted_turns = 0
+        self.total_turns = 0
+
+    def append(self, turn):
+        """
+        Registra uma troca ({'user', 'assistant', 'timestamp'}).
+
+        Returns:
+            True se trocas antigas foram compactadas no resumo
+        """
+        compacted = False
+        if len(self.turns) == self.turns.maxlen:
+            self.compact()
+            compacted = True
+        self.turns.append(turn)
+        self.total_turns += 1
+        return compacted
+
+    def compact(self):
+        """Move as trocas mais antigas para o resumo, preservando as `keep_turns` mais recentes"""
+        while len(self.turns) > self.keep_turns:
+            turn = self.turns.popleft()
+            question = ' '.join(turn['user'].split())
+            if len(question) > SUMMARY_QUESTION_CHARS:
+                question = question[:SUMMARY_QUESTION_CHARS - 3].rstrip() + '...'
+            self.summary_questions.append(question)
+            self.compacted_turns += 1
+
+    def summary(self):
+        """Texto do resumo das trocas compactadas (vazio se ainda não houver)"""
+        if not self.compacted_turns:
+            return ''
+        parts = [f"{self.compacted_turns} mensagens anteriores"]
+        if len(self.topics):
+            parts.append(f"tópicos: {', '.join(self.topics)}")
+        if self.summary_questions:
+            parts.append(f"perguntas recentes: {'; '.join(self.summary_questions)}")
+        return '; '.join(parts)
+
+    def context(self, budget_tokens=PROMPT_HISTORY_TOKENS):
+        """
+        Monta o histórico do prompt dentro de um orçamento de tokens: o resumo
+        e, a partir da troca mais recente, tantas trocas quanto couberem.
+
+        Returns:
+            Tupla (resumo, lista de trocas em ordem cronológica)
+        """
+        summary = self.summary()
+        remaining = budget_tokens - estimate_tokens(summary) if summary else budget_tokens
+
+        selected = []
+        for turn in reversed(self.turns):
+            cost = estimate_tokens(turn['user']) + estimate_tokens(turn['assistant'])
+            if cost > remaining:
+                break
+            selected.append(turn)
+            remaining -= cost
+        selected.reverse()
+        return summary, selected
+
+    def restore(self, topics, questions, compacted_turns):
+        """Restaura o resumo gravado de uma sessão anterior"""
+        for topic in topics:
+            self.topics.add(topic)
+        self.summary_questions.extend(questions)
+        self.compacted_turns = compacted_turns
+
+    def __iter__(self):
+        return iter(self.turns)
+
+    def __len__(self):
+        return len(self.turns)
+
+class ChatMessageWriter:
+    """
+    Grava mensagens e resumos do chatbot em segundo plano.
+
+    As requisições apenas enfileiram os registros; um thread dedicado os grava
+    em lotes, com uma transação por lote e conexão própria. A fila é limitada:
+    se o banco não acompanhar, registros excedentes são descartados (e
+    registrados no log) em vez de atrasar as respostas.
+    """
+
+    def __init__(self, connect, max_queue=WRITER_QUEUE_SIZE):
+        self._connect = connect
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='chat-message-writer', daemon=True)
+                self._thread.start()
+
+    def _enqueue(self, record):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            logging.error("Fila de gravação do chatbot cheia: registro descartado")
+
+    def save_message(self, session_id, user_message, bot_response, timestamp):
+        """Enfileira uma troca para gravação em chatbot_messages"""
+        self._enqueue(('message', (user_message, bot_response, timestamp, session_id)))
+
+    def save_summary(self, session_id, memory, updated_at):
+        """Enfileira o resumo atual da conversa da sessão"""
+        self._enqueue(('summary', (session_id, '\n'.join(memory.topics),
+                                   '\n'.join(memory.summary_questions), memory.compacted_turns, updated_at)))
+
+    def _drain(self, first):
+        batch = [first]
+        while len(batch) < WRITER_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        messages = [params for kind, params in batch if kind == 'message']
+        summaries = [params for kind, params in batch if kind == 'summary']
+
+        conn = self._connect()
+        try:
+            if messages:
+                conn.executemany('''
+                    INSERT INTO chatbot_messages (user_message, bot_response, timestamp, session_id)
+                    VALUES (?, ?, ?, ?)
+                ''', messages)
+            if summaries:
+                conn.executemany('''
+                    INSERT INTO chatbot_summaries (session_id, topics, questions, compacted_turns, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (session_id) DO UPDATE SET
+                        topics = excluded.topics, questions = excluded.questions,
+                        compacted_turns = excluded.compacted_turns, updated_at = excluded.updated_at
+                ''', summaries)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                self._queue.task_done()
+                return
+
+            batch = self._drain(record)
+            stop = None in batch
+            batch = [item for item in batch if item is not None]
+            try:
+                if batch:
+                    self._write(batch)
+            except Exception as e:
+                logging.error(f"Erro ao gravar mensagens do chatbot: {str(e)}")
+            finally:
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """Aguarda a gravação de todos os registros enfileirados"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def stop(self, timeout=5):
+        """Grava os registros pendentes e encerra o thread de gravação"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+def load_summary(conn, session_id):
+    """
+    Lê o resumo gravado da conversa de uma sessão.
+
+    Returns:
+        Tupla (topics, questions, compacted_turns) ou None
+    """
+    cursor = conn.cursor()
+    cursor.execute('SELECT topics, questions, compacted_turns FROM chatbot_summaries WHERE session_id = ?',
+                   (session_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    topics = [topic for topic in row[0].split('\n') if topic]
+    questions = [question for question in row[1].split('\n') if question]
+    return topics, questions, row[2]
+
+def _default_connect():
+    from db import get_db_connection
+    # Fora de um contexto Flask, get_db_connection abre uma conexão nova
+    return get_db_connection()
+
+# Gravador compartilhado pelo processo (grava o que estiver pendente ao encerrar)
+message_writer = ChatMessageWriter(_default_connect)
+atexit.register(message_writer.stop)
@@ -0,0 +1,111 @@
+import logging
+
+from analysis_cache import cached_analysis
+from db import analyze_financial_situation, get_unread_alerts
+from financial_snapshot import get_financial_snapshot, get_snapshot_alerts, get_goals_progress
+from ml_prediction import predict_next_month_expenses, get_models_version
+from preferences_store import load_preferences
+
+# Blocos disponíveis no painel (parâmetro fields)
+DASHBOARD_FIELDS = ('summary', 'recent_transactions', 'alerts', 'goals', 'predictions')
+
+# Blocos calculados a partir do snapshot financeiro (lido uma única vez)
+_SNAPSHOT_FIELDS = ('summary', 'alerts', 'goals')
+
+# Transações recentes retornadas por padrão e no máximo
+RECENT_TRANSACTIONS = 10
+MAX_RECENT_TRANSACTIONS = 100
+
+# Alertas não lidos incluídos no painel
+DASHBOARD_UNREAD_ALERTS = 5
+
+@cached_analysis(scopes=('transactions', 'categories'))
+def _cached_predictions(conn, models_version):
+    """
+    Previsão do próximo mês, recalculada só após escritas ou um novo treinamento
+    (models_version). Apenas inferência: sem modelos treinados retorna None, e
+    o treinamento fica com /api/ml/train (sujeito ao limite de admissão).
+    """
+    return predict_next_month_expenses(conn, allow_training=False)
+
+def get_recent_transactions(conn, limit=RECENT_TRANSACTIONS):
+    """Transações mais recentes, com o nome da categoria"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT t.id, t.date, t.description, t.amount, t.type, t.category_id, c.name
+        FROM transactions t
+        LEFT JOIN categories c ON c.id = t.category_id
+        ORDER BY t.date DESC, t.id DESC
+        LIMIT ?
+    ''', (limit,))
+    return [{
+        'id': transaction_id,
+        'date': date,
+        'description': description,
+        'amount': amount,
+        'type': type,
+        'category_id': category_id,
+        'category': category
+    } for transaction_id, date, description, amount, type, category_id, category in cursor.fetchall()]
+
+def _summary(snapshot):
+    analysis = analyze_financial_situation(snapshot['total_income'], snapshot['total_expense'], snapshot['balance'])
+    return {
+        'month': snapshot['month'],
+        'total_income': snapshot['total_income'],
+        'total_expense': snapshot['total_expense'],
+        'balance': snapshot['balance'],
+        'month_balance': snapshot['month_balance'],
+        'top_categories': snapshot['top_categories'],
+        'status': analysis['status'],
+        'message': analysis['message']
+    }
+
+def _alerts(conn, snapshot):
+    user_name = load_preferences(conn).get('nome', 'usuário')
+    alerts = get_snapshot_alerts(snapshot, user_name)
+    unread, unread_count = get_unread_alerts(conn, DASHBOARD_UNREAD_ALERTS)
+    return {
+        'alerts': alerts,
+        'unread': unread,
+        'unread_count': unread_count
+    }
+
+def _predictions(conn):
+    try:
+        return _cached_predictions(conn, get_models_version())
+    except Exception as e:
+        # Uma falha na previsão não impede o restante do painel
+        logging.error(f"Erro ao obter previsões para o painel: {str(e)}")
+        return {'error': 'Previsões indisponíveis'}
+
+def build_dashboard(conn, fields=None, limit=RECENT_TRANSACTIONS):
+    """
+    Monta os dados do painel em uma única conexão: resumo, alertas e metas vêm
+    do mesmo snapshot financeiro (mantido na escrita), as transações recentes
+    de uma consulta limitada e as previsões do cache de análises.
+
+    Args:
+        conn: Conexão com o banco
+        fields: Blocos a incluir (padrão: todos os de DASHBOARD_FIELDS)
+        limit: Número de transações recentes
+
+    Returns:
+        Dicionário com um item por bloco solicitado
+    """
+    fields = [field for field in DASHBOARD_FIELDS if fields is None or field in fields]
+    snapshot = get_financial_snapshot(conn) if any(field in _SNAPSHOT_FIELDS for field in fields) else None
+
+    dashboard = {}
+    for field in fields:
+        if field == 'summary':
+            dashboard['summary'] = _summary(snapshot)
+        elif field == 'recent_transactions':
+            dashboard['recent_transactions'] = get_recent_transactions(conn, min(limit, MAX_RECENT_TRANSACTIONS))
+        elif field == 'alerts':
+            dashboard['alerts'] = _alerts(conn, snapshot)
+        elif field == 'goals':
+            dashboard['goals'] = get_goals_progress(snapshot)
+        elif field == 'predictions':
+            dashboard['predictions'] = _predictions(conn)
+    return dashboard
@@ -1,10 +1,29 @@
 import sqlite3
+import logging
 import os
+import time
 from datetime import datetime
+from flask import g, has_app_context
+from merchant_classifier import classify_description
+from recurring_detector import init_recurring_tables, rebuild_recurring_series, update_recurring_series
+from anomaly_detector import category_stats_outdated, init_anomaly_tables, rebuild_category_stats, record_expense
+from analysis_cache import init_data_versions, get_data_versions
+from preferences_store import init_preferences_table, import_legacy_preferences
+from llm_cache import init_llm_cache_table
+from chat_memory import init_chat_memory_tables
+from financial_snapshot import init_snapshot_table, refresh_snapshot, get_snapshot_versions, apply_transaction_to_snapshot
+from time_index import get_index_version, defer_transaction, flush_index
+from transaction_query import init_transaction_indexes
+from sync_feed import init_change_log, prune_change_log, SYNC_TABLES
+from alert_stream import defer_alert, flush_alerts
+from metrics import InstrumentedConnection, bank_transactions_ingested
 
 # Caminho para o banco de dados
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'finance.db')
 
+# Instruções da máquina virtual do SQLite entre as verificações de prazo (run_with_deadline)
+DEADLINE_CHECK_STEPS = 10000
+
 def init_db():
     """Inicializa o banco de dados e cria as tabelas necessárias se não existirem"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -62,7 +81,7 @@ def init_db():
                     # Remover tabela antiga
                     cursor.execute('DROP TABLE transactions_old')
                 except sqlite3.Error as e:
-                    print(f"Erro na migração: {e}")
+                    logging.error(f"Erro na migração: {e}")
         else:
             # A tabela não existe, então apenas cria a nova
             cursor.execute('''
@@ -156,6 +175,51 @@ def init_db():
     )
     ''')
     
+    # Mensagens do chatbot por sessão e resumos das conversas compactadas
+    _ensure_columns(cursor, 'chatbot_messages', [('session_id', 'TEXT')])
+    init_chat_memory_tables(cursor)
+    
+    # Colunas de classificação de comerciante (preenchidas na escrita)
+    init_merchant_classification(cursor)
+
+    # Índices da listagem paginada de transações (keyset por data e id)
+    init_transaction_indexes(cursor, _table_exists(cursor, 'bank_transactions'))
+
+    # Séries de pagamentos recorrentes (detectadas sobre todo o histórico na
+    # primeira execução e atualizadas incrementalmente a cada nova transação)
+    init_recurring_tables(cursor)
+    cursor.execute('SELECT COUNT(*) FROM recurring_series')
+    if cursor.fetchone()[0] == 0:
+        rebuild_recurring_series(conn)
+
+    # Estatísticas contínuas por categoria para sinalizar gastos incomuns na escrita
+    # (recalculadas, junto com is_anomaly do histórico, se ausentes ou desatualizadas)
+    _ensure_columns(cursor, 'transactions', [('is_anomaly', 'INTEGER NOT NULL DEFAULT 0')])
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_anomaly ON transactions (is_anomaly, date)')
+    init_anomaly_tables(cursor)
+    if category_stats_outdated(cursor):
+        rebuild_category_stats(conn)
+
+    # Versões dos dados (incrementadas por triggers) usadas para invalidar caches
+    init_data_versions(cursor)
+
+    # Alertas e sugestões de investimento são versionados para os ETags das rotas (http_cache)
+    init_data_versions(cursor, tables=('alerts', 'investment_suggestions'))
+
+    # Log de alterações do feed de sincronização dos clientes móveis (preenchido por triggers)
+    init_change_log(cursor, [table for table in SYNC_TABLES if _table_exists(cursor, table)])
+    prune_change_log(conn)
+
+    # Snapshot financeiro (totais do mês, limites e metas) mantido na escrita
+    init_snapshot_table(cursor)
+
+    # Preferências do usuário (antes gravadas em user_preferences.json)
+    init_preferences_table(cursor)
+    import_legacy_preferences(conn)
+
+    # Respostas do modelo de linguagem em cache (persistem entre reinícios)
+    init_llm_cache_table(cursor)
+
     # Inserir categorias padrão se a tabela estiver vazia
     cursor.execute('SELECT COUNT(*) FROM categories')
     if cursor.fetchone()[0] == 0:
@@ -190,20 +254,234 @@ def init_db():
         INSERT INTO investment_suggestions (name, description, risk_level, min_investment, expected_return) 
         VALUES (?, ?, ?, ?, ?)''', default_investments)
     
+    # Snapshot gravado na inicialização (as leituras não gravam; ver get_financial_snapshot)
+    refresh_snapshot(conn)
+    
     conn.commit()
     conn.close()
     
-    print("Banco de dados inicializado com sucesso.")
+    logging.info("Banco de dados inicializado com sucesso.")
 
-def get_db_connection():
-    """Retorna uma conexão ao banco de dados"""
-    conn = sqlite3.connect(DATABASE_PATH)
+# Colunas de classificação de comerciante calculadas uma única vez na escrita
+MERCHANT_COLUMNS = [
+    ('merchant_key', 'TEXT'),
+    ('is_subscription', 'INTEGER NOT NULL DEFAULT 0'),
+    ('merchant_class', 'TEXT')
+]
+
+# Colunas opcionais aceitas por insert_bank_transaction
+BANK_TRANSACTION_OPTIONAL_COLUMNS = (
+    'destination_account_id', 'category_id', 'transaction_reference', 'import_method',
+    'notification_hash', 'raw_notification', 'card_info'
+)
+
+def _table_exists(cursor, table):
+    """Verifica se uma tabela existe no banco de dados"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    return cursor.fetchone() is not None
+
+def _ensure_columns(cursor, table, columns):
+    """Adiciona a uma tabela existente as colunas que ainda não existem"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {row[1] for row in cursor.fetchall()}
+
+    for name, definition in columns:
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+
+def _backfill_merchant_columns(cursor, table):
+    """Classifica as linhas gravadas antes da existência das colunas de comerciante"""
+    cursor.execute(f'SELECT id, description FROM {table} WHERE merchant_key IS NULL')
+    rows = cursor.fetchall()
+
+    if rows:
+        cursor.executemany(
+            f'UPDATE {table} SET merchant_key = ?, is_subscription = ?, merchant_class = ? WHERE id = ?',
+            [(*classify_description(description), row_id) for row_id, description in rows]
+        )
+
+def init_merchant_classification(cursor):
+    """Cria as colunas e índices de classificação de comerciante e preenche linhas antigas"""
+    for table in ('transactions', 'bank_transactions'):
+        if not _table_exists(cursor, table):
+            continue
+
+        _ensure_columns(cursor, table, MERCHANT_COLUMNS)
+        _backfill_merchant_columns(cursor, table)
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_type_date ON transactions (type, date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_merchant ON transactions (merchant_key, date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_subscription ON transactions (is_subscription, date)')
+
+    if _table_exists(cursor, 'bank_transactions'):
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bank_transactions_merchant ON bank_transactions (merchant_key, transaction_date)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bank_transactions_subscription ON bank_transactions (is_subscription, transaction_date)')
+
+def insert_transaction(conn, date, description, amount, type, category_id=None, commit=True):
+    """
+    Registra uma transação já classificada por comerciante.
+
+    Args:
+        conn: Conexão com o banco de dados
+        date: Data da transação (YYYY-MM-DD)
+        description: Descrição da transação
+        amount: Valor da transação
+        type: 'income' ou 'expense'
+        category_id: Categoria da transação (opcional)
+        commit: Se True, confirma a transação no banco
+
+    Returns:
+        O id da transação criada
+    """
+    merchant_key, is_subscription, merchant_class = classify_description(description)
+
+    # Versões vistas pelo índice de prefixos e pelo snapshot antes da escrita
+    # (permitem atualizá-los sem reconstruir)
+    versions_before = get_data_versions(conn)
+    index_version = get_index_version(conn, versions_before)
+    snapshot_versions = get_snapshot_versions(conn, versions_before)
+
+    cursor = conn.cursor()
+    cursor.execute('''
+    INSERT INTO transactions (date, description, amount, type, category_id,
+                              merchant_key, is_subscription, merchant_class)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (date, description, amount, type, category_id, merchant_key, is_subscription, merchant_class))
+    transaction_id = cursor.lastrowid
+
+    # Atualizar a série recorrente do comerciante (lê apenas o histórico dele)
+    update_recurring_series(conn, merchant_key, amount, type, commit=False)
+
+    # Atualizar a linha de base da categoria e sinalizar despesas incomuns
+    if type == 'expense':
+        alert = record_expense(conn, transaction_id, category_id, amount, description)
+        if alert:
+            # Enviado aos clientes conectados em /api/alerts/stream após o commit
+            defer_alert(alert)
+
+    # Anexar a transação às somas acumuladas diárias por categoria (após o commit)
+    defer_transaction(conn, index_version, date, type, category_id, amount)
+
+    # Atualizar os totais do snapshot financeiro usado pelo agente
+    apply_transaction_to_snapshot(conn, snapshot_versions, date, type, category_id, amount)
+
+    if commit:
+        conn.commit()
+        flush_alerts()
+        flush_index()
+    return transaction_id
+
+def insert_bank_transaction(conn, account_id, transaction_type, amount, description,
+                            transaction_date, commit=True, **optional):
+    """
+    Registra uma transação bancária (por exemplo, importada de uma notificação)
+    já classificada por comerciante.
+
+    Args:
+        conn: Conexão com o banco de dados
+        account_id: Conta bancária da transação
+        transaction_type: 'deposit', 'withdrawal' ou 'transfer'
+        amount: Valor da transação
+        description: Descrição da transação
+        transaction_date: Data da transação
+        commit: Se True, confirma a transação no banco
+        optional: Demais colunas de bank_transactions (ver BANK_TRANSACTION_OPTIONAL_COLUMNS)
+
+    Returns:
+        O id da transação bancária criada
+    """
+    unknown = set(optional) - set(BANK_TRANSACTION_OPTIONAL_COLUMNS)
+    if unknown:
+        raise ValueError(f"Colunas desconhecidas para bank_transactions: {', '.join(sorted(unknown))}")
+
+    merchant_key, is_subscription, merchant_class = classify_description(description)
+
+    columns = ['account_id', 'transaction_type', 'amount', 'description', 'transaction_date',
+               'merchant_key', 'is_subscription', 'merchant_class', *optional.keys()]
+    values = [account_id, transaction_type, amount, description, transaction_date,
+              merchant_key, is_subscription, merchant_class, *optional.values()]
+
+    cursor = conn.cursor()
+    cursor.execute(
+        f"INSERT INTO bank_transactions ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+        values
+    )
+    bank_transaction_id = cursor.lastrowid
+    bank_transactions_ingested.inc(optional.get('import_method') or 'manual')
+
+    if commit:
+        conn.commit()
+    return bank_transaction_id
+
+def _connect():
+    """Abre uma nova conexão ao banco de dados (utilizável apenas pelo thread que a abriu)"""
+    # Conexões instrumentadas: contagem e duração das consultas vão para /metrics
+    conn = sqlite3.connect(DATABASE_PATH, factory=InstrumentedConnection)
     conn.row_factory = sqlite3.Row
     return conn
 
+def run_with_connection(func, *args, **kwargs):
+    """
+    Executa func(conn, *args, **kwargs) com uma conexão própria, fechada ao final.
+
+    Usada pelo código que roda fora do thread da requisição (asyncio.to_thread,
+    executores): a conexão da requisição pertence ao thread que a abriu.
+    """
+    conn = _connect()
+    try:
+        return func(conn, *args, **kwargs)
+    finally:
+        conn.close()
+
+def run_with_deadline(deadline, func, *args, **kwargs):
+    """
+    Como run_with_connection, mas o trabalho termina no prazo: as consultas em
+    andamento são interrompidas pelo SQLite quando `deadline` (instante de
+    time.monotonic()) passa, e um trabalho que só começa depois do prazo (por
+    ter esperado na fila do executor) nem abre a conexão.
+
+    Raises:
+        TimeoutError: O prazo terminou antes ou durante o trabalho
+    """
+    if time.monotonic() >= deadline:
+        raise TimeoutError("Prazo esgotado antes do início do trabalho")
+
+    conn = _connect()
+    conn.set_progress_handler(lambda: int(time.monotonic() >= deadline), DEADLINE_CHECK_STEPS)
+    try:
+        return func(conn, *args, **kwargs)
+    except sqlite3.OperationalError as e:
+        if time.monotonic() >= deadline:
+            raise TimeoutError("Prazo esgotado durante o trabalho") from e
+        raise
+    finally:
+        conn.close()
+
+def get_db_connection():
+    """
+    Retorna uma conexão ao banco de dados.
+    
+    Dentro de uma requisição Flask a conexão é compartilhada pela requisição e
+    fechada no teardown (close_db_connection); fora dela, uma nova conexão é aberta.
+    A conexão da requisição só pode ser usada no thread da requisição: views
+    assíncronas (que rodam no thread do event loop) e trabalhos enviados a
+    outros threads usam run_with_connection.
+    """
+    if has_app_context():
+        if 'db_conn' not in g:
+            g.db_conn = _connect()
+        return g.db_conn
+    return _connect()
+
+def close_db_connection(exception=None):
+    """Fecha a conexão da requisição atual, se houver (registrada no teardown do Flask)"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.close()
+
 def get_category_by_name(name, type):
     """Busca uma categoria pelo nome e tipo"""
-    conn = get_db_connection()
+    conn = _connect()
     cursor = conn.cursor()
     
     cursor.execute('SELECT id FROM categories WHERE name = ? AND type = ?', (name, type))
@@ -219,7 +497,7 @@ def calculate_savings_goal(income_total):
 
 def check_category_limits():
     """Verifica se alguma categoria excedeu o limite definido"""
-    conn = get_db_connection()
+    conn = _connect()
     cursor = conn.cursor()
     
     # Obter o mês atual
@@ -251,19 +529,43 @@ def check_category_limits():
             VALUES (?, ?, ?)
             ''', ('expense_limit', alert_message, datetime.now().strftime('%Y-%m-%d')))
             
-            alerts.append({
+            alert = {
                 'type': 'expense_limit',
                 'message': alert_message,
                 'date': datetime.now().strftime('%Y-%m-%d')
-            })
+            }
+            alerts.append(alert)
+            defer_alert({'id': cursor.lastrowid, **alert})
     
     conn.commit()
     conn.close()
+    
+    # Enviar os novos alertas aos clientes conectados em /api/alerts/stream
+    flush_alerts()
     return alerts
 
+def get_unread_alerts(conn, limit=5):
+    """
+    Alertas gravados ainda não lidos, do mais recente ao mais antigo.
+    
+    Returns:
+        Tupla (lista de até `limit` alertas, total de não lidos)
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, type, message, date FROM alerts
+        WHERE is_read = 0
+        ORDER BY date DESC, id DESC
+        LIMIT ?
+    ''', (limit,))
+    unread = [{"id": alert_id, "type": alert_type, "message": message, "date": alert_date}
+              for alert_id, alert_type, message, alert_date in cursor.fetchall()]
+    cursor.execute('SELECT COUNT(*) FROM alerts WHERE is_read = 0')
+    return unread, cursor.fetchone()[0]
+
 def get_investment_suggestions(balance):
     """Retorna sugestões de investimento com base no saldo"""
-    conn = get_db_connection()
+    conn = _connect()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -1,20 +1,79 @@
 import os
+import asyncio
 import logging
 import random
 import json
 import re
 import datetime
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from datetime import date
 import google.generativeai as genai
+from budget_analyzer import get_cost_cutting_recommendation, get_savings_frontier
+from preferences_store import load_preferences, save_preferences
+from llm_cache import llm_cache, hash_context
+from financial_snapshot import get_financial_snapshot, get_snapshot_alerts, get_goals_progress
+from db import analyze_financial_situation, get_investment_suggestions, get_unread_alerts, run_with_connection
+from intent_router import route_message
+from chat_memory import ConversationMemory, message_writer, load_summary
+from metrics import llm_duration, llm_errors
+
+# Modelo de linguagem (Gemini); sem chave de API o agente usa as respostas locais
+GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+GEMINI_MODEL_NAME = os.environ.get('GEMINI_MODEL', 'gemini-1.5-flash')
+
+_model = None
+_model_lock = threading.Lock()
+
+def _get_model():
+    """Instancia o modelo uma única vez por processo (None se não houver chave de API)"""
+    global _model
+    if not GEMINI_API_KEY:
+        return None
+    with _model_lock:
+        if _model is None:
+            genai.configure(api_key=GEMINI_API_KEY)
+            _model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    return _model
+
+# Alertas não lidos (tabela alerts) incluídos na resposta de alertas
+MAX_UNREAD_ALERTS = 5
+
+# Número máximo de agentes (sessões) mantidos em memória
+AGENT_CACHE_SIZE = 64
+
+# Tempo de inatividade (segundos) após o qual a sessão do agente é descartada
+AGENT_TTL_SECONDS = 30 * 60
+
+# Tamanho máximo do identificador de sessão aceito do cliente
+MAX_SESSION_ID_LENGTH = 128
 
 class FinancialAgent:
+    """
+    Agente financeiro de uma sessão de conversa.
+
+    O agente é compartilhado pelas requisições da sessão (ver AgentCache) e
+    nunca guarda uma conexão: os métodos que consultam o banco recebem a
+    conexão de quem os chama, já que cada conexão SQLite pertence ao thread
+    que a abriu. O histórico e os tópicos da conversa são protegidos por uma
+    trava, pois requisições da mesma sessão podem chegar ao mesmo tempo.
+    """
+
     def __init__(self):
         """Inicializa o agente financeiro com configurações para torná-lo mais conversacional"""
         self.user_name = "usuário"
         self.user_preferences = {}
         self.user_interests = []
-        self.conversation_history = []
-        self.chat_topics = set()
+        self.session_id = 'default'
+        # Histórico limitado (trocas recentes + resumo das antigas) e tópicos da conversa
+        self.conversation_history = ConversationMemory()
+        self.chat_topics = self.conversation_history.topics
+        self._summary_restored = False
+        self._lock = threading.Lock()
+        # Modelo usado nas respostas (None: usa o modelo do processo, se configurado)
+        self.model = None
         
         # Adicionando contexto de conversa para tornar o chatbot mais natural
         self.conversation_context = {
@@ -32,45 +91,63 @@ class FinancialAgent:
             "empathy": "high"         # low, medium, high
         }
         
-        # Tenta carregar preferências salvas do usuário
-        self._load_user_preferences()
-        
-        logging.basicConfig(filename='financial_agent.log', level=logging.INFO,
-                           format='%(asctime)s - %(levelname)s - %(message)s')
         logging.info("Agente financeiro inicializado com personalidade conversacional")
 
-    def _load_user_preferences(self):
-        """Carrega preferências do usuário se existirem"""
+    def _apply_preferences(self, preferences):
+        """Atualiza o estado do agente a partir das preferências carregadas"""
+        self.user_preferences = preferences
+        if 'nome' in preferences:
+            self.user_name = preferences['nome']
+        if 'interesses' in preferences:
+            self.user_interests = preferences['interesses']
+    
+    def load_user_preferences(self, conn):
+        """Carrega as preferências do banco de dados (através do cache em memória)"""
         try:
-            if os.path.exists('user_preferences.json'):
-                with open('user_preferences.json', 'r') as f:
-                    self.user_preferences = json.load(f)
-                    if 'nome' in self.user_preferences:
-                        self.user_name = self.user_preferences['nome']
-                    if 'interesses' in self.user_preferences:
-                        self.user_interests = self.user_preferences['interesses']
-                    logging.info(f"Preferências do usuário carregadas para: {self.user_name}")
+            self._apply_preferences(load_preferences(conn))
         except Exception as e:
             logging.error(f"Erro ao carregar preferências do usuário: {str(e)}")
+        return self.user_preferences
+    
+    def save_preference(self, conn, key, value):
+        """Salva uma preferência do usuário"""
+        self.save_preferences(conn, {key: value})
+    
+    def save_preferences(self, conn, preferences):
+        """
+        Salva várias preferências do usuário em uma única transação.
+        
+        Args:
+            conn: Conexão com o banco de dados
+            preferences: Dicionário {chave: valor}
+        """
+        for key, value in preferences.items():
+            if key in ('user_name', 'nome'):
+                self.user_name = value
+            if key == 'interesses':
+                self.user_interests = value
+        self.user_preferences.update(preferences)
+        self._save_user_preferences(conn, preferences)
+        
+    def _save_user_preferences(self, conn, changes=None):
+        """Grava as preferências alteradas (e os dados da conversa) no banco de dados"""
+        changes = dict(changes or {})
+        changes['nome'] = self.user_name
+        changes['interesses'] = self.user_interests
+        changes['last_conversation'] = datetime.datetime.now().isoformat()
+        self.user_preferences.update(changes)
         
-    def _save_user_preferences(self):
-        """Salva preferências do usuário"""
         try:
-            self.user_preferences['nome'] = self.user_name
-            self.user_preferences['interesses'] = self.user_interests
-            self.user_preferences['last_conversation'] = datetime.datetime.now().isoformat()
-            
-            with open('user_preferences.json', 'w') as f:
-                json.dump(self.user_preferences, f)
+            save_preferences(conn, changes)
             logging.info(f"Preferências salvas para usuário: {self.user_name}")
         except Exception as e:
             logging.error(f"Erro ao salvar preferências: {str(e)}")
     
-    def update_user_name(self, name):
+    def update_user_name(self, conn, name):
         """Atualiza o nome do usuário"""
         self.user_name = name
         self.user_preferences['nome'] = name
-        self._save_user_preferences()
+        self._save_user_preferences(conn)
         return f"Nome atualizado para {name}. Agora nossas conversas serão mais personalizadas!"
 
     def _get_fallback_response(self, query):
@@ -94,13 +171,13 @@ class FinancialAgent:
         }
         
         # Verifica se há palavras-chave no query
-        for keyword, response in keyword_responses.items():
-            if keyword.lower() in query.lower():
-                return response
+        keyword = route_message(query)['fallback_keyword']
+        if keyword:
+            return keyword_responses[keyword]
                 
         # Adiciona sugestões personalizadas com base no histórico
         if self.chat_topics:
-            last_topics = list(self.chat_topics)[-2:] if len(self.chat_topics) > 1 else list(self.chat_topics)
+            last_topics = self.chat_topics.recent(2)
             topic_suggestions = {
                 "orçamento pessoal": "Já pensou em usar a técnica de envelopes para controlar melhor seu orçamento?",
                 "análise de gastos": "Você sabia que visualizar seus gastos em gráficos pode revelar padrões surpreendentes?",
@@ -155,7 +232,9 @@ class FinancialAgent:
         suggestions.extend(basic_suggestions[:2])
         
         # Adiciona sugestões baseadas nos tópicos conversados
-        for topic in self.chat_topics:
+        with self._lock:
+            topics = list(self.chat_topics)
+        for topic in topics:
             if topic in topic_based_suggestions and random.random() < 0.7:  # 70% de chance
                 topic_sugg = random.choice(topic_based_suggestions[topic])
                 if topic_sugg not in suggestions:
@@ -166,44 +245,454 @@ class FinancialAgent:
         
     def detect_user_intent(self, query):
         """Detecta a intenção do usuário para personalizar a resposta"""
-        intent = {
-            "action": None,
-            "topic": None,
-            "sentiment": "neutral",
-            "is_question": False
+        route = route_message(query)
+        return {
+            "action": route["action"],
+            "topic": route["topics"][0] if route["topics"] else None,
+            "sentiment": route["sentiment"],
+            "is_question": route["is_question"]
         }
+
+    def _update_topics(self, query):
+        """Registra os tópicos financeiros mencionados na mensagem"""
+        with self._lock:
+            for topic in route_message(query)['topics']:
+                self.chat_topics.add(topic)
+                self.conversation_context["last_topic"] = topic
+
+    def _get_financial_context(self, conn):
+        """Resumo compacto da situação financeira (lido do snapshot), usado no prompt"""
+        snapshot = get_financial_snapshot(conn)
+        return {
+            "month": snapshot["month"],
+            "income": round(snapshot["total_income"], 2),
+            "expenses": round(snapshot["total_expense"], 2),
+            "balance": round(snapshot["balance"], 2),
+            "top_categories": {item["category"]: round(item["amount"], 2) for item in snapshot["top_categories"][:3]},
+            "limits_exceeded": [item["category"] for item in snapshot["limit_status"] if item["exceeded"]],
+            "goals": {goal["name"]: round(goal["progress"], 1) for goal in snapshot["goals"]}
+        }
+
+    def get_financial_insights(self, conn):
+        """
+        Insights financeiros do mês a partir do snapshot mantido na escrita
+        (sem consultas analíticas sobre as transações).
+        
+        Args:
+            conn: Conexão com o banco de dados
+            
+        Returns:
+            Dicionário com resumo, principais categorias, limites, metas,
+            recomendações, alertas e sugestões de investimento
+        """
+        snapshot = get_financial_snapshot(conn)
+        analysis = analyze_financial_situation(
+            snapshot["total_income"], snapshot["total_expense"], snapshot["balance"]
+        )
+        
+        alerts = [{
+            "type": "expense_limit",
+            "message": f"Você excedeu o limite de gastos em {item['category']} em {item['percentage'] - 100:.1f}%"
+        } for item in snapshot["limit_status"] if item["exceeded"]]
         
-        # Detecta se é uma pergunta
-        if "?" in query or any(word in query.lower() for word in ["como", "qual", "quanto", "onde", "quando", "por que"]):
-            intent["is_question"] = True
-        
-        # Detecta ações
-        action_keywords = {
-            "mostrar": "show",
-            "exibir": "show", 
-            "analisar": "analyze",
-            "comparar": "compare",
-            "adicionar": "add",
-            "criar": "create",
-            "ajuda": "help",
-            "preciso": "need"
+        return {
+            "month": snapshot["month"],
+            "summary": {
+                "total_income": snapshot["total_income"],
+                "total_expense": snapshot["total_expense"],
+                "balance": snapshot["balance"],
+                "month_balance": snapshot["month_balance"],
+                "status": analysis["status"],
+                "message": analysis["message"]
+            },
+            "top_categories": snapshot["top_categories"],
+            "category_limits": snapshot["limit_status"],
+            "goals": snapshot["goals"],
+            "recommendations": analysis["recommendations"],
+            "alerts": alerts,
+            "investment_suggestions": get_investment_suggestions(snapshot["balance"]) if snapshot["balance"] > 0 else []
         }
+
+    def get_financial_goals_progress(self, conn):
+        """Progresso das metas de economia em aberto (lido do snapshot)"""
+        return get_goals_progress(get_financial_snapshot(conn))
+
+    def get_personalized_alert(self, conn):
+        """
+        Alertas do momento para o usuário, a partir do snapshot (limites, saldo
+        do mês e prazos das metas) e dos alertas gravados ainda não lidos.
         
-        for keyword, action in action_keywords.items():
-            if keyword.lower() in query.lower():
-                intent["action"] = action
-                break
-                
-        # Detecta sentimento
-        sentiment_keywords = {
-            "positivo": ["feliz", "satisfeito", "ótimo", "excelente", "gosto", "animado"],
-            "negativo": ["triste", "frustrado", "difícil", "preocupado", "problema", "dívida", "não consigo"],
-            "confuso": ["confuso", "dúvida", "não entendo", "complicado", "como assim"]
+        Returns:
+            Dicionário com o alerta mais importante ('alert', None se não houver),
+            a lista de alertas em ordem de prioridade, os alertas não lidos e
+            o total de não lidos
+        """
+        alerts = get_snapshot_alerts(get_financial_snapshot(conn), self.user_name)
+        unread, unread_count = get_unread_alerts(conn, MAX_UNREAD_ALERTS)
+        
+        return {
+            "alert": alerts[0] if alerts else None,
+            "alerts": alerts,
+            "unread": unread,
+            "unread_count": unread_count
         }
+
+    def _build_prompt(self, query, financial_context, intent):
+        """Monta o prompt enviado ao modelo"""
+        with self._lock:
+            summary, turns = self.conversation_history.context()
+        history = "\n".join(
+            f"Usuário: {turn['user']}\nAssistente: {turn['assistant']}"
+            for turn in turns
+        )
+        prompt = (
+            f"Você é um assistente financeiro pessoal, conversacional e empático, que responde em português. "
+            f"Formalidade: {self.personality_traits['formality']}. Humor: {self.personality_traits['humor_level']}.\n"
+            f"Nome do usuário: {self.user_name}. Interesses: {', '.join(self.user_interests) or 'não informados'}.\n"
+            f"Situação financeira do mês: {json.dumps(financial_context, ensure_ascii=False)}\n"
+            f"Sentimento percebido: {intent['sentiment']}.\n"
+        )
+        if summary:
+            prompt += f"Resumo da conversa anterior: {summary}\n"
+        if history:
+            prompt += f"Conversa recente:\n{history}\n"
+        return prompt + f"Usuário: {query}\nAssistente:"
+
+    def _prepare_response(self, conn, query):
+        """
+        Etapas comuns às respostas completas e em streaming: intenção, tópicos,
+        contexto financeiro e consulta ao cache.
         
-        for sentiment, words in sentiment_keywords.items():
-            if any(word in query.lower() for word in words):
-                intent["sentiment"] = sentiment
-                break
+        Args:
+            conn: Conexão com o banco de dados (do thread que executa a etapa)
+            query: Mensagem do usuário
+            
+        Returns:
+            Tupla (intent, financial_context, cache_context, cached_response)
+        """
+        intent = self.detect_user_intent(query)
+        self._update_topics(query)
+        with self._lock:
+            self.conversation_context["user_emotion"] = intent["sentiment"]
+        
+        try:
+            financial_context = self._get_financial_context(conn)
+        except Exception as e:
+            logging.error(f"Erro ao obter contexto financeiro: {str(e)}")
+            financial_context = {}
         
-        return intent
\ No newline at end of file
+        # A conversa recente (a mesma enviada no prompt) entra na chave: uma
+        # pergunta de continuação só reaproveita a resposta dada após o mesmo
+        # histórico; perguntas de abertura (histórico vazio) são compartilhadas
+        with self._lock:
+            summary, turns = self.conversation_history.context()
+        history = {"summary": summary, "turns": [[turn["user"], turn["assistant"]] for turn in turns]}
+        cache_context = {"user_name": self.user_name, "financial": financial_context,
+                         "history": hash_context(history)}
+        cached_response = None
+        try:
+            cached_response = llm_cache.get(conn, query, cache_context)
+        except Exception as e:
+            logging.error(f"Erro ao consultar o cache de respostas: {str(e)}")
+        
+        return intent, financial_context, cache_context, cached_response
+
+    def _cache_response(self, conn, query, cache_context, response):
+        """Grava a resposta do modelo no cache de respostas"""
+        try:
+            llm_cache.put(conn, query, cache_context, response)
+        except Exception as e:
+            logging.error(f"Erro ao gravar resposta no cache: {str(e)}")
+
+    def _finish_response(self, query, response):
+        """Registra a troca no histórico da conversa (sem consultas ao banco)"""
+        timestamp = datetime.datetime.now().isoformat()
+        with self._lock:
+            compacted = self.conversation_history.append({
+                "user": query,
+                "assistant": response,
+                "timestamp": timestamp
+            })
+            
+            # Gravação em segundo plano (fora do caminho da resposta)
+            message_writer.save_message(self.session_id, query, response, timestamp)
+            if compacted:
+                message_writer.save_summary(self.session_id, self.conversation_history, timestamp)
+
+    def restore_conversation_summary(self, conn):
+        """Recupera o resumo gravado da conversa da sessão (uma vez, ao criar o agente)"""
+        with self._lock:
+            if self._summary_restored:
+                return
+            self._summary_restored = True
+            try:
+                saved = load_summary(conn, self.session_id)
+                if saved:
+                    self.conversation_history.restore(*saved)
+            except Exception as e:
+                logging.error(f"Erro ao recuperar o resumo da conversa: {str(e)}")
+
+    def get_fallback_response(self, query):
+        """Resposta local (sem o modelo), registrada no histórico da conversa"""
+        response = self._get_fallback_response(query)
+        self._finish_response(query, response)
+        return response
+
+    async def get_ai_response(self, query):
+        """
+        Responde a uma mensagem do usuário usando o modelo de linguagem.
+        
+        Respostas do modelo ficam em cache (SQLite) pela mensagem normalizada e
+        pelo contexto financeiro do prompt, então perguntas repetidas (como as
+        sugestões clicáveis) não geram novas chamadas pagas à API. Sem modelo
+        configurado, ou em caso de erro, usa as respostas locais.
+        
+        Args:
+            query: Mensagem do usuário
+            
+        Returns:
+            Texto da resposta
+        """
+        # Consultas ao banco fora do thread do event loop, com conexão própria
+        intent, financial_context, cache_context, response = await asyncio.to_thread(
+            run_with_connection, self._prepare_response, query
+        )
+        if response is not None:
+            self._finish_response(query, response)
+            return response
+        
+        model = self.model or _get_model()
+        if model is None:
+            response = self._get_fallback_response(query)
+            self._finish_response(query, response)
+            return response
+        
+        try:
+            with llm_duration.time('complete'):
+                result = await model.generate_content_async(
+                    self._build_prompt(query, financial_context, intent)
+                )
+            response = result.text.strip()
+        except Exception as e:
+            llm_errors.inc('complete')
+            logging.error(f"Erro ao obter resposta do modelo: {str(e)}")
+            response = self._get_fallback_response(query)
+            self._finish_response(query, response)
+            return response
+        
+        await asyncio.to_thread(run_with_connection, self._cache_response, query, cache_context, response)
+        self._finish_response(query, response)
+        return response
+
+    async def stream_ai_response(self, query):
+        """
+        Versão em streaming de get_ai_response: produz os trechos da resposta à
+        medida que o modelo os gera. Respostas em cache e respostas locais são
+        produzidas em um único trecho.
+        
+        Args:
+            query: Mensagem do usuário
+            
+        Yields:
+            Trechos de texto da resposta
+        """
+        # Consultas ao banco fora do thread do event loop, com conexão própria
+        intent, financial_context, cache_context, response = await asyncio.to_thread(
+            run_with_connection, self._prepare_response, query
+        )
+        if response is not None:
+            self._finish_response(query, response)
+            yield response
+            return
+        
+        model = self.model or _get_model()
+        if model is None:
+            response = self._get_fallback_response(query)
+            self._finish_response(query, response)
+            yield response
+            return
+        
+        chunks = []
+        start = time.perf_counter()
+        try:
+            stream = await model.generate_content_async(
+                self._build_prompt(query, financial_context, intent), stream=True
+            )
+            async for chunk in stream:
+                text = chunk.text
+                if text:
+                    chunks.append(text)
+                    yield text
+        except Exception as e:
+            llm_errors.inc('stream')
+            logging.error(f"Erro ao obter resposta do modelo: {str(e)}")
+            if not chunks:
+                response = self._get_fallback_response(query)
+                self._finish_response(query, response)
+                yield response
+                return
+            # Resposta parcial: não vai para o cache
+            self._finish_response(query, "".join(chunks))
+            return
+        finally:
+            # Duração até o último trecho (ou até a falha ou o cancelamento do envio)
+            llm_duration.observe(time.perf_counter() - start, 'stream')
+        
+        response = "".join(chunks).strip()
+        await asyncio.to_thread(run_with_connection, self._cache_response, query, cache_context, response)
+        self._finish_response(query, response)
+
+    def get_savings_frontier(self, conn):
+        """Calcula a fronteira de economia (análise de despesas feita uma única vez)"""
+        return get_savings_frontier(conn)
+
+    def suggest_expense_cuts(self, conn, savings_target=None, frontier=None):
+        """Sugere cortes de despesas para atingir uma meta de economia mensal"""
+        return get_cost_cutting_recommendation(conn, savings_target, frontier=frontier)
+
+    def get_investment_recommendation(self, conn):
+        """
+        Recomenda investimentos compatíveis com o saldo, priorizando a reserva
+        de emergência (6 meses de despesas) antes de opções de maior risco.
+        
+        Args:
+            conn: Conexão com o banco de dados
+            
+        Returns:
+            Dicionário com a situação, a mensagem e as opções de investimento
+        """
+        snapshot = get_financial_snapshot(conn)
+        balance = snapshot["balance"]
+        emergency_fund_target = snapshot["total_expense"] * 6
+        
+        if balance <= 0:
+            return {
+                "status": "no_balance",
+                "message": f"{self.user_name}, antes de investir é importante ter saldo positivo. Que tal começarmos revisando seus gastos?",
+                "balance": balance,
+                "options": []
+            }
+        
+        options = get_investment_suggestions(balance)
+        if balance < emergency_fund_target:
+            options = [option for option in options if option["risk_level"] == "baixo"]
+            status = "emergency_fund"
+            message = (f"Seu saldo de R$ {balance:.2f} ainda não cobre a reserva de emergência recomendada "
+                       f"(R$ {emergency_fund_target:.2f}). Priorize investimentos de baixo risco e liquidez diária.")
+        else:
+            status = "diversify"
+            message = (f"Com a reserva de emergência formada, você pode diversificar. "
+                       f"Seu saldo de R$ {balance:.2f} permite as opções abaixo.")
+        
+        return {
+            "status": status,
+            "message": message,
+            "balance": balance,
+            "monthly_surplus": snapshot["month_balance"],
+            "emergency_fund_target": emergency_fund_target,
+            "options": options
+        }
+
+class AgentCache:
+    """
+    Cache LRU/TTL de agentes por sessão.
+
+    Mantém o histórico de conversa e os tópicos de cada sessão entre
+    requisições, com número máximo de sessões e expiração por inatividade.
+    """
+
+    def __init__(self, max_agents=AGENT_CACHE_SIZE, ttl_seconds=AGENT_TTL_SECONDS):
+        self.max_agents = max_agents
+        self.ttl_seconds = ttl_seconds
+        self._agents = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expire(self, now):
+        """Remove as sessões inativas há mais que o TTL (as mais antigas ficam no início)"""
+        while self._agents:
+            session_id, (_, last_used) = next(iter(self._agents.items()))
+            if now - last_used <= self.ttl_seconds:
+                break
+            del self._agents[session_id]
+            self.evictions += 1
+
+    def get(self, session_id):
+        """Retorna o agente da sessão, criando-o se necessário"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+
+            if session_id in self._agents:
+                agent, _ = self._agents.pop(session_id)
+                self.hits += 1
+            else:
+                agent = FinancialAgent()
+                agent.session_id = session_id
+                self.misses += 1
+
+            self._agents[session_id] = (agent, now)
+            while len(self._agents) > self.max_agents:
+                self._agents.popitem(last=False)
+                self.evictions += 1
+            return agent
+
+    def evict(self, session_id):
+        """Descarta explicitamente a sessão informada"""
+        with self._lock:
+            return self._agents.pop(session_id, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._agents.clear()
+
+    def stats(self):
+        """Métricas do cache de agentes"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'sessions': len(self._agents),
+                'max_agents': self.max_agents,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+# Agentes por sessão compartilhados pelas requisições do processo
+agent_cache = AgentCache()
+
+def new_session_id():
+    """Gera um identificador de sessão novo"""
+    return uuid.uuid4().hex
+
+def resolve_session_id(session_id):
+    """
+    Sessão informada pelo cliente, ou uma nova se ausente ou inválida.
+
+    Clientes sem sessão recebem cada um a sua (devolvida no cabeçalho
+    X-Session-Id), em vez de compartilharem o histórico de uma sessão única.
+    """
+    if session_id and len(session_id) <= MAX_SESSION_ID_LENGTH and session_id.isprintable():
+        return session_id
+    return new_session_id()
+
+def get_financial_agent(db_conn, session_id):
+    """
+    Retorna o agente financeiro da sessão, com as preferências atualizadas.
+
+    O agente é reaproveitado entre requisições (preservando histórico e tópicos
+    da conversa); as preferências vêm do cache, relido só se a tabela mudou.
+    A conexão é usada apenas durante esta chamada e não fica no agente.
+    """
+    agent = agent_cache.get(session_id)
+    agent.load_user_preferences(db_conn)
+    agent.restore_conversation_summary(db_conn)
+    return agent
+
+def evict_financial_agent(session_id):
+    """Descarta a sessão do agente (por exemplo, ao encerrar a conversa)"""
+    return agent_cache.evict(session_id)
@@ -0,0 +1,286 @@
+import json
+from datetime import datetime, date
+
+from analysis_cache import init_data_versions, get_data_versions, analysis_cache
+
+# Tabelas das quais o snapshot depende (uma escrita fora de insert_transaction força reconstrução)
+SNAPSHOT_SCOPES = ('transactions', 'categories', 'category_limits', 'savings_goals')
+
+# Número de categorias de despesa destacadas no snapshot
+TOP_CATEGORIES = 5
+
+# Usuário do snapshot (a aplicação tem um único usuário)
+DEFAULT_USER = 'default'
+
+# Percentual do limite de uma categoria a partir do qual o usuário é avisado
+LIMIT_WARNING_PERCENTAGE = 80
+
+# Dias antes do prazo de uma meta em aberto a partir dos quais o usuário é avisado
+GOAL_DEADLINE_WARNING_DAYS = 30
+
+# Ordem de prioridade dos alertas
+ALERT_SEVERITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+def init_snapshot_table(cursor):
+    """Cria a tabela do snapshot financeiro e passa a versionar as metas de economia"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS financial_snapshot (
+        user_key TEXT PRIMARY KEY,
+        month TEXT NOT NULL,
+        data TEXT NOT NULL,
+        versions TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    ''')
+    init_data_versions(cursor, tables=('savings_goals',))
+
+def _snapshot_versions(conn, versions=None):
+    versions = versions if versions is not None else get_data_versions(conn)
+    return {scope: versions.get(scope, 0) for scope in SNAPSHOT_SCOPES}
+
+def _derive(data):
+    """Recalcula os campos derivados (saldo do mês, principais categorias, limites) em O(categorias)"""
+    totals = data['category_totals']
+    names = data['category_names']
+
+    data['month_balance'] = data['total_income'] - data['total_expense']
+
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:TOP_CATEGORIES]
+    data['top_categories'] = [
+        {'category': names.get(category_id, 'Sem categoria'), 'amount': amount}
+        for category_id, amount in ranked
+    ]
+
+    limits = []
+    for category_id, limit_amount in data['limits'].items():
+        spent = totals.get(category_id, 0.0)
+        limits.append({
+            'category': names.get(category_id, 'Sem categoria'),
+            'limit': limit_amount,
+            'spent': spent,
+            'percentage': spent / limit_amount * 100 if limit_amount else 0.0,
+            'exceeded': spent > limit_amount
+        })
+    data['limit_status'] = sorted(limits, key=lambda item: item['percentage'], reverse=True)
+    return data
+
+def build_snapshot(conn, month=None):
+    """
+    Calcula o snapshot completo a partir do banco (usado na inicialização, na
+    virada do mês ou após escritas feitas fora de insert_transaction).
+    """
+    month = month or datetime.now().strftime('%Y-%m')
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT
+            COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END), 0),
+            COALESCE(SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END), 0)
+        FROM transactions
+    ''')
+    all_income, all_expense = cursor.fetchone()
+
+    cursor.execute('''
+        SELECT type, category_id, SUM(amount)
+        FROM transactions
+        WHERE substr(date, 1, 7) = ?
+        GROUP BY type, category_id
+    ''', (month,))
+    total_income = 0.0
+    total_expense = 0.0
+    category_totals = {}
+    for type, category_id, amount in cursor.fetchall():
+        if type == 'income':
+            total_income += amount
+        elif type == 'expense':
+            total_expense += amount
+            category_totals[str(category_id)] = amount
+
+    cursor.execute('SELECT id, name FROM categories')
+    category_names = {str(category_id): name for category_id, name in cursor.fetchall()}
+
+    cursor.execute("SELECT category_id, limit_amount FROM category_limits WHERE period = 'monthly'")
+    limits = {str(category_id): limit_amount for category_id, limit_amount in cursor.fetchall()}
+
+    cursor.execute('''
+        SELECT name, target_amount, current_amount, deadline
+        FROM savings_goals
+        WHERE completed = 0
+        ORDER BY deadline IS NULL, deadline
+    ''')
+    goals = [{
+        'name': name,
+        'target_amount': target,
+        'current_amount': current,
+        'deadline': deadline,
+        'progress': current / target * 100 if target else 0.0
+    } for name, target, current, deadline in cursor.fetchall()]
+
+    return _derive({
+        'month': month,
+        'total_income': total_income,
+        'total_expense': total_expense,
+        'balance': all_income - all_expense,
+        'category_totals': category_totals,
+        'category_names': category_names,
+        'limits': limits,
+        'goals': goals
+    })
+
+def _save(cursor, data, versions, user_key=DEFAULT_USER):
+    cursor.execute('''
+        INSERT INTO financial_snapshot (user_key, month, data, versions, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_key) DO UPDATE SET
+            month = excluded.month, data = excluded.data,
+            versions = excluded.versions, updated_at = excluded.updated_at
+    ''', (user_key, data['month'], json.dumps(data, ensure_ascii=False), json.dumps(versions),
+          datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+def _load(cursor, user_key=DEFAULT_USER):
+    cursor.execute('SELECT data, versions FROM financial_snapshot WHERE user_key = ?', (user_key,))
+    row = cursor.fetchone()
+    if not row:
+        return None, None
+    return json.loads(row[0]), json.loads(row[1])
+
+def get_snapshot_versions(conn, versions=None):
+    """Versões das tabelas do snapshot (a partir de get_data_versions, se já lidas)"""
+    return _snapshot_versions(conn, versions)
+
+def refresh_snapshot(conn, user_key=DEFAULT_USER):
+    """
+    Recalcula e grava o snapshot (usado pelo init_db e pelas escritas).
+    Não confirma a transação.
+    """
+    data = build_snapshot(conn)
+    _save(conn.cursor(), data, _snapshot_versions(conn), user_key)
+    return data
+
+def get_financial_snapshot(conn, user_key=DEFAULT_USER):
+    """
+    Retorna o snapshot financeiro do usuário: totais do mês, saldo, principais
+    categorias, situação dos limites e progresso das metas.
+
+    Normalmente custa a leitura das versões e de uma linha. Na virada do mês
+    ou se as tabelas mudaram por fora de insert_transaction, o snapshot é
+    recalculado em memória (e mantido no cache de análises para essas versões):
+    uma leitura nunca grava no banco, o que fica a cargo das escritas
+    (apply_transaction_to_snapshot) e do init_db.
+
+    Returns:
+        Dicionário com o snapshot (somente leitura)
+    """
+    cursor = conn.cursor()
+    data, stored_versions = _load(cursor, user_key)
+    versions = _snapshot_versions(conn)
+    month = datetime.now().strftime('%Y-%m')
+
+    if data is not None and data['month'] == month and stored_versions == versions:
+        return data
+
+    key = ('financial_snapshot', user_key, month, tuple(versions[scope] for scope in SNAPSHOT_SCOPES))
+    hit, data = analysis_cache.get(key)
+    if not hit:
+        data = build_snapshot(conn, month)
+        analysis_cache.put(key, data)
+    return data
+
+def apply_transaction_to_snapshot(conn, versions_before, date, type, category_id, amount, user_key=DEFAULT_USER):
+    """
+    Atualiza o snapshot com uma transação recém-gravada, em O(categorias).
+
+    Só é aplicada se o snapshot refletia exatamente o estado anterior à escrita
+    (`versions_before`) e o mês atual; caso contrário ele é recalculado aqui,
+    já com a transação. Não confirma a transação (feito por quem grava a transação).
+    """
+    cursor = conn.cursor()
+    data, stored_versions = _load(cursor, user_key)
+    if data is None or stored_versions != versions_before or data['month'] != datetime.now().strftime('%Y-%m'):
+        refresh_snapshot(conn, user_key)
+        return
+
+    sign = 1 if type == 'income' else -1 if type == 'expense' else 0
+    data['balance'] += sign * amount
+
+    if str(date)[:7] == data['month']:
+        if type == 'income':
+            data['total_income'] += amount
+        elif type == 'expense':
+            data['total_expense'] += amount
+            key = str(category_id)
+            data['category_totals'][key] = data['category_totals'].get(key, 0.0) + amount
+
+    _save(cursor, _derive(data), _snapshot_versions(conn), user_key)
+
+def get_snapshot_alerts(snapshot, user_name, today=None):
+    """
+    Alertas derivados do snapshot (limites estourados ou quase, saldo do mês
+    negativo e prazos das metas), sem consultas ao banco.
+
+    Args:
+        snapshot: Resultado de get_financial_snapshot
+        user_name: Nome usado nas mensagens
+        today: Data de referência dos prazos (padrão: hoje)
+
+    Returns:
+        Lista de alertas ({'type', 'severity', 'message'}) em ordem de prioridade
+    """
+    today = today or date.today()
+    alerts = []
+
+    for item in snapshot["limit_status"]:
+        if item["exceeded"]:
+            alerts.append({
+                "type": "expense_limit",
+                "severity": "high",
+                "message": f"{user_name}, você excedeu o limite de gastos em {item['category']} em {item['percentage'] - 100:.1f}% este mês."
+            })
+        elif item["percentage"] >= LIMIT_WARNING_PERCENTAGE:
+            alerts.append({
+                "type": "expense_limit_warning",
+                "severity": "medium",
+                "message": f"{user_name}, você já usou {item['percentage']:.0f}% do limite de {item['category']} este mês."
+            })
+
+    if snapshot["month_balance"] < 0:
+        alerts.append({
+            "type": "negative_balance",
+            "severity": "high",
+            "message": f"{user_name}, suas despesas deste mês superam as receitas em R$ {-snapshot['month_balance']:.2f}."
+        })
+
+    for goal in snapshot["goals"]:
+        if not goal["deadline"] or goal["progress"] >= 100:
+            continue
+        try:
+            days_left = (date.fromisoformat(str(goal["deadline"])[:10]) - today).days
+        except ValueError:
+            continue
+        if days_left < 0:
+            alerts.append({
+                "type": "goal_overdue",
+                "severity": "high",
+                "message": f"O prazo da meta '{goal['name']}' terminou com {goal['progress']:.0f}% concluído. Que tal revisar a meta?"
+            })
+        elif days_left <= GOAL_DEADLINE_WARNING_DAYS:
+            alerts.append({
+                "type": "goal_deadline",
+                "severity": "medium",
+                "message": f"Faltam {days_left} dias para o prazo da meta '{goal['name']}' ({goal['progress']:.0f}% concluído)."
+            })
+
+    alerts.sort(key=lambda alert: ALERT_SEVERITY_ORDER[alert["severity"]])
+    return alerts
+
+def get_goals_progress(snapshot):
+    """Progresso das metas de economia em aberto, com os totais de todas elas"""
+    goals = snapshot["goals"]
+    total_target = sum(goal["target_amount"] for goal in goals)
+    total_saved = sum(goal["current_amount"] for goal in goals)
+    return {
+        "goals": goals,
+        "total_target": total_target,
+        "total_saved": total_saved,
+        "overall_progress": total_saved / total_target * 100 if total_target else 0.0
+    }
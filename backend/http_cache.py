@@ -0,0 +1,92 @@
+import hashlib
+import sqlite3
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import request, make_response
+from werkzeug.http import is_resource_modified
+
+from db import get_db_connection
+
+def _period_start(period):
+    """Início (UTC) do mês ou do dia atual, para respostas que dependem da data"""
+    now = datetime.now().astimezone()
+    if period == 'month':
+        start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    elif period == 'day':
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        return None
+    return start.astimezone(timezone.utc)
+
+def get_validators(conn, name, scopes, period=None):
+    """
+    Calcula o ETag e a data de modificação de uma resposta a partir das
+    versões das tabelas das quais ela depende (uma consulta a data_versions).
+
+    Args:
+        conn: Conexão com o banco
+        name: Nome da resposta (rotas diferentes têm ETags diferentes)
+        scopes: Tabelas das quais a resposta depende
+        period: 'month' ou 'day' se a resposta também depende da data atual
+
+    Returns:
+        Tupla (etag, last_modified)
+    """
+    cursor = conn.cursor()
+    placeholders = ', '.join('?' for _ in scopes)
+    cursor.execute(f'SELECT scope, version, updated_at FROM data_versions WHERE scope IN ({placeholders})',
+                   tuple(scopes))
+    rows = {scope: (version, updated_at) for scope, version, updated_at in cursor.fetchall()}
+
+    period_start = _period_start(period)
+    key = [name] + [f"{scope}={rows.get(scope, (0, None))[0]}" for scope in scopes]
+    if period_start is not None:
+        key.append(period_start.date().isoformat())
+    etag = hashlib.sha1('|'.join(key).encode('utf-8')).hexdigest()[:20]
+
+    # updated_at é gravado pelos triggers em UTC (CURRENT_TIMESTAMP)
+    modified = [datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+                for _, updated_at in rows.values() if updated_at]
+    if period_start is not None:
+        modified.append(period_start)
+    last_modified = max(modified) if modified else None
+    return etag, last_modified
+
+def conditional_get(*scopes, period=None):
+    """
+    Decorator de rotas GET que respondem com ETag e Last-Modified e atendem
+    If-None-Match / If-Modified-Since com 304, sem executar a rota.
+
+    O ETag é calculado antes da rota: uma escrita concorrente pode, no máximo,
+    fazer o próximo pedido receber a resposta completa de novo, nunca uma
+    resposta desatualizada.
+
+    Args:
+        scopes: Tabelas das quais a resposta depende
+        period: 'month' ou 'day' se a resposta também depende da data atual
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                etag, last_modified = get_validators(get_db_connection(), view.__name__, scopes, period)
+            except sqlite3.OperationalError:
+                # Banco sem a tabela de versões: responde sem validação
+                return view(*args, **kwargs)
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # O cliente pode guardar a resposta, mas deve revalidá-la a cada uso
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
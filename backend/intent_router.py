@@ -0,0 +1,277 @@
+import re
+import time
+from functools import lru_cache
+
+# Palavras que indicam uma pergunta
+QUESTION_WORDS = ["como", "qual", "quanto", "onde", "quando", "por que"]
+
+# Palavras-chave de ação (na ordem de prioridade)
+ACTION_KEYWORDS = {
+    "mostrar": "show",
+    "exibir": "show",
+    "analisar": "analyze",
+    "comparar": "compare",
+    "adicionar": "add",
+    "criar": "create",
+    "ajuda": "help",
+    "preciso": "need"
+}
+
+# Sentimentos (na ordem de prioridade) e as expressões que os indicam
+SENTIMENT_KEYWORDS = {
+    "positivo": ["feliz", "satisfeito", "ótimo", "excelente", "gosto", "animado"],
+    "negativo": ["triste", "frustrado", "difícil", "preocupado", "problema", "dívida", "não consigo"],
+    "confuso": ["confuso", "dúvida", "não entendo", "complicado", "como assim"]
+}
+
+# Tópicos de conversa reconhecidos nas mensagens do usuário
+TOPIC_KEYWORDS = {
+    "orçamento": "orçamento pessoal",
+    "gasto": "análise de gastos",
+    "despesa": "análise de gastos",
+    "investi": "investimentos",
+    "poupa": "poupança",
+    "guardar": "poupança",
+    "economi": "economia",
+    "dívida": "dívidas",
+    "meta": "metas financeiras"
+}
+
+# Palavras-chave das respostas locais do agente (na ordem de prioridade)
+FALLBACK_KEYWORDS = ["investi", "economi", "orçamento", "gasto", "dívida"]
+
+# Palavras que disparam ações do chat (recomendações de economia e investimento)
+ACTION_TRIGGERS = {
+    "economizar": "savings",
+    "economia": "savings",
+    "investir": "investment",
+    "investimento": "investment"
+}
+
+# Expressões com que o usuário informa o próprio nome
+NAME_INDICATORS = ["meu nome é", "me chamo", "sou o", "sou a", "pode me chamar de", "me chame de"]
+
+def _build_keyword_labels():
+    """
+    Associa cada palavra-chave aos rótulos (tipo, valor, prioridade) que ela indica.
+
+    Como o casamento é feito em uma única passagem sem sobreposição, uma
+    palavra-chave mais longa (ex.: "investimento") também recebe os rótulos das
+    palavras-chave contidas nela ("investi"), preservando a semântica de
+    busca por substring de cada lista original.
+    """
+    labels = {}
+
+    def register(keyword, kind, value, priority):
+        labels.setdefault(keyword.lower(), []).append((kind, value, priority))
+
+    for priority, word in enumerate(QUESTION_WORDS):
+        register(word, 'question', True, priority)
+    for priority, (keyword, action) in enumerate(ACTION_KEYWORDS.items()):
+        register(keyword, 'action', action, priority)
+    for priority, (sentiment, words) in enumerate(SENTIMENT_KEYWORDS.items()):
+        for word in words:
+            register(word, 'sentiment', sentiment, priority)
+    for priority, (keyword, topic) in enumerate(TOPIC_KEYWORDS.items()):
+        register(keyword, 'topic', topic, priority)
+    for priority, keyword in enumerate(FALLBACK_KEYWORDS):
+        register(keyword, 'fallback', keyword, priority)
+    for priority, (keyword, trigger) in enumerate(ACTION_TRIGGERS.items()):
+        register(keyword, 'trigger', trigger, priority)
+
+    expanded = {}
+    for keyword in labels:
+        expanded[keyword] = [label for other, other_labels in labels.items()
+                             if other in keyword for label in other_labels]
+    return expanded
+
+_KEYWORD_LABELS = _build_keyword_labels()
+
+def _build_keyword_effects():
+    """
+    Resume os rótulos de cada palavra-chave no efeito do casamento sobre o
+    resultado: (pergunta, ação, sentimento, tópicos, palavra de fallback,
+    gatilhos), com ação, sentimento e fallback como (prioridade, valor) ou None.
+    """
+    effects = {}
+    for keyword, labels in _KEYWORD_LABELS.items():
+        best = {}
+        topics = []
+        triggers = []
+        for kind, value, priority in labels:
+            if kind == 'topic':
+                topics.append(value)
+            elif kind == 'trigger':
+                triggers.append(value)
+            elif kind != 'question' and (kind not in best or priority < best[kind][0]):
+                best[kind] = (priority, value)
+        effects[keyword] = (
+            any(kind == 'question' for kind, _, _ in labels),
+            best.get('action'),
+            best.get('sentiment'),
+            tuple(dict.fromkeys(topics)),
+            best.get('fallback'),
+            tuple(dict.fromkeys(triggers))
+        )
+    return effects
+
+_KEYWORD_EFFECTS = _build_keyword_effects()
+
+def _trie_regex(words):
+    """
+    Monta uma expressão regular em forma de trie a partir de uma lista de
+    palavras: prefixos comuns são fatorados, então o custo em cada posição do
+    texto depende do tamanho da palavra e não do número de palavras-chave.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def to_regex(node):
+        end = '' in node
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        # O sufixo opcional é guloso: o casamento prefere a palavra-chave mais longa
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if end else body
+
+    return to_regex(trie)
+
+def _build_pattern():
+    """
+    Compila todas as palavras-chave em uma única expressão, aplicada ao texto
+    já em minúsculas. Os casamentos começam no início de palavras.
+
+    A expressão começa por uma classe com os primeiros caracteres possíveis:
+    as posições que não podem iniciar um casamento são descartadas sem
+    percorrer a trie.
+    """
+    first_chars = sorted({word[0] for word in list(_KEYWORD_LABELS) + NAME_INDICATORS} | {'?'})
+    return re.compile(
+        '(?=[' + ''.join(re.escape(char) for char in first_chars) + '])'
+        r'(?:\b(?:(?P<name_indicator>' + _trie_regex(NAME_INDICATORS) + r')\s+(?P<name>\S+)'
+        r'|(?P<keyword>' + _trie_regex(_KEYWORD_LABELS) + r'))'
+        r'|(?P<question_mark>\?))'
+    )
+
+_PATTERN = _build_pattern()
+
+@lru_cache(maxsize=256)
+def route_message(message):
+    """
+    Analisa a mensagem do usuário em uma única passagem.
+
+    O resultado é compartilhado (cache por mensagem) e deve ser tratado como
+    somente leitura.
+
+    Args:
+        message: Mensagem do usuário
+
+    Returns:
+        Dicionário com 'is_question', 'action', 'sentiment', 'topics' (na ordem
+        em que aparecem), 'fallback_keyword', 'triggers' e 'name'
+    """
+    is_question = False
+    action = sentiment = fallback = None
+    topics = []
+    triggers = []
+    name = None
+
+    message = message or ''
+    text = message.lower()
+
+    for name_indicator, _, keyword, question_mark in _PATTERN.findall(text):
+        if keyword:
+            keyword_question, keyword_action, keyword_sentiment, keyword_topics, keyword_fallback, \
+                keyword_triggers = _KEYWORD_EFFECTS[keyword]
+            is_question = is_question or keyword_question
+            if keyword_action and (action is None or keyword_action < action):
+                action = keyword_action
+            if keyword_sentiment and (sentiment is None or keyword_sentiment < sentiment):
+                sentiment = keyword_sentiment
+            if keyword_fallback and (fallback is None or keyword_fallback < fallback):
+                fallback = keyword_fallback
+            for topic in keyword_topics:
+                if topic not in topics:
+                    topics.append(topic)
+            for trigger in keyword_triggers:
+                if trigger not in triggers:
+                    triggers.append(trigger)
+        elif question_mark:
+            is_question = True
+        elif name_indicator and name is None:
+            name = _extract_name(message, text)
+
+    return {
+        'is_question': is_question,
+        'action': action[1] if action else None,
+        'sentiment': sentiment[1] if sentiment else 'neutral',
+        'topics': tuple(topics),
+        'fallback_keyword': fallback[1] if fallback else None,
+        'triggers': tuple(triggers),
+        'name': name
+    }
+
+def _extract_name(message, text):
+    """Primeiro nome informado após um indicador (raro: só percorre a mensagem de novo se houver um)"""
+    # O nome é recortado da mensagem original (com as maiúsculas do usuário)
+    source = message if len(message) == len(text) else text
+    for match in _PATTERN.finditer(text):
+        if match.group('name_indicator'):
+            candidate = source[match.start('name'):match.end('name')].strip('.,;:!?')
+            # Nome deve ter pelo menos 2 caracteres
+            if len(candidate) > 1:
+                return candidate.capitalize()
+    return None
+
+def _route_by_scanning(message):
+    """Implementação anterior (várias varreduras lineares), mantida como referência do benchmark"""
+    message_lower = message.lower()
+    result = {
+        'is_question': "?" in message or any(word in message_lower for word in QUESTION_WORDS),
+        'action': next((a for k, a in ACTION_KEYWORDS.items() if k in message_lower), None),
+        'sentiment': next((s for s, words in SENTIMENT_KEYWORDS.items()
+                           if any(word in message_lower for word in words)), 'neutral'),
+        'topics': [t for k, t in TOPIC_KEYWORDS.items() if k in message_lower],
+        'fallback_keyword': next((k for k in FALLBACK_KEYWORDS if k in message_lower), None),
+        'triggers': [t for k, t in ACTION_TRIGGERS.items() if k in message_lower],
+        'name': None
+    }
+    for indicator in NAME_INDICATORS:
+        if indicator + " " in message_lower:
+            start = message_lower.find(indicator + " ") + len(indicator) + 1
+            end = message_lower.find(" ", start)
+            result['name'] = message[start:end if end != -1 else len(message)].strip()
+    return result
+
+def benchmark(messages=None, repeat=2000):
+    """
+    Compara a vazão do roteador compilado com as varreduras lineares anteriores.
+
+    Returns:
+        Dicionário com mensagens por segundo de cada implementação
+    """
+    messages = messages or [
+        "Como posso economizar mais este mês?",
+        "Meu nome é Ana e estou preocupada com minhas dívidas",
+        "Quero investir em ações, qual o melhor investimento?",
+        "Mostrar meus gastos com alimentação do último mês",
+        "Não entendo como funciona o orçamento 50-30-20",
+        "Estou feliz, consegui guardar dinheiro para a minha meta!"
+    ]
+    # Mensagens distintas a cada repetição para não medir apenas o cache
+    inputs = [f"{message} #{i}" for i in range(repeat) for message in messages]
+
+    results = {}
+    for label, func in (('compiled', route_message.__wrapped__), ('scanning', _route_by_scanning)):
+        start = time.perf_counter()
+        for message in inputs:
+            func(message)
+        elapsed = time.perf_counter() - start
+        results[label] = len(inputs) / elapsed if elapsed > 0 else float('inf')
+    results['speedup'] = results['compiled'] / results['scanning'] if results['scanning'] else None
+    return results
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+
+# Tempo (segundos) durante o qual uma resposta do modelo pode ser reaproveitada
+LLM_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Número máximo de respostas mantidas no banco
+LLM_CACHE_MAX_ENTRIES = 500
+
+# Acertos acumulados em memória antes de gravados no banco: a gravação ocorre
+# junto com a próxima resposta nova (put) ou, em uma leitura, quando o
+# acúmulo mais antigo passa de HIT_FLUSH_SECONDS ou há HIT_FLUSH_ENTRIES chaves
+HIT_FLUSH_SECONDS = 60
+HIT_FLUSH_ENTRIES = 100
+
+def init_llm_cache_table(cursor):
+    """Cria a tabela de respostas do modelo em cache, se não existir"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS llm_response_cache (
+        cache_key TEXT PRIMARY KEY,
+        normalized_message TEXT NOT NULL,
+        context_hash TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used_at REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_llm_response_cache_used ON llm_response_cache (last_used_at)')
+
+def normalize_message(message):
+    """
+    Normaliza a mensagem para a chave do cache: minúsculas, sem acentos,
+    pontuação e espaços repetidos ("Como posso economizar mais este mês?" e
+    "como posso economizar mais este mes" compartilham a mesma chave).
+    """
+    text = unicodedata.normalize('NFKD', message or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+def hash_context(context):
+    """Hash estável do contexto do prompt (dados financeiros e conversa recente)"""
+    payload = json.dumps(context, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class LLMResponseCache:
+    """
+    Cache persistente (SQLite) das respostas do modelo de linguagem.
+
+    A chave combina a mensagem normalizada e o hash do contexto do prompt
+    (dados financeiros e conversa recente): a mesma pergunta feita com os
+    mesmos dados e o mesmo histórico reaproveita a resposta, e qualquer
+    mudança gera uma nova chave. As entradas expiram após o TTL e as menos
+    usadas são removidas acima do limite de tamanho.
+
+    Um acerto não escreve no banco: a contagem de uso e o último acesso ficam
+    em memória e são gravados em lote (ver HIT_FLUSH_SECONDS).
+    """
+
+    def __init__(self, ttl_seconds=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # {chave: (acertos, último uso)} ainda não gravados no banco
+        self._pending_hits = {}
+        self._pending_since = None
+
+    def make_key(self, message, context):
+        """Retorna (chave, mensagem normalizada, hash do contexto)"""
+        normalized = normalize_message(message)
+        context_hash = hash_context(context)
+        key = hashlib.sha256(f'{normalized}\x00{context_hash}'.encode('utf-8')).hexdigest()
+        return key, normalized, context_hash
+
+    def get(self, conn, message, context):
+        """Retorna a resposta em cache ou None"""
+        key, _, _ = self.make_key(message, context)
+        now = time.time()
+
+        cursor = conn.cursor()
+        cursor.execute('SELECT response, created_at FROM llm_response_cache WHERE cache_key = ?', (key,))
+        row = cursor.fetchone()
+
+        if not row or now - row[1] > self.ttl_seconds:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            count, _ = self._pending_hits.get(key, (0, now))
+            self._pending_hits[key] = (count + 1, now)
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            flush_due = (len(self._pending_hits) >= HIT_FLUSH_ENTRIES
+                         or time.monotonic() - self._pending_since >= HIT_FLUSH_SECONDS)
+
+        if flush_due:
+            self._flush_hits(cursor)
+            conn.commit()
+        return row[0]
+
+    def _flush_hits(self, cursor):
+        """Grava os acertos acumulados em memória (sem confirmar a transação)"""
+        with self._lock:
+            pending = self._pending_hits
+            self._pending_hits = {}
+            self._pending_since = None
+        if pending:
+            cursor.executemany('''
+                UPDATE llm_response_cache SET hits = hits + ?, last_used_at = MAX(last_used_at, ?)
+                WHERE cache_key = ?
+            ''', [(count, last_used, key) for key, (count, last_used) in pending.items()])
+
+    def put(self, conn, message, context, response):
+        """Grava a resposta do modelo e aplica o TTL e o limite de tamanho"""
+        key, normalized, context_hash = self.make_key(message, context)
+        now = time.time()
+
+        cursor = conn.cursor()
+        # Acertos pendentes vão na mesma transação (antes do descarte das menos usadas)
+        self._flush_hits(cursor)
+        cursor.execute('''
+            INSERT INTO llm_response_cache
+                (cache_key, normalized_message, context_hash, response, created_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (cache_key) DO UPDATE SET
+                response = excluded.response, created_at = excluded.created_at,
+                last_used_at = excluded.last_used_at
+        ''', (key, normalized, context_hash, response, now, now))
+
+        cursor.execute('DELETE FROM llm_response_cache WHERE created_at < ?', (now - self.ttl_seconds,))
+        evicted = cursor.rowcount
+        cursor.execute('''
+            DELETE FROM llm_response_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_response_cache
+                ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+        evicted += cursor.rowcount
+        conn.commit()
+
+        if evicted > 0:
+            with self._lock:
+                self.evictions += evicted
+
+    def stats(self, conn=None):
+        """Métricas do cache (acertos e falhas do processo; entradas do banco, se houver conexão)"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+        if conn is not None:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM llm_response_cache')
+            stats['entries'], stats['total_hits'] = cursor.fetchone()
+            with self._lock:
+                stats['total_hits'] += sum(count for count, _ in self._pending_hits.values())
+        return stats
+
+# Cache de respostas compartilhado pelo processo
+llm_cache = LLMResponseCache()
@@ -0,0 +1,223 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+# Arquivo de log (registros em JSON, um por linha)
+LOG_FILE = os.environ.get('LOG_FILE', 'financial_agent.log')
+
+# Nível padrão e níveis por módulo (ex.: LOG_LEVELS="ml_prediction=WARNING,werkzeug=ERROR")
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+
+# Tamanho máximo do arquivo de log antes da rotação e número de arquivos mantidos
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# Registros pendentes antes de novos serem descartados (o log nunca bloqueia a requisição)
+LOG_QUEUE_SIZE = 10000
+
+# Mensagens de DEBUG por ponto de log dentro da janela
+DEBUG_RATE_LIMIT = 10
+DEBUG_RATE_WINDOW_SECONDS = 60
+
+# Identificador e início da requisição atual (propagados para views assíncronas)
+request_id_var = contextvars.ContextVar('request_id', default=None)
+request_start_var = contextvars.ContextVar('request_start', default=None)
+
+# Atributos padrão de LogRecord (o restante vem de `extra` e vai para o JSON)
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class RequestContextFilter(logging.Filter):
+    """Anexa o id da requisição e o tempo decorrido desde o seu início a cada registro"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        start = request_start_var.get()
+        if not hasattr(record, 'duration_ms'):
+            record.duration_ms = round((time.perf_counter() - start) * 1000, 2) if start is not None else None
+        return True
+
+class DebugRateLimitFilter(logging.Filter):
+    """
+    Limita os registros de DEBUG por ponto de log (arquivo e linha) a
+    `limit` por janela; o primeiro registro após a janela informa quantos
+    foram suprimidos.
+    """
+
+    def __init__(self, limit=DEBUG_RATE_LIMIT, window_seconds=DEBUG_RATE_WINDOW_SECONDS):
+        super().__init__()
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno != logging.DEBUG:
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window_start, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - window_start > self.window_seconds:
+                if suppressed:
+                    record.suppressed = suppressed
+                window_start, count, suppressed = now, 0, 0
+
+            if count >= self.limit:
+                self._windows[key] = (window_start, count, suppressed + 1)
+                return False
+
+            self._windows[key] = (window_start, count + 1, suppressed)
+            return True
+
+class JsonFormatter(logging.Formatter):
+    """Formata cada registro como um objeto JSON em uma linha"""
+
+    def format(self, record):
+        payload = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'duration_ms': getattr(record, 'duration_ms', None),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in payload:
+                payload[key] = value
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta registros com a fila cheia em vez de bloquear"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+def _parse_levels(spec):
+    levels = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+_listener = None
+_setup_lock = threading.Lock()
+
+def setup_logging(log_file=LOG_FILE, level=LOG_LEVEL, module_levels=None):
+    """
+    Configura o logging do processo: os handlers de aplicação só enfileiram
+    registros (QueueHandler) e um thread dedicado (QueueListener) formata em
+    JSON e grava no arquivo, então a E/S de log sai do caminho da requisição.
+
+    Idempotente: chamadas seguintes não duplicam handlers.
+
+    Args:
+        log_file: Arquivo de log (com rotação por tamanho)
+        level: Nível padrão
+        module_levels: Níveis por logger ({nome: nível}); padrão: LOG_LEVELS do ambiente
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+        file_handler.setFormatter(JsonFormatter())
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        queue_handler = _DroppingQueueHandler(log_queue)
+        queue_handler.addFilter(DebugRateLimitFilter())
+        queue_handler.addFilter(RequestContextFilter())
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        levels = module_levels if module_levels is not None else _parse_levels(LOG_LEVELS)
+        for name, module_level in levels.items():
+            logging.getLogger(name).setLevel(module_level)
+
+        _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+def stop_logging():
+    """Grava os registros pendentes e encerra o thread de log"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+def start_request_context(request_id=None):
+    """
+    Marca o início de uma requisição para os registros de log.
+
+    Args:
+        request_id: Id recebido do cliente (X-Request-Id); gerado se ausente
+
+    Returns:
+        Id da requisição
+    """
+    request_id = request_id or uuid.uuid4().hex
+    request_id_var.set(request_id)
+    request_start_var.set(time.perf_counter())
+    return request_id
+
+def clear_request_context():
+    """Limpa o id e o início da requisição (o thread do servidor é reaproveitado)"""
+    request_id_var.set(None)
+    request_start_var.set(None)
+
+def log_access(method, path, status):
+    """Grava o registro de acesso da requisição atual (com a duração)"""
+    logging.getLogger('access').info(
+        f"{method} {path} {status}",
+        extra={'method': method, 'path': path, 'status': status}
+    )
+
+def init_request_logging(app):
+    """
+    Registra no app Flask o id de cada requisição (cabeçalho X-Request-Id ou
+    gerado) e um registro de acesso com a duração ao final.
+    """
+    from flask import request
+
+    @app.before_request
+    def _start_request_log():
+        start_request_context(request.headers.get('X-Request-Id'))
+
+    @app.after_request
+    def _finish_request_log(response):
+        request_id = request_id_var.get()
+        if request_id:
+            response.headers['X-Request-Id'] = request_id
+        log_access(request.method, request.path, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _clear_request_log(exception=None):
+        # Registros fora de requisições não herdam o id
+        clear_request_context()
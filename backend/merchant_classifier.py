@@ -0,0 +1,96 @@
+import re
+import unicodedata
+
+# Palavras que aparecem nas descrições de bancos e notificações mas não
+# identificam o estabelecimento (removidas da chave do comerciante)
+_NOISE_TOKENS = {
+    'compra', 'compras', 'aprovada', 'pagamento', 'pag', 'pgto', 'pix', 'ted', 'doc',
+    'debito', 'credito', 'cartao', 'final', 'valor', 'parcela', 'parc', 'transferencia',
+    'em', 'de', 'do', 'da', 'no', 'na', 'r', 'rs', 'br', 'sa', 'ltda', 'me', 'eireli'
+}
+
+# Número máximo de palavras usadas para formar a chave do comerciante
+MERCHANT_KEY_TOKENS = 3
+
+# Palavras-chave de serviços por assinatura
+SUBSCRIPTION_KEYWORDS = [
+    'assinatura', 'mensalidade', 'premium', 'plus', 'pro', 'netflix', 'spotify', 'disney',
+    'amazon', 'hbo', 'deezer', 'youtube', 'apple', 'microsoft', 'adobe', 'subscription'
+]
+
+# Classes de comerciante e seus padrões. A ordem define a prioridade quando
+# mais de uma classe casa na mesma posição da descrição.
+MERCHANT_CLASS_PATTERNS = {
+    'streaming': ['netflix', 'spotify', 'disney', 'hbo', 'deezer', 'youtube', 'prime video', 'globoplay', 'streaming'],
+    'alimentacao': ['supermercado', 'mercado', 'restaurante', 'ifood', 'rappi', 'delivery', 'padaria',
+                    'lanchonete', 'cafe', 'cafeteria', 'acougue', 'hortifruti', 'pizzaria'],
+    'transporte': ['uber', 'taxi', 'combustivel', 'posto', 'gasolina', 'metro', 'onibus',
+                   'estacionamento', 'pedagio', 'manutencao do carro'],
+    'moradia': ['aluguel', 'condominio', 'iptu', 'energia', 'luz', 'agua', 'internet', 'gas'],
+    'saude': ['farmacia', 'drogaria', 'consulta', 'exame', 'exames', 'plano de saude', 'hospital', 'clinica'],
+    'educacao': ['escola', 'faculdade', 'curso', 'livro', 'livros', 'material escolar'],
+    'vestuario': ['roupa', 'roupas', 'calcado', 'calcados', 'acessorios', 'loja'],
+    'lazer': ['cinema', 'teatro', 'parque', 'show', 'jogos', 'ingresso'],
+}
+
+def _strip_accents(text):
+    """Remove acentos para que 'Farmácia' e 'farmacia' sejam equivalentes"""
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+
+def _compile_alternation(patterns):
+    """Junta padrões em uma alternância, priorizando os mais longos"""
+    return '|'.join(sorted(patterns, key=len, reverse=True))
+
+# Matchers pré-compilados uma única vez na importação do módulo: uma passada
+# de regex por descrição substitui o str.contains por requisição
+_SUBSCRIPTION_RE = re.compile(r'\b(?:' + _compile_alternation(SUBSCRIPTION_KEYWORDS) + r')\b')
+_MERCHANT_CLASS_RE = re.compile('|'.join(
+    rf'(?P<{name}>\b(?:{_compile_alternation(patterns)})\b)'
+    for name, patterns in MERCHANT_CLASS_PATTERNS.items()
+))
+_NON_WORD_RE = re.compile(r'[^a-z ]+')
+_SPACES_RE = re.compile(r'\s+')
+
+def normalize_description(description):
+    """
+    Normaliza a descrição de uma transação para comparação.
+
+    Converte para minúsculas, remove acentos, números (datas, valores, finais
+    de cartão) e pontuação, e colapsa espaços.
+    """
+    if not description:
+        return ''
+
+    text = _strip_accents(str(description)).lower()
+    text = _NON_WORD_RE.sub(' ', text)
+    return _SPACES_RE.sub(' ', text).strip()
+
+def get_merchant_key(normalized):
+    """Extrai a chave do comerciante a partir de uma descrição já normalizada"""
+    tokens = [token for token in normalized.split(' ') if token and token not in _NOISE_TOKENS]
+    return ' '.join(tokens[:MERCHANT_KEY_TOKENS])
+
+def classify_description(description):
+    """
+    Classifica a descrição de uma transação.
+
+    Args:
+        description: Descrição original da transação ou notificação
+
+    Returns:
+        Tupla (merchant_key, is_subscription, merchant_class)
+    """
+    normalized = normalize_description(description)
+    merchant_key = get_merchant_key(normalized) or normalized
+
+    is_subscription = 1 if _SUBSCRIPTION_RE.search(normalized) else 0
+
+    match = _MERCHANT_CLASS_RE.search(normalized)
+    if match:
+        merchant_class = match.lastgroup
+    elif is_subscription:
+        merchant_class = 'assinatura'
+    else:
+        merchant_class = 'outros'
+
+    return merchant_key, is_subscription, merchant_class
@@ -0,0 +1,291 @@
+"""
+Métricas da aplicação no formato de texto do Prometheus (GET /metrics).
+
+Os contadores e histogramas ficam na memória do processo e são atualizados
+no caminho das requisições com uma única trava por métrica (sem consultas
+ou E/S); o texto é montado apenas quando /metrics é lido. Métricas que já
+existem em outros módulos (acertos dos caches, filas de admissão) são lidas
+no momento da coleta por funções registradas com register_collector.
+
+Com vários processos servidores (ASGI_WORKERS > 1), cada processo expõe os
+próprios números; a agregação fica a cargo do Prometheus.
+
+Principais métricas:
+    http_requests_total, http_request_duration_seconds: por rota (modelo da URL)
+    db_queries_per_request, db_query_duration_seconds: consultas SQLite
+    ml_model_load_seconds, ml_prediction_seconds, ml_training_seconds
+    llm_request_duration_seconds, llm_errors_total: chamadas ao modelo de linguagem
+    bank_transactions_ingested_total: transações bancárias gravadas por origem
+    cache_*: acertos e falhas dos caches (análises, agentes, respostas do modelo)
+"""
+import bisect
+import contextvars
+import functools
+import logging
+import sqlite3
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Limites (segundos) dos histogramas de latência
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    """Contador monotônico, opcionalmente com rótulos"""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(f'{self.name}{_format_labels(self.labels, key)}', value) for key, value in sorted(values.items())]
+
+class Histogram:
+    """Histograma de limites fixos (contagens por faixa, soma e total), opcionalmente com rótulos"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Contagens por faixa (a última é +Inf) e soma
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *label_values):
+        """Gerenciador de contexto que observa o tempo decorrido no bloco"""
+        return _Timer(self, label_values)
+
+    def timed(self, *label_values):
+        """Decorator que observa a duração de cada chamada da função"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, *label_values)
+            return wrapper
+        return decorator
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+
+        lines = []
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append((f'{self.name}_bucket{_format_labels(self.labels, key, le)}', cumulative))
+            lines.append((f'{self.name}_sum{_format_labels(self.labels, key)}', total))
+            lines.append((f'{self.name}_count{_format_labels(self.labels, key)}', cumulative))
+        return lines
+
+class _Timer:
+    def __init__(self, histogram, label_values):
+        self._histogram = histogram
+        self._label_values = label_values
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start, *self._label_values)
+        return False
+
+_metrics = []
+_collectors = []
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+def register_collector(callback):
+    """
+    Registra uma função chamada a cada coleta de /metrics.
+
+    A função retorna uma lista de (nome, tipo, descrição, [(rótulos, valor)]),
+    com os rótulos em um dicionário; usada para expor números mantidos por
+    outros módulos sem duplicá-los no caminho das requisições.
+    """
+    _collectors.append(callback)
+    return callback
+
+# Requisições HTTP
+http_requests = _register(Counter(
+    'http_requests_total', 'Requisições HTTP atendidas', ('method', 'route', 'status')))
+http_duration = _register(Histogram(
+    'http_request_duration_seconds', 'Duração das requisições HTTP (até a resposta ser montada)',
+    ('method', 'route')))
+
+# Banco de dados
+db_queries_per_request = _register(Histogram(
+    'db_queries_per_request', 'Consultas SQLite executadas por requisição', ('route',), buckets=COUNT_BUCKETS))
+db_query_duration = _register(Histogram(
+    'db_query_duration_seconds', 'Duração da execução das consultas SQLite', ('statement',), buckets=QUERY_BUCKETS))
+
+# Modelos de previsão
+ml_model_load_seconds = _register(Histogram(
+    'ml_model_load_seconds', 'Tempo de carregamento de um modelo e seu scaler do disco', buckets=QUERY_BUCKETS))
+ml_prediction_seconds = _register(Histogram(
+    'ml_prediction_seconds', 'Duração da previsão de despesas do próximo mês', buckets=SLOW_BUCKETS))
+ml_training_seconds = _register(Histogram(
+    'ml_training_seconds', 'Duração do treinamento dos modelos de previsão', buckets=SLOW_BUCKETS))
+
+# Modelo de linguagem
+llm_duration = _register(Histogram(
+    'llm_request_duration_seconds', 'Duração das chamadas ao modelo de linguagem', ('mode',), buckets=SLOW_BUCKETS))
+llm_errors = _register(Counter(
+    'llm_errors_total', 'Chamadas ao modelo de linguagem que falharam', ('mode',)))
+
+# Ingestão de transações bancárias (notificações, importações e lançamentos manuais)
+bank_transactions_ingested = _register(Counter(
+    'bank_transactions_ingested_total', 'Transações bancárias gravadas, por origem', ('method',)))
+
+# Consultas da requisição atual (lista mutável: visível também em threads e corrotinas derivadas)
+_request_queries = contextvars.ContextVar('request_queries', default=None)
+
+# Primeira palavra da instrução -> rótulo 'statement' (conjunto fechado)
+_STATEMENTS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'BEGIN', 'COMMIT', 'CREATE', 'PRAGMA'}
+
+def _record_query(sql, duration):
+    words = sql.split(None, 1)
+    statement = words[0].upper() if words else 'OTHER'
+    db_query_duration.observe(duration, statement if statement in _STATEMENTS else 'OTHER')
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que mede cada execute (o tempo de fetch das linhas seguintes não entra)"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - start)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexão SQLite cujos cursores registram as consultas (factory de sqlite3.connect)"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def start_request():
+    """Inicia a contagem de consultas da requisição; retorna o instante de início"""
+    _request_queries.set([0])
+    return time.perf_counter()
+
+def finish_request(method, route, status, start):
+    """Registra contagem, duração e consultas da requisição iniciada por start_request"""
+    if start is None:
+        return
+    http_requests.inc(method, route, str(status))
+    http_duration.observe(time.perf_counter() - start, method, route)
+    counter = _request_queries.get()
+    if counter is not None:
+        db_queries_per_request.observe(counter[0], route)
+    _request_queries.set(None)
+
+def render():
+    """Texto de todas as métricas no formato de exposição do Prometheus"""
+    lines = []
+    for metric in _metrics:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for sample, value in metric.samples():
+            lines.append(f'{sample} {_format_value(value)}')
+
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            logging.error(f"Erro ao coletar métricas: {str(e)}")
+            continue
+        for name, metric_type, help, samples in families:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in samples:
+                names = tuple(labels)
+                lines.append(f'{name}{_format_labels(names, tuple(labels[n] for n in names))} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+def init_metrics(app):
+    """Registra no app Flask a medição das requisições e a rota GET /metrics"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_request_metrics():
+        g.metrics_start = start_request()
+
+    @app.after_request
+    def _finish_request_metrics(response):
+        # Modelo da rota (ex.: /api/alertas/<int:id>) para manter poucas séries
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        finish_request(request.method, route, response.status_code, g.pop('metrics_start', None))
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Métricas da aplicação no formato de texto do Prometheus"""
+        return Response(render(), content_type=CONTENT_TYPE)
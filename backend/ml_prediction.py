@@ -7,6 +7,24 @@ import joblib
 import os
 from datetime import datetime, timedelta
 import calendar
+import logging
+from metrics import ml_model_load_seconds, ml_prediction_seconds, ml_training_seconds
+
+logger = logging.getLogger(__name__)
+
+# Pasta dos modelos treinados (um modelo e um scaler por categoria)
+MODELS_DIR = os.path.join(os.path.dirname(__file__), 'models')
+
+def get_models_version():
+    """
+    Versão dos modelos gravados (maior data de modificação dos arquivos), usada
+    para invalidar previsões em cache após um novo treinamento.
+    """
+    try:
+        with os.scandir(MODELS_DIR) as entries:
+            return max((entry.stat().st_mtime for entry in entries if entry.is_file()), default=0)
+    except FileNotFoundError:
+        return 0
 
 def prepare_data_for_prediction(conn):
     """
@@ -30,7 +48,7 @@ def prepare_data_for_prediction(conn):
         
     except Exception as e:
         # Fallback query if the join fails
-        print(f"Error in original query: {str(e)}")
+        logger.error(f"Error in original query: {str(e)}")
         alternative_query = """
             SELECT t.date, t.amount, t.type, 'Sem categoria' as category
             FROM transactions t
@@ -41,11 +59,11 @@ def prepare_data_for_prediction(conn):
     
     # Verificar se há dados suficientes
     if df.empty:
-        print("No expense transactions found in database")
+        logger.warning("No expense transactions found in database")
         return pd.DataFrame()
     
-    print(f"Found {len(df)} expense transactions")
-    print(f"Columns available: {df.columns.tolist()}")
+    logger.debug(f"Found {len(df)} expense transactions")
+    logger.debug(f"Columns available: {df.columns.tolist()}")
     
     # Convert date to datetime, com tratamento de erros melhorado
     try:
@@ -53,16 +71,16 @@ def prepare_data_for_prediction(conn):
         # Remover linhas com datas inválidas
         invalid_dates = df['date'].isna().sum()
         if (invalid_dates > 0):
-            print(f"Removed {invalid_dates} rows with invalid dates")
+            logger.warning(f"Removed {invalid_dates} rows with invalid dates")
             df = df.dropna(subset=['date'])
     except Exception as e:
-        print(f"Error converting dates: {str(e)}")
+        logger.error(f"Error converting dates: {str(e)}")
         # Tentar um formato alternativo
         try:
             df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d', errors='coerce')
             df = df.dropna(subset=['date'])
         except:
-            print("Unable to parse date values")
+            logger.warning("Unable to parse date values")
             return pd.DataFrame()
     
     # Extract month and year
@@ -77,7 +95,7 @@ def prepare_data_for_prediction(conn):
     
     # Verificar quantos meses distintos temos
     unique_months = monthly_expenses['year_month'].nunique()
-    print(f"Found data for {unique_months} distinct months")
+    logger.debug(f"Found data for {unique_months} distinct months")
     
     # Reduzir o número de lags se não tivermos dados suficientes
     max_lags = min(3, unique_months - 1)
@@ -101,7 +119,7 @@ def prepare_data_for_prediction(conn):
             
             # Atualizar contagem de meses
             unique_months = monthly_expenses['year_month'].nunique()
-            print(f"Added synthetic data to have {unique_months} months")
+            logger.debug(f"Added synthetic data to have {unique_months} months")
     
     # Pivot to have categories as columns
     pivoted = monthly_expenses.pivot_table(
@@ -126,41 +144,43 @@ def prepare_data_for_prediction(conn):
     
     # Drop rows with NaN (first max_lags months that don't have history)
     result_df = result_df.dropna()
-    print(f"Final dataset has {len(result_df)} rows after creating lags")
+    logger.debug(f"Final dataset has {len(result_df)} rows after creating lags")
     
     return result_df
 
+@ml_training_seconds.timed()
 def train_prediction_models(conn, force_retrain=False):
     """
     Train machine learning models to predict expenses for each category.
     Models are saved to disk for future use.
+    Returns the number of models trained (None if existing models were kept).
     """
-    models_dir = os.path.join(os.path.dirname(__file__), 'models')
+    models_dir = MODELS_DIR
     os.makedirs(models_dir, exist_ok=True)
     
-    print(f"Verificando modelos em: {models_dir}")
+    logger.debug(f"Verificando modelos em: {models_dir}")
     
     # Check if models directory exists and has files (unless force_retrain)
     if not force_retrain and os.path.exists(models_dir) and len(os.listdir(models_dir)) > 0:
-        print("Using existing models. Use force_retrain=True to retrain.")
-        print(f"Existem {len(os.listdir(models_dir))} arquivos na pasta de modelos.")
+        logger.info("Using existing models. Use force_retrain=True to retrain.")
+        logger.debug(f"Existem {len(os.listdir(models_dir))} arquivos na pasta de modelos.")
         return
     
-    print("Preparando dados para treinamento...")
+    logger.debug("Preparando dados para treinamento...")
     # Prepare data
     data = prepare_data_for_prediction(conn)
     
-    print(f"Dados preparados: {len(data)} linhas, {list(data.columns) if not data.empty else 'sem colunas'}")
+    logger.debug(f"Dados preparados: {len(data)} linhas, {list(data.columns) if not data.empty else 'sem colunas'}")
     
     if len(data) < 2:  # Reduzido de 5 para 2 para ser menos restritivo
-        print(f"Aviso: Não há dados suficientes para treinar modelos de predição (precisa de pelo menos 2 meses, temos {len(data)}).")
-        return
+        logger.warning(f"Aviso: Não há dados suficientes para treinar modelos de predição (precisa de pelo menos 2 meses, temos {len(data)}).")
+        return 0
     
-    print("Iniciando treinamento dos modelos...")
+    logger.debug("Iniciando treinamento dos modelos...")
     # For each category column, train a model
     category_columns = [col for col in data.columns if not col.endswith(('_lag_1', '_lag_2', '_lag_3')) and col != 'year_month']
     
-    print(f"Categorias encontradas: {category_columns}")
+    logger.debug(f"Categorias encontradas: {category_columns}")
     models_trained = 0
     
     for category in category_columns:
@@ -169,7 +189,7 @@ def train_prediction_models(conn, force_retrain=False):
             X = data.drop(['year_month'] + category_columns, axis=1)
             y = data[category]
             
-            print(f"Treinando modelo para categoria '{category}': {len(X)} amostras, {len(X.columns)} features")
+            logger.debug(f"Treinando modelo para categoria '{category}': {len(X)} amostras, {len(X.columns)} features")
             
             # Scale features
             scaler = StandardScaler()
@@ -177,7 +197,7 @@ def train_prediction_models(conn, force_retrain=False):
             
             # Train model - use LinearRegression for fewer samples
             if len(X) < 5:
-                print(f"Usando LinearRegression para '{category}' devido ao pequeno número de amostras")
+                logger.info(f"Usando LinearRegression para '{category}' devido ao pequeno número de amostras")
                 model = LinearRegression()
             else:
                 model = RandomForestRegressor(n_estimators=100, random_state=42)
@@ -190,41 +210,51 @@ def train_prediction_models(conn, force_retrain=False):
             
             joblib.dump(model, model_path)
             joblib.dump(scaler, scaler_path)
-            print(f"Modelo para '{category}' salvo em: {model_path}")
+            logger.debug(f"Modelo para '{category}' salvo em: {model_path}")
             models_trained += 1
             
         except Exception as e:
-            print(f"Erro ao treinar modelo para categoria '{category}': {str(e)}")
+            logger.error(f"Erro ao treinar modelo para categoria '{category}': {str(e)}")
     
-    print(f"Treinamento concluído! {models_trained} modelos de {len(category_columns)} categorias foram treinados e salvos.")
+    logger.info(f"Treinamento concluído! {models_trained} modelos de {len(category_columns)} categorias foram treinados e salvos.")
+    return models_trained
 
-def predict_next_month_expenses(conn):
+@ml_prediction_seconds.timed()
+def predict_next_month_expenses(conn, allow_training=True):
     """
     Predict expenses for the next month across all categories.
     Returns a dictionary of predicted amounts by category.
+
+    Com allow_training=False a previsão só usa os modelos já gravados: sem
+    modelos, retorna None em vez de treinar (o treinamento fica com /api/ml/train).
     """
-    models_dir = os.path.join(os.path.dirname(__file__), 'models')
-    os.makedirs(models_dir, exist_ok=True)
+    models_dir = MODELS_DIR
     
-    print("Iniciando previsão de despesas para o próximo mês")
+    logger.debug("Iniciando previsão de despesas para o próximo mês")
     
     # Forçar retreinamento se não houver modelos ou se os modelos forem poucos
     force_retrain = not os.path.exists(models_dir) or len(os.listdir(models_dir)) < 2
     
+    if force_retrain and not allow_training:
+        logger.info("Modelos insuficientes e treinamento não permitido: sem previsões")
+        return None
+    
+    os.makedirs(models_dir, exist_ok=True)
+    
     if force_retrain:
-        print("Modelos insuficientes. Forçando retreinamento...")
+        logger.warning("Modelos insuficientes. Forçando retreinamento...")
         train_prediction_models(conn, force_retrain=True)
     
     # Get recent data for prediction
     data = prepare_data_for_prediction(conn)
     
     if data.empty:
-        print("Não foi possível preparar os dados para previsão")
+        logger.warning("Não foi possível preparar os dados para previsão")
         
         # Se não conseguimos fazer uma previsão adequada, vamos fazer uma estimativa simples
         # baseada nas últimas transações
         try:
-            print("Tentando criar uma previsão simplificada com base nas transações recentes")
+            logger.debug("Tentando criar uma previsão simplificada com base nas transações recentes")
             
             # Obter média de gastos dos últimos 3 meses por categoria
             query = """
@@ -258,7 +288,7 @@ def predict_next_month_expenses(conn):
                 
                 next_month_str = next_month.strftime('%Y-%m')
                 
-                print(f"Previsão simplificada criada com {len(predictions)} categorias")
+                logger.info(f"Previsão simplificada criada com {len(predictions)} categorias")
                 return {
                     "prediction_date": next_month_str,
                     "total_predicted": round(total_predicted, 2),
@@ -266,23 +296,23 @@ def predict_next_month_expenses(conn):
                     "method": "simple_average"
                 }
             else:
-                print("Nenhuma transação de despesa encontrada nos últimos 3 meses")
+                logger.warning("Nenhuma transação de despesa encontrada nos últimos 3 meses")
                 return {"error": "Not enough expense data for predictions"}
                 
         except Exception as e:
-            print(f"Erro ao criar previsão simplificada: {str(e)}")
+            logger.error(f"Erro ao criar previsão simplificada: {str(e)}")
             return {"error": "Error creating predictions"}
     
     # Verificamos quantos meses de dados temos
-    print(f"Dados preparados: {len(data)} meses de dados disponíveis")
+    logger.debug(f"Dados preparados: {len(data)} meses de dados disponíveis")
     
     # Se não temos modelos treinados, tentar treiná-los novamente
     if len(os.listdir(models_dir)) == 0:
-        print("Nenhum modelo encontrado. Tentando treinar com os dados disponíveis.")
+        logger.warning("Nenhum modelo encontrado. Tentando treinar com os dados disponíveis.")
         train_prediction_models(conn, force_retrain=True)
         
         if len(os.listdir(models_dir)) == 0:
-            print("Ainda não foi possível criar modelos. Tentando abordagem alternativa.")
+            logger.warning("Ainda não foi possível criar modelos. Tentando abordagem alternativa.")
             # Se ainda não temos modelos, vamos pegar média dos últimos meses
             try:
                 # Calcular a média de cada categoria nos dados disponíveis
@@ -309,7 +339,7 @@ def predict_next_month_expenses(conn):
                 
                 next_month_str = next_month.strftime('%Y-%m')
                 
-                print(f"Criada previsão simplificada com base em média histórica para {len(predictions)} categorias")
+                logger.info(f"Criada previsão simplificada com base em média histórica para {len(predictions)} categorias")
                 
                 return {
                     "prediction_date": next_month_str,
@@ -319,7 +349,7 @@ def predict_next_month_expenses(conn):
                 }
                 
             except Exception as e:
-                print(f"Erro ao calcular médias: {str(e)}")
+                logger.error(f"Erro ao calcular médias: {str(e)}")
                 return {"error": "Error creating predictions from averages"}
     
     # Get the most recent data point
@@ -329,10 +359,10 @@ def predict_next_month_expenses(conn):
     models_files = [f for f in os.listdir(models_dir) if f.endswith('_model.joblib')]
     categories = [f.replace('_model.joblib', '') for f in models_files]
     
-    print(f"Encontrados {len(categories)} modelos treinados")
+    logger.debug(f"Encontrados {len(categories)} modelos treinados")
     
     if not categories:
-        print("Nenhum modelo encontrado para as categorias")
+        logger.warning("Nenhum modelo encontrado para as categorias")
         return {"error": "No trained models available"}
     
     # Predict next month for each category
@@ -347,17 +377,18 @@ def predict_next_month_expenses(conn):
             scaler_path = os.path.join(models_dir, f'{category}_scaler.joblib')
             
             if not (os.path.exists(model_path) and os.path.exists(scaler_path)):
-                print(f"Arquivo de modelo ou scaler ausente para categoria '{category}'")
+                logger.warning(f"Arquivo de modelo ou scaler ausente para categoria '{category}'")
                 continue
                 
-            model = joblib.load(model_path)
-            scaler = joblib.load(scaler_path)
+            with ml_model_load_seconds.time():
+                model = joblib.load(model_path)
+                scaler = joblib.load(scaler_path)
             
             # Prepare features - only the lag columns
             feature_cols = [col for col in latest_data.columns if col.endswith(('_lag_1', '_lag_2', '_lag_3'))]
             
             if not feature_cols:
-                print(f"Nenhuma coluna de feature encontrada para categoria '{category}'")
+                logger.warning(f"Nenhuma coluna de feature encontrada para categoria '{category}'")
                 continue
             
             try:
@@ -372,18 +403,18 @@ def predict_next_month_expenses(conn):
                 # Store prediction (ensure it's not negative)
                 predictions[category] = max(0, round(prediction, 2))
                 total_predicted += predictions[category]
-                print(f"Previsão para '{category}': {predictions[category]}")
+                logger.debug(f"Previsão para '{category}': {predictions[category]}")
                 
             except Exception as e:
-                print(f"Erro ao fazer previsão para categoria '{category}': {str(e)}")
+                logger.error(f"Erro ao fazer previsão para categoria '{category}': {str(e)}")
                 errors += 1
             
         except Exception as e:
-            print(f"Erro ao carregar modelo para categoria '{category}': {str(e)}")
+            logger.error(f"Erro ao carregar modelo para categoria '{category}': {str(e)}")
             errors += 1
     
     if not predictions:
-        print("Não foi possível gerar previsões com os modelos existentes")
+        logger.warning("Não foi possível gerar previsões com os modelos existentes")
         return {"error": "Failed to generate predictions with existing models"}
     
     # Calculate the next month's date
@@ -395,7 +426,7 @@ def predict_next_month_expenses(conn):
     
     next_month_str = next_month.strftime('%Y-%m')
     
-    print(f"Previsão para {next_month_str} concluída com {len(predictions)} categorias")
+    logger.info(f"Previsão para {next_month_str} concluída com {len(predictions)} categorias")
     
     # Garantir que não haja valores NaN ou infinitos nas previsões
     cleaned_predictions = {}
@@ -429,7 +460,7 @@ def get_historical_vs_predicted_data(conn, months=6):
             return generate_demo_predictions()
             
     except Exception as e:
-        print(f"Error checking for transactions: {str(e)}")
+        logger.error(f"Error checking for transactions: {str(e)}")
         # Continue with regular flow - we'll handle errors below
     
     try:
@@ -464,7 +495,7 @@ def get_historical_vs_predicted_data(conn, months=6):
             categories = categories_df['name'].tolist()
         except Exception as e:
             # Fallback - use default categories if query fails
-            print(f"Error getting categories: {str(e)}")
+            logger.error(f"Error getting categories: {str(e)}")
             categories = []
             
             # Try to get at least the existing categories from the database
@@ -580,7 +611,7 @@ def get_historical_vs_predicted_data(conn, months=6):
         }
         
     except Exception as e:
-        print(f"Erro ao gerar dados históricos vs previstos: {str(e)}")
+        logger.error(f"Erro ao gerar dados históricos vs previstos: {str(e)}")
         # Se ocorrer algum erro, retornar dados de demonstração
         return generate_demo_predictions()
 
@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+from analysis_cache import init_data_versions, get_data_versions
+
+# Escopo da tabela de preferências na tabela de versões dos dados
+PREFERENCES_SCOPE = 'user_preferences'
+
+# Arquivo usado pelas versões anteriores (importado uma única vez, se existir)
+LEGACY_PREFERENCES_FILE = 'user_preferences.json'
+
+def init_preferences_table(cursor):
+    """Cria a tabela de preferências (uma linha por chave, valor em JSON) e seus triggers de versão"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_preferences (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        key TEXT UNIQUE,
+        value TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    init_data_versions(cursor, tables=(PREFERENCES_SCOPE,))
+
+def import_legacy_preferences(conn, path=LEGACY_PREFERENCES_FILE):
+    """
+    Importa o antigo arquivo user_preferences.json para a tabela, se a tabela
+    ainda estiver vazia. Chaves já gravadas no banco têm precedência.
+
+    Returns:
+        Número de preferências importadas
+    """
+    if not os.path.exists(path):
+        return 0
+
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) FROM user_preferences')
+    if cursor.fetchone()[0] > 0:
+        return 0
+
+    try:
+        with open(path, 'r') as f:
+            preferences = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.error(f"Erro ao importar preferências de {path}: {str(e)}")
+        return 0
+
+    if not isinstance(preferences, dict):
+        return 0
+    return preference_store.save(conn, preferences)
+
+class PreferenceStore:
+    """
+    Preferências do usuário persistidas na tabela user_preferences, com um
+    cache em memória de leitura direta.
+
+    O cache é validado pela versão da tabela (incrementada por trigger), então
+    uma leitura sem mudanças custa apenas a consulta da versão, e escritas de
+    outros processos são vistas na próxima leitura.
+    """
+
+    def __init__(self):
+        self._preferences = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _current_version(self, conn):
+        return get_data_versions(conn).get(PREFERENCES_SCOPE, 0)
+
+    def load(self, conn):
+        """Retorna uma cópia de todas as preferências ({chave: valor})"""
+        version = self._current_version(conn)
+        with self._lock:
+            if version == self._version:
+                return dict(self._preferences)
+
+        cursor = conn.cursor()
+        cursor.execute('SELECT key, value FROM user_preferences')
+        preferences = {}
+        for key, value in cursor.fetchall():
+            try:
+                preferences[key] = json.loads(value)
+            except (TypeError, ValueError):
+                # Valores gravados fora deste módulo podem não estar em JSON
+                preferences[key] = value
+
+        with self._lock:
+            self._preferences = preferences
+            self._version = version
+            return dict(preferences)
+
+    def save(self, conn, preferences):
+        """
+        Grava várias preferências em uma única transação (upsert em lote).
+
+        Só as chaves informadas são alteradas, então processos que salvam
+        chaves diferentes ao mesmo tempo não sobrescrevem uns aos outros.
+
+        Args:
+            conn: Conexão com o banco de dados
+            preferences: Dicionário {chave: valor}; valores são serializados em JSON
+
+        Returns:
+            Número de preferências gravadas
+        """
+        if not preferences:
+            return 0
+
+        updated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = [(key, json.dumps(value, ensure_ascii=False), updated_at)
+                for key, value in preferences.items()]
+
+        try:
+            conn.executemany('''
+                INSERT INTO user_preferences (key, value, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            ''', rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        # Cada linha gravada dispara o trigger de versão; invalidar o cache local
+        with self._lock:
+            self._version = None
+        return len(rows)
+
+# Cache de preferências compartilhado pelo processo
+preference_store = PreferenceStore()
+
+def load_preferences(conn):
+    """Preferências atuais do usuário (leitura através do cache)"""
+    return preference_store.load(conn)
+
+def save_preferences(conn, preferences):
+    """Grava as preferências informadas em uma única transação"""
+    return preference_store.save(conn, preferences)
@@ -0,0 +1,327 @@
+import logging
+import math
+from datetime import datetime, timedelta
+from itertools import groupby
+from statistics import median
+
+# Periodicidades reconhecidas: intervalo típico em dias e tolerância aceita
+RECURRENCE_PERIODS = {
+    'weekly': (7, 2),
+    'monthly': (30, 4),
+    'yearly': (365, 15)
+}
+
+# Tolerância relativa de valor: cobranças da mesma série variam pouco
+# (reajustes, IOF), então valores até ~20% acima do menor valor do grupo
+# pertencem à mesma série
+AMOUNT_BAND_RATIO = 1.2
+
+# Número mínimo de ocorrências para considerar uma série recorrente
+MIN_OCCURRENCES = 3
+
+# Fração mínima de intervalos dentro da tolerância do período
+MIN_REGULARITY = 0.75
+
+# Horizonte máximo (em dias) da previsão de ocorrências futuras
+MAX_FORECAST_DAYS = 365
+
+def init_recurring_tables(cursor):
+    """Cria a tabela de séries recorrentes, se não existir"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS recurring_series (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        merchant_key TEXT NOT NULL,
+        amount_band INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        period TEXT NOT NULL,
+        interval_days REAL NOT NULL,
+        avg_amount REAL NOT NULL,
+        last_amount REAL NOT NULL,
+        occurrences INTEGER NOT NULL,
+        first_date TEXT NOT NULL,
+        last_date TEXT NOT NULL,
+        next_expected_date TEXT NOT NULL,
+        confidence REAL NOT NULL,
+        is_subscription INTEGER NOT NULL DEFAULT 0,
+        description TEXT,
+        updated_at TEXT NOT NULL,
+        UNIQUE (merchant_key, amount_band, type)
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_recurring_series_next ON recurring_series (next_expected_date)')
+
+def amount_band(amount):
+    """Retorna a faixa logarítmica de um valor (identifica a série pelo menor valor do grupo)"""
+    amount = abs(amount or 0)
+    if amount < 1:
+        return 0
+    return int(math.floor(math.log(amount) / math.log(AMOUNT_BAND_RATIO)))
+
+def detect_periodicity(dates):
+    """
+    Detecta a periodicidade de uma série de datas já ordenadas.
+
+    Usa a mediana dos intervalos entre ocorrências consecutivas e a fração de
+    intervalos que ficam dentro da tolerância do período candidato.
+
+    Args:
+        dates: Lista ordenada de objetos datetime
+
+    Returns:
+        Tupla (period, interval_days, confidence) ou None se não for recorrente
+    """
+    if len(dates) < MIN_OCCURRENCES:
+        return None
+
+    intervals = [(later - earlier).days for earlier, later in zip(dates, dates[1:])]
+    # Lançamentos duplicados no mesmo dia não contam como ocorrências distintas
+    intervals = [interval for interval in intervals if interval > 0]
+    if len(intervals) < MIN_OCCURRENCES - 1:
+        return None
+
+    typical = median(intervals)
+
+    for period, (expected, tolerance) in RECURRENCE_PERIODS.items():
+        if abs(typical - expected) > tolerance:
+            continue
+
+        regular = sum(1 for interval in intervals if abs(interval - expected) <= tolerance)
+        confidence = regular / len(intervals)
+        if confidence >= MIN_REGULARITY:
+            return period, typical, round(confidence, 3)
+
+    return None
+
+def _build_series(merchant_key, band, type, rows):
+    """Monta o registro de uma série a partir das ocorrências (date, amount, is_subscription, description)"""
+    parsed = []
+    for row in rows:
+        try:
+            parsed.append((datetime.strptime((row[0] or '')[:10], '%Y-%m-%d'), row))
+        except (TypeError, ValueError):
+            # Datas inválidas gravadas por versões antigas não impedem a detecção
+            logging.warning(f"Data inválida ignorada na série recorrente de {merchant_key}: {row[0]!r}")
+    dates = [date for date, _ in parsed]
+    rows = [row for _, row in parsed]
+
+    detected = detect_periodicity(dates)
+    if not detected:
+        return None
+
+    period, interval_days, confidence = detected
+    amounts = [row[1] for row in rows]
+    next_expected = dates[-1] + timedelta(days=round(interval_days))
+
+    return {
+        'merchant_key': merchant_key,
+        'amount_band': band,
+        'type': type,
+        'period': period,
+        'interval_days': interval_days,
+        'avg_amount': sum(amounts) / len(amounts),
+        'last_amount': amounts[-1],
+        'occurrences': len(rows),
+        'first_date': dates[0].strftime('%Y-%m-%d'),
+        'last_date': dates[-1].strftime('%Y-%m-%d'),
+        'next_expected_date': next_expected.strftime('%Y-%m-%d'),
+        'confidence': confidence,
+        'is_subscription': 1 if any(row[2] for row in rows) else 0,
+        'description': rows[-1][3],
+        'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+def _group_rows(rows):
+    """
+    Agrupa linhas (merchant_key, type, date, amount, is_subscription, description)
+    por comerciante, tipo e valor.
+
+    Os valores de cada comerciante são percorridos em ordem crescente e um novo
+    grupo começa quando o valor passa de AMOUNT_BAND_RATIO vezes o menor valor
+    do grupo atual, então valores próximos nunca são separados por uma borda
+    de faixa fixa. Cada grupo é identificado pela faixa do seu menor valor e
+    mantém as ocorrências na ordem original (por data).
+    """
+    by_merchant = {}
+    for merchant_key, type, date, amount, is_subscription, description in rows:
+        by_merchant.setdefault((merchant_key, type), []).append((date, amount, is_subscription, description))
+
+    groups = {}
+    for (merchant_key, type), occurrences in by_merchant.items():
+        clusters = []
+        for amount, position in sorted((abs(row[1] or 0), position) for position, row in enumerate(occurrences)):
+            base = clusters[-1][0][0] if clusters else None
+            # A faixa do menor valor identifica o grupo, então ela também precisa mudar
+            # (valores abaixo de 1 compartilham a faixa 0)
+            if base is None or (amount > base * AMOUNT_BAND_RATIO and amount_band(amount) > amount_band(base)):
+                clusters.append([])
+            clusters[-1].append((amount, position))
+
+        for cluster in clusters:
+            positions = sorted(position for _, position in cluster)
+            groups[(merchant_key, amount_band(cluster[0][0]), type)] = [occurrences[p] for p in positions]
+    return groups
+
+def _upsert_series(cursor, series):
+    columns = list(series.keys())
+    updates = ', '.join(f'{column} = excluded.{column}' for column in columns
+                        if column not in ('merchant_key', 'amount_band', 'type'))
+    cursor.execute(
+        f"INSERT INTO recurring_series ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+        f"ON CONFLICT (merchant_key, amount_band, type) DO UPDATE SET {updates}",
+        list(series.values())
+    )
+
+def rebuild_recurring_series(conn):
+    """
+    Recalcula todas as séries recorrentes a partir do histórico completo.
+
+    O SQLite ordena as transações por comerciante e data (O(n log n)); o
+    agrupamento e a detecção de periodicidade são lineares sobre essa ordem.
+
+    Returns:
+        Número de séries recorrentes encontradas
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT merchant_key, type, date, amount, is_subscription, description
+        FROM transactions
+        WHERE merchant_key IS NOT NULL AND merchant_key != ''
+        ORDER BY merchant_key, date, id
+    ''')
+
+    found = []
+    for _, merchant_rows in groupby(cursor.fetchall(), key=lambda row: row[0]):
+        for (merchant_key, band, type), rows in _group_rows(merchant_rows).items():
+            series = _build_series(merchant_key, band, type, rows)
+            if series:
+                found.append(series)
+
+    cursor.execute('DELETE FROM recurring_series')
+    for series in found:
+        _upsert_series(cursor, series)
+
+    conn.commit()
+    return len(found)
+
+def update_recurring_series(conn, merchant_key, amount, type, commit=True):
+    """
+    Atualiza incrementalmente as séries do comerciante de uma nova transação.
+
+    Lê apenas o histórico do comerciante (índice em merchant_key, date), então o
+    custo é proporcional às ocorrências desse comerciante e não ao histórico total.
+    Os grupos de valor do comerciante são recalculados (a nova transação pode
+    unir ou deslocar grupos) e as séries que deixaram de existir são removidas.
+
+    Returns:
+        A série da nova transação (dicionário) ou None se o grupo não for recorrente
+    """
+    if not merchant_key:
+        return None
+
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT merchant_key, type, date, amount, is_subscription, description
+        FROM transactions
+        WHERE merchant_key = ? AND type = ?
+        ORDER BY date, id
+    ''', (merchant_key, type))
+
+    found = None
+    bands = []
+    for (_, band, _), rows in _group_rows(cursor.fetchall()).items():
+        series = _build_series(merchant_key, band, type, rows)
+        if not series:
+            continue
+        _upsert_series(cursor, series)
+        bands.append(band)
+        if any(row[1] == amount for row in rows):
+            found = series
+
+    cursor.execute(
+        f"DELETE FROM recurring_series WHERE merchant_key = ? AND type = ? "
+        f"AND amount_band NOT IN ({', '.join('?' for _ in bands)})",
+        (merchant_key, type, *bands)
+    )
+
+    if commit:
+        conn.commit()
+    return found
+
+def get_recurring_series(conn, period=None, subscriptions_only=False, type=None):
+    """
+    Lista as séries recorrentes detectadas, sem reprocessar o histórico.
+
+    Args:
+        conn: Conexão com o banco de dados
+        period: Filtra por periodicidade ('weekly', 'monthly', 'yearly')
+        subscriptions_only: Retorna apenas séries classificadas como assinatura
+        type: Filtra por tipo de transação ('income' ou 'expense')
+
+    Returns:
+        Lista de dicionários com as séries
+    """
+    conditions = []
+    params = []
+
+    if period:
+        conditions.append('period = ?')
+        params.append(period)
+    if subscriptions_only:
+        conditions.append('is_subscription = 1')
+    if type:
+        conditions.append('type = ?')
+        params.append(type)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT * FROM recurring_series {where} ORDER BY avg_amount DESC', params)
+
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def get_upcoming_recurring(conn, days=30, start_date=None):
+    """
+    Projeta as ocorrências das séries recorrentes nos próximos dias (previsão de fluxo de caixa).
+
+    Args:
+        conn: Conexão com o banco de dados
+        days: Horizonte da previsão em dias
+        start_date: Data inicial (padrão: hoje)
+
+    Returns:
+        Dicionário com as ocorrências previstas e os totais de entradas e saídas
+    """
+    start = start_date or datetime.now()
+    end = start + timedelta(days=days)
+
+    occurrences = []
+    for series in get_recurring_series(conn):
+        expected = datetime.strptime(series['next_expected_date'], '%Y-%m-%d')
+        step = timedelta(days=round(series['interval_days']))
+
+        # Séries atrasadas há mais de um período são consideradas encerradas
+        if expected + step < start:
+            continue
+
+        while expected < end:
+            if expected >= start:
+                occurrences.append({
+                    'date': expected.strftime('%Y-%m-%d'),
+                    'description': series['description'],
+                    'merchant_key': series['merchant_key'],
+                    'type': series['type'],
+                    'amount': series['last_amount'],
+                    'period': series['period'],
+                    'confidence': series['confidence']
+                })
+            expected += step
+
+    occurrences.sort(key=lambda item: item['date'])
+
+    return {
+        'start_date': start.strftime('%Y-%m-%d'),
+        'end_date': end.strftime('%Y-%m-%d'),
+        'occurrences': occurrences,
+        'expected_income': sum(o['amount'] for o in occurrences if o['type'] == 'income'),
+        'expected_expenses': sum(o['amount'] for o in occurrences if o['type'] == 'expense')
+    }
@@ -0,0 +1,178 @@
+"""
+Serialização JSON e compressão das respostas da API.
+
+Com o orjson instalado, as respostas são serializadas diretamente em bytes,
+com suporte nativo a tipos do numpy (escalares e arrays) e datas; sem ele, o
+json da biblioteca padrão é usado com as mesmas regras. A política para NaN
+e infinitos é a mesma nos dois casos: viram null (o JSON não tem
+representação para eles), então as rotas não precisam limpar esses valores.
+
+Respostas acima de COMPRESSION_MIN_BYTES são comprimidas com brotli (se o
+pacote brotli estiver instalado e o cliente aceitar) ou gzip.
+"""
+import datetime
+import decimal
+import gzip
+import json
+import math
+import uuid
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Tamanho mínimo (bytes) da resposta para compressão; abaixo disso o ganho não compensa a CPU
+COMPRESSION_MIN_BYTES = 1024
+
+# Níveis de compressão (equilíbrio entre CPU e tamanho para respostas dinâmicas)
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+# Tipos de conteúdo comprimidos (eventos SSE e binários não entram)
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/csv', 'text/html')
+
+def _default(obj):
+    """Converte os tipos que o serializador não conhece (pandas, Decimal, conjuntos, escalares numpy)"""
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    # pandas.NA / NaT e equivalentes
+    if type(obj).__name__ in ('NAType', 'NaTType'):
+        return None
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, 'item'):
+        return obj.item()
+    raise TypeError(f"Tipo não serializável em JSON: {type(obj).__name__}")
+
+def _finite(obj):
+    """Substitui NaN e infinitos por None (usado apenas sem o orjson, que já faz isso)"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    return obj
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj):
+        """Serializa em JSON (bytes, UTF-8)"""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    def dumps_bytes(obj):
+        """Serializa em JSON (bytes, UTF-8)"""
+        text = json.dumps(_finite(obj), default=lambda value: _finite(_default(value)),
+                          ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+        return text.encode('utf-8')
+
+    def loads(data):
+        return json.loads(data)
+
+def dumps(obj):
+    """Serializa em JSON (str)"""
+    return dumps_bytes(obj).decode('utf-8')
+
+class FastJSONProvider(JSONProvider):
+    """Provedor JSON do Flask (jsonify, get_json) baseado em dumps_bytes/loads"""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Os bytes vão direto para a resposta, sem passar por str
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+
+def _accepted_encoding(accept_encoding):
+    """Escolhe a codificação aceita pelo cliente (brotli, se disponível, ou gzip)"""
+    accepted = set()
+    for item in accept_encoding.split(','):
+        name, _, params = item.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+def compress_response(response, accept_encoding, min_bytes=COMPRESSION_MIN_BYTES):
+    """
+    Comprime o corpo da resposta se o cliente aceitar e ele for grande o
+    suficiente. Respostas em streaming, já codificadas ou sem corpo são
+    devolvidas sem alteração.
+
+    Args:
+        response: Resposta do Flask
+        accept_encoding: Cabeçalho Accept-Encoding da requisição
+        min_bytes: Tamanho mínimo do corpo para comprimir
+
+    Returns:
+        A própria resposta
+    """
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _accepted_encoding(accept_encoding or '')
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < min_bytes:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_serialization(app):
+    """Instala o provedor JSON rápido e a compressão de respostas no app Flask"""
+    from flask import request
+
+    app.json = FastJSONProvider(app)
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, request.headers.get('Accept-Encoding'))
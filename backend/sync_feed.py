@@ -0,0 +1,331 @@
+import logging
+import math
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from transaction_query import TRANSACTION_SOURCES
+from alert_stream import flush_alerts, discard_alerts, pending_alert_count
+from time_index import flush_index, discard_index, pending_index_count
+
+# Tabelas acompanhadas pelo log de alterações e as colunas enviadas aos clientes
+SYNC_TABLES = {
+    'transactions': TRANSACTION_SOURCES['transactions']['columns'],
+    'bank_transactions': TRANSACTION_SOURCES['bank_transactions']['columns'],
+    'alerts': ('id', 'type', 'message', 'date', 'is_read'),
+    'savings_goals': ('id', 'name', 'target_amount', 'current_amount', 'deadline', 'created_at', 'completed')
+}
+
+# Alterações lidas por página do feed (padrão e máximo)
+DEFAULT_SYNC_PAGE = 500
+MAX_SYNC_PAGE = 5000
+
+# Dias de histórico mantidos no log; clientes mais atrasados recebem reset
+CHANGE_LOG_RETENTION_DAYS = 90
+
+# Transações aceitas por lote de sincronização
+MAX_SYNC_BATCH = 500
+
+# Datas aceitas nas transações sincronizadas: a partir de MIN_SYNC_DATE e até
+# MAX_FUTURE_DAYS dias depois de hoje (lançamentos agendados)
+MIN_SYNC_DATE = date(1900, 1, 1)
+MAX_FUTURE_DAYS = 366
+
+# Máximo de parâmetros por consulta IN (limite do SQLite)
+_IN_CHUNK = 500
+
+def init_change_log(cursor, tables=tuple(SYNC_TABLES)):
+    """
+    Cria o log de alterações (sequência crescente, nunca reutilizada) e os
+    triggers que registram cada INSERT, UPDATE e DELETE nas tabelas
+    sincronizadas. Na primeira execução, as linhas já existentes são
+    registradas como inserções, então um cliente novo sincroniza pelo
+    próprio feed.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        operation TEXT NOT NULL,
+        changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS change_log_state (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sync_idempotency_keys (
+        key TEXT PRIMARY KEY,
+        transaction_id INTEGER NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    ''')
+
+    for table in tables:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                       (f'trg_{table}_change_insert',))
+        seed = cursor.fetchone() is None
+
+        for operation, ref in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_change_{operation.lower()}
+            AFTER {operation} ON {table}
+            BEGIN
+                INSERT INTO change_log (table_name, row_id, operation)
+                VALUES ('{table}', {ref}.id, '{operation.lower()}');
+            END
+            ''')
+
+        if seed:
+            cursor.execute(f'''
+            INSERT INTO change_log (table_name, row_id, operation)
+            SELECT '{table}', id, 'insert' FROM {table} ORDER BY id
+            ''')
+
+def prune_change_log(conn, retention_days=CHANGE_LOG_RETENTION_DAYS):
+    """Remove alterações mais antigas que a retenção e registra até onde o log foi podado"""
+    cursor = conn.cursor()
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute('SELECT MAX(seq) FROM change_log WHERE changed_at < ?', (cutoff,))
+    pruned_through = cursor.fetchone()[0]
+    if pruned_through is None:
+        return 0
+
+    cursor.execute('DELETE FROM change_log WHERE seq <= ?', (pruned_through,))
+    removed = cursor.rowcount
+    cursor.execute('''
+        INSERT INTO change_log_state (key, value) VALUES ('pruned_through', ?)
+        ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)
+    ''', (pruned_through,))
+    cursor.execute("DELETE FROM sync_idempotency_keys WHERE created_at < ?", (cutoff,))
+    conn.commit()
+    return removed
+
+def get_sync_token(conn):
+    """Token que representa o estado atual (última alteração registrada)"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log')
+    return cursor.fetchone()[0]
+
+def parse_sync_token(value):
+    """Converte o token recebido do cliente (ValueError se inválido)"""
+    if value in (None, ''):
+        return 0
+    if not str(value).isdigit():
+        raise ValueError("Token de sincronização inválido")
+    return int(value)
+
+def _fetch_rows(cursor, table, ids):
+    columns = SYNC_TABLES[table]
+    rows = {}
+    ids = list(ids)
+    for start in range(0, len(ids), _IN_CHUNK):
+        chunk = ids[start:start + _IN_CHUNK]
+        cursor.execute(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE id IN ({', '.join('?' for _ in chunk)})",
+            chunk
+        )
+        for row in cursor.fetchall():
+            rows[row[0]] = dict(zip(columns, row))
+    return rows
+
+def get_changes(conn, since=0, limit=DEFAULT_SYNC_PAGE):
+    """
+    Alterações registradas depois do token `since`, agrupadas por tabela.
+
+    Várias alterações da mesma linha na página viram uma só: a linha é
+    enviada no estado atual ('inserted' se foi criada depois do token,
+    'updated' caso contrário) ou apenas o id, se foi excluída.
+
+    Args:
+        conn: Conexão com o banco
+        since: Token recebido na sincronização anterior (0: desde o início)
+        limit: Número máximo de alterações lidas do log
+
+    Returns:
+        Dicionário com 'sync_token' (a ser enviado na próxima chamada),
+        'has_more', 'reset' (o log já não cobre o token: o cliente deve
+        recarregar tudo) e 'changes' ({tabela: {inserted, updated, deleted}})
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT value FROM change_log_state WHERE key = 'pruned_through'")
+    row = cursor.fetchone()
+    if row and since < row[0]:
+        return {'sync_token': get_sync_token(conn), 'has_more': False, 'reset': True, 'changes': {}}
+
+    cursor.execute('''
+        SELECT seq, table_name, row_id, operation
+        FROM change_log
+        WHERE seq > ?
+        ORDER BY seq
+        LIMIT ?
+    ''', (since, limit + 1))
+    entries = cursor.fetchall()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Primeira e última operação de cada linha na página
+    first_operation = {}
+    last_operation = {}
+    for _, table, row_id, operation in entries:
+        first_operation.setdefault((table, row_id), operation)
+        last_operation[(table, row_id)] = operation
+
+    pending = {}
+    changes = {}
+    for (table, row_id), operation in last_operation.items():
+        group = changes.setdefault(table, {'inserted': [], 'updated': [], 'deleted': []})
+        if operation == 'delete':
+            group['deleted'].append(row_id)
+        else:
+            pending.setdefault(table, []).append(row_id)
+
+    for table, ids in pending.items():
+        rows = _fetch_rows(cursor, table, ids)
+        group = changes[table]
+        for row_id in ids:
+            # Linha ausente: excluída depois desta página (a exclusão vem na próxima)
+            if row_id not in rows:
+                continue
+            kind = 'inserted' if first_operation[(table, row_id)] == 'insert' else 'updated'
+            group[kind].append(rows[row_id])
+
+    return {
+        'sync_token': entries[-1][0] if entries else max(since, 0),
+        'has_more': has_more,
+        'reset': False,
+        'changes': changes
+    }
+
+def apply_transaction_batch(conn, items, insert):
+    """
+    Grava um lote de transações criadas offline, em uma única transação.
+
+    Cada item traz uma chave de idempotência: um item cuja chave já foi
+    gravada (reenvio após falha de rede, por exemplo) não é inserido de novo
+    e recebe o id da transação original. Um item inválido, ou cuja gravação
+    falha, recebe um erro próprio (desfeito até o seu savepoint) sem impedir
+    a gravação dos demais, para que o reenvio do lote não falhe para sempre.
+
+    Args:
+        conn: Conexão com o banco
+        items: Lista de {'idempotency_key', 'date', 'description', 'amount', 'type', 'category_id'}
+        insert: Função que grava uma transação (db.insert_transaction)
+
+    Returns:
+        Lista de resultados na ordem dos itens ({'idempotency_key', 'status', 'id' ou 'error'})
+    """
+    results = []
+    cursor = conn.cursor()
+    if not conn.in_transaction:
+        # Reserva a escrita desde o início: lotes concorrentes com a mesma chave não se intercalam
+        cursor.execute('BEGIN IMMEDIATE')
+    try:
+        for item in items:
+            key = item.get('idempotency_key') if isinstance(item, dict) else None
+            if not key or not isinstance(key, str):
+                results.append({'idempotency_key': key, 'status': 'error', 'error': 'Chave de idempotência ausente'})
+                continue
+
+            cursor.execute('SELECT transaction_id FROM sync_idempotency_keys WHERE key = ?', (key,))
+            existing = cursor.fetchone()
+            if existing:
+                results.append({'idempotency_key': key, 'status': 'duplicate', 'id': existing[0]})
+                continue
+
+            values, error = _validate_item(cursor, item)
+            if error:
+                results.append({'idempotency_key': key, 'status': 'error', 'error': error})
+                continue
+
+            alerts_before = pending_alert_count()
+            index_before = pending_index_count()
+            cursor.execute('SAVEPOINT sync_item')
+            try:
+                transaction_id = insert(conn, *values, commit=False)
+                cursor.execute('INSERT INTO sync_idempotency_keys (key, transaction_id, created_at) VALUES (?, ?, ?)',
+                               (key, transaction_id, datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')))
+            except sqlite3.Error as e:
+                # Desfaz apenas este item; os anteriores continuam no lote
+                cursor.execute('ROLLBACK TO sync_item')
+                cursor.execute('RELEASE sync_item')
+                discard_alerts(keep=alerts_before)
+                discard_index(keep=index_before)
+                logging.error(f"Erro ao gravar item do lote de sincronização {key}: {str(e)}")
+                results.append({'idempotency_key': key, 'status': 'error', 'error': 'Erro ao gravar transação'})
+                continue
+            cursor.execute('RELEASE sync_item')
+            results.append({'idempotency_key': key, 'status': 'created', 'id': transaction_id})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        discard_alerts()
+        discard_index()
+        logging.error("Erro ao gravar lote de sincronização; nenhuma transação do lote foi gravada")
+        raise
+
+    # Alertas de gastos incomuns e somas do índice de prefixos gravados pelo lote
+    flush_alerts()
+    flush_index()
+    return results
+
+def _parse_date(value, today=None):
+    """Data do item normalizada para YYYY-MM-DD (aceita também data e hora ISO), ou None se inválida"""
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    try:
+        parsed = datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00')).date()
+        except ValueError:
+            return None
+
+    today = today or date.today()
+    if parsed < MIN_SYNC_DATE or parsed > today + timedelta(days=MAX_FUTURE_DAYS):
+        return None
+    return parsed.strftime('%Y-%m-%d')
+
+def _validate_item(cursor, item):
+    """
+    Valida e normaliza um item do lote.
+
+    Returns:
+        Tupla (valores para insert_transaction, None) se válido, ou (None, mensagem de erro)
+    """
+    for field in ('date', 'description', 'amount', 'type'):
+        if item.get(field) in (None, ''):
+            return None, f"Campo obrigatório ausente: {field}"
+    if item['type'] not in TRANSACTION_SOURCES['transactions']['types']:
+        return None, "Tipo inválido (use income ou expense)"
+    if not isinstance(item['description'], str):
+        return None, "Descrição inválida"
+
+    transaction_date = _parse_date(item['date'])
+    if transaction_date is None:
+        return None, (f"Data inválida (use YYYY-MM-DD entre {MIN_SYNC_DATE.isoformat()} "
+                      f"e {MAX_FUTURE_DAYS} dias a partir de hoje)")
+
+    amount = item['amount']
+    if isinstance(amount, bool) or not isinstance(amount, (int, float, str)):
+        return None, "Valor inválido"
+    try:
+        amount = float(amount)
+    except ValueError:
+        return None, "Valor inválido"
+    if not math.isfinite(amount):
+        return None, "Valor inválido"
+
+    category_id = item.get('category_id')
+    if category_id is not None:
+        if isinstance(category_id, bool) or not isinstance(category_id, int):
+            return None, "Categoria inválida"
+        cursor.execute('SELECT 1 FROM categories WHERE id = ?', (category_id,))
+        if cursor.fetchone() is None:
+            return None, "Categoria inexistente"
+
+    return (transaction_date, item['description'], amount, item['type'], category_id), None
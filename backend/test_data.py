@@ -1,6 +1,7 @@
 import sqlite3
 from datetime import datetime, timedelta
 import random
+from db import init_db, insert_transaction
 
 # Conectar ao banco de dados
 def populate_test_data():
@@ -52,26 +53,28 @@ def populate_test_data():
         # Salário
         salary_date = date.replace(day=5)
         if salary_date < today:
-            cursor.execute(
-                'INSERT INTO transactions (date, description, amount, type, category_id) VALUES (?, ?, ?, ?, ?)',
-                (salary_date.strftime('%Y-%m-%d'), 
-                 'Salário mensal', 
-                 random.uniform(3000, 4000), 
-                 'income',
-                 next(c['id'] for c in income_categories if c['name'] == 'Salário'))
+            insert_transaction(
+                conn,
+                salary_date.strftime('%Y-%m-%d'), 
+                'Salário mensal', 
+                random.uniform(3000, 4000), 
+                'income',
+                next(c['id'] for c in income_categories if c['name'] == 'Salário'),
+                commit=False
             )
         
         # Freelances ocasionais (30% de chance por mês)
         if random.random() < 0.3:
             freelance_date = date + timedelta(days=random.randint(1, 28))
             if freelance_date < today:
-                cursor.execute(
-                    'INSERT INTO transactions (date, description, amount, type, category_id) VALUES (?, ?, ?, ?, ?)',
-                    (freelance_date.strftime('%Y-%m-%d'), 
-                     'Projeto freelance', 
-                     random.uniform(500, 1500), 
-                     'income',
-                     next(c['id'] for c in income_categories if c['name'] == 'Freelance'))
+                insert_transaction(
+                    conn,
+                    freelance_date.strftime('%Y-%m-%d'), 
+                    'Projeto freelance', 
+                    random.uniform(500, 1500), 
+                    'income',
+                    next(c['id'] for c in income_categories if c['name'] == 'Freelance'),
+                    commit=False
                 )
     
     # Gerar despesas variadas ao longo dos meses
@@ -120,9 +123,9 @@ def populate_test_data():
                 variation = random.uniform(0.9, 1.1)
                 final_amount = amount * variation
                 
-                cursor.execute(
-                    'INSERT INTO transactions (date, description, amount, type, category_id) VALUES (?, ?, ?, ?, ?)',
-                    (date.strftime('%Y-%m-%d'), description, final_amount, 'expense', category['id'])
+                insert_transaction(
+                    conn, date.strftime('%Y-%m-%d'), description, final_amount, 'expense', category['id'],
+                    commit=False
                 )
     
     # Commit e fechar conexão
@@ -131,4 +134,5 @@ def populate_test_data():
     print("Dados de teste adicionados com sucesso.")
 
 if __name__ == "__main__":
+    init_db()
     populate_test_data()
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""
+Configuração comum dos testes do backend.
+
+Cada teste recebe um banco SQLite novo, criado por init_db em um diretório
+temporário; o finance.db do repositório nunca é aberto.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Log da aplicação fora do diretório do backend
+os.environ.setdefault('LOG_FILE', os.path.join(tempfile.gettempdir(), 'financial_agent_tests.log'))
+
+# Roteiro antigo de instalação, não é um módulo de testes
+collect_ignore = ['test_api.py']
+
+@pytest.fixture(autouse=True)
+def reset_process_caches():
+    """
+    Descarta os caches do processo entre os testes: eles são chaveados pelas
+    versões dos dados, que se repetem em bancos novos de testes diferentes.
+    """
+    from analysis_cache import analysis_cache
+    from time_index import time_index
+
+    analysis_cache.clear()
+    time_index.version = None
+    yield
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Caminho de um banco novo, já inicializado, usado por db._connect durante o teste"""
+    import db
+
+    path = str(tmp_path / 'finance.db')
+    monkeypatch.setattr(db, 'DATABASE_PATH', path)
+    db.init_db()
+    return path
+
+@pytest.fixture
+def conn(db_path):
+    """Conexão com o banco do teste (fechada ao final)"""
+    import db
+
+    connection = db._connect()
+    yield connection
+    connection.close()
+
+@pytest.fixture
+def category_ids(conn):
+    """Ids das categorias padrão por (nome, tipo)"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, name, type FROM categories')
+    return {(name, type): category_id for category_id, name, type in cursor.fetchall()}
+
+@pytest.fixture
+def models_dir(tmp_path, monkeypatch):
+    """Pasta de modelos vazia do teste (os modelos do repositório nunca são alterados)"""
+    import ml_prediction
+
+    path = tmp_path / 'models'
+    monkeypatch.setattr(ml_prediction, 'MODELS_DIR', str(path))
+    return path
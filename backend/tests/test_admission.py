@@ -0,0 +1,167 @@
+"""Testes do controle de admissão das rotas caras (admission)"""
+import asyncio
+import threading
+import time
+
+import pytest
+from flask import Flask, Response
+
+import admission
+from admission import Rejected, RouteLimiter, TokenBucket, admission_control
+
+class FakeClock:
+    """Relógio controlado pelo teste (substitui o módulo time de admission)"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    perf_counter = monotonic
+
+def _limiter(concurrency=1, queue=1, queue_timeout=0.2, rate=100, burst=100):
+    return RouteLimiter('test', concurrency, queue, queue_timeout, rate, burst)
+
+def test_token_bucket_allows_burst_then_refills(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission, 'time', clock)
+    bucket = TokenBucket(rate=0.5, burst=3)
+
+    assert [bucket.take('a') for _ in range(3)] == [0, 0, 0]
+    assert bucket.take('a') == pytest.approx(2)
+    # Outro cliente tem o próprio balde
+    assert bucket.take('b') == 0
+
+    clock.now += 2
+    assert bucket.take('a') == 0
+
+def test_token_bucket_forgets_oldest_clients():
+    bucket = TokenBucket(rate=0.001, burst=1, max_clients=2)
+    for client in ('a', 'b', 'c'):
+        bucket.take(client)
+
+    # 'a' foi descartado e recomeça com o balde cheio; 'c' continua sem fichas
+    assert bucket.take('a') == 0
+    assert bucket.take('c') > 0
+
+def test_rate_limit_raises_429():
+    limiter = _limiter(rate=0.01, burst=1)
+    limiter.check_rate('cliente')
+    with pytest.raises(Rejected) as rejected:
+        limiter.check_rate('cliente')
+
+    assert rejected.value.status == 429
+    assert int(rejected.value.headers()['Retry-After']) >= 1
+    assert limiter.stats()['rate_limited'] == 1
+
+def test_full_queue_is_shed_with_503():
+    limiter = _limiter(concurrency=1, queue=0)
+    limiter.acquire()
+    with pytest.raises(Rejected) as rejected:
+        limiter.acquire()
+
+    assert rejected.value.status == 503
+    assert rejected.value.headers()['X-Queue-Depth'] == '0'
+    assert limiter.stats()['shed'] == 1
+
+def test_queue_wait_times_out():
+    limiter = _limiter(concurrency=1, queue=1, queue_timeout=0.1)
+    limiter.acquire()
+
+    start = time.monotonic()
+    with pytest.raises(Rejected) as rejected:
+        limiter.acquire()
+    assert rejected.value.status == 503
+    assert 0.1 <= time.monotonic() - start < 1
+    assert limiter.stats()['queue_depth'] == 0
+
+def test_release_admits_the_next_waiter():
+    limiter = _limiter(concurrency=1, queue=1, queue_timeout=5)
+    limiter.acquire()
+    admitted = threading.Event()
+
+    def waiter():
+        limiter.acquire()
+        admitted.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    while limiter.stats()['queue_depth'] == 0:
+        time.sleep(0.01)
+    limiter.release(0.5)
+    thread.join(2)
+
+    assert admitted.is_set()
+    stats = limiter.stats()
+    assert stats['active'] == 1 and stats['admitted'] == 2 and stats['avg_duration_ms'] == 500
+
+def test_cancelled_async_waiter_returns_its_slot():
+    limiter = _limiter(concurrency=1, queue=1, queue_timeout=5)
+    limiter.acquire()
+
+    async def cancel_while_waiting():
+        task = asyncio.ensure_future(limiter.acquire_async())
+        while limiter.stats()['queue_depth'] == 0:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # A espera continua no thread e a vaga obtida é devolvida em seguida
+        limiter.release()
+        while limiter.stats()['admitted'] < 2:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(cancel_while_waiting())
+    assert limiter.stats()['active'] == 0
+
+@pytest.fixture
+def guarded_app(monkeypatch):
+    limiter = _limiter(concurrency=1, queue=0, rate=100, burst=100)
+    monkeypatch.setitem(admission.limiters, 'test', limiter)
+    app = Flask(__name__)
+    release_stream = threading.Event()
+
+    @app.route('/ok')
+    @admission_control('test')
+    def ok():
+        return {'ok': True}
+
+    @app.route('/fail')
+    @admission_control('test')
+    def fail():
+        raise RuntimeError('falha')
+
+    @app.route('/stream')
+    @admission_control('test')
+    def stream():
+        def generate():
+            yield 'a'
+            release_stream.wait(2)
+            yield 'b'
+        return Response(generate())
+
+    return app, limiter
+
+def test_route_releases_slot_after_success_and_error(guarded_app):
+    app, limiter = guarded_app
+    client = app.test_client()
+
+    assert client.get('/ok').status_code == 200
+    assert client.get('/fail').status_code == 500
+    assert limiter.stats()['active'] == 0
+    assert client.get('/ok').status_code == 200
+
+def test_streamed_response_holds_slot_until_closed(guarded_app):
+    app, limiter = guarded_app
+    client = app.test_client()
+
+    response = client.get('/stream', buffered=False)
+    assert limiter.stats()['active'] == 1
+    rejected = client.get('/ok')
+    assert rejected.status_code == 503 and 'Retry-After' in rejected.headers
+
+    response.close()
+    assert limiter.stats()['active'] == 0
+    assert client.get('/ok').status_code == 200
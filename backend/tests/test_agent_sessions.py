@@ -0,0 +1,84 @@
+"""Testes das sessões do agente financeiro: isolamento entre clientes e conexões por thread"""
+import threading
+from collections import Counter
+
+import pytest
+
+@pytest.fixture
+def client(db_path):
+    import app as app_module
+    from finance_agent import agent_cache
+
+    agent_cache.clear()
+    yield app_module.app.test_client()
+    agent_cache.clear()
+
+def test_request_without_session_receives_a_new_one(client):
+    first = client.get('/api/finance-agent/goals')
+    second = client.get('/api/finance-agent/goals')
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers['X-Session-Id'] != second.headers['X-Session-Id']
+
+    again = client.get('/api/finance-agent/goals', headers={'X-Session-Id': first.headers['X-Session-Id']})
+    assert again.headers['X-Session-Id'] == first.headers['X-Session-Id']
+
+def test_agent_does_not_keep_the_request_connection(conn):
+    import db
+    from finance_agent import get_financial_agent
+
+    agent = get_financial_agent(conn, 'sessao-a')
+    assert not hasattr(agent, 'db_conn')
+
+    # Outra requisição da mesma sessão, em outro thread e com outra conexão
+    result = {}
+    def other_request():
+        result['goals'] = db.run_with_connection(lambda other: get_financial_agent(other, 'sessao-a')
+                                                 .get_financial_goals_progress(other))
+    thread = threading.Thread(target=other_request)
+    thread.start()
+    thread.join()
+    assert 'goals' in result
+
+def test_conversation_history_is_isolated_between_sessions(client):
+    from finance_agent import agent_cache
+
+    client.post('/api/finance-agent/chatbot', json={'message': 'Olá'}, headers={'X-Session-Id': 'ana'})
+    client.post('/api/finance-agent/chatbot', json={'message': 'Oi'}, headers={'X-Session-Id': 'ana'})
+    response = client.post('/api/finance-agent/chatbot', json={'message': 'Bom dia'})
+
+    assert response.status_code == 200
+    assert len(agent_cache.get('ana').conversation_history) == 2
+    assert len(agent_cache.get(response.headers['X-Session-Id']).conversation_history) == 1
+
+def test_concurrent_requests_without_session(db_path):
+    from werkzeug.serving import make_server
+    import app as app_module
+    import requests
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def worker():
+        with requests.Session() as http:
+            for index in range(15):
+                path = ('/api/finance-agent/savings-frontier', '/api/finance-agent/insights')[index % 2]
+                method = http.head if index % 5 == 0 else http.get
+                response = method(base_url + path)
+                with lock:
+                    statuses[response.status_code] += 1
+
+    try:
+        workers = [threading.Thread(target=worker) for _ in range(8)]
+        for worker_thread in workers:
+            worker_thread.start()
+        for worker_thread in workers:
+            worker_thread.join()
+    finally:
+        server.shutdown()
+
+    assert statuses == Counter({200: 120})
@@ -0,0 +1,144 @@
+"""Testes da entrega de alertas em tempo real (alert_stream e /api/alerts/stream)"""
+import asyncio
+import threading
+
+import pytest
+
+from alert_stream import (AlertBroker, AlertSubscription, alert_broker, defer_alert, discard_alerts,
+                          flush_alerts, get_initial_alerts, parse_last_event_id, pending_alert_count)
+
+@pytest.fixture(autouse=True)
+def clean_pending():
+    discard_alerts()
+    yield
+    discard_alerts()
+
+def _alert(alert_id, message='Alerta'):
+    return {'id': alert_id, 'type': 'info', 'message': message, 'date': '2024-01-01'}
+
+def test_subscription_delivers_in_order_and_times_out():
+    subscription = AlertSubscription()
+    subscription.push(_alert(1))
+    subscription.push(_alert(2))
+
+    alerts, overflowed = subscription.wait(timeout=1)
+    assert [alert['id'] for alert in alerts] == [1, 2] and not overflowed
+    assert subscription.wait(timeout=0.05) == ([], False)
+
+def test_slow_subscriber_is_asked_to_resync():
+    subscription = AlertSubscription(max_pending=3)
+    for alert_id in range(5):
+        subscription.push(_alert(alert_id))
+
+    alerts, overflowed = subscription.wait(timeout=1)
+    assert overflowed
+    # A fila cheia é descartada; o que chegou depois ainda é entregue
+    assert [alert['id'] for alert in alerts] == [4]
+    assert subscription.dropped == 4
+
+def test_async_subscription_receives_from_another_thread():
+    async def receive():
+        subscription = AlertSubscription(loop=asyncio.get_running_loop())
+        threading.Thread(target=subscription.push, args=(_alert(7),)).start()
+        return await subscription.wait_async(timeout=2)
+
+    alerts, overflowed = asyncio.run(receive())
+    assert [alert['id'] for alert in alerts] == [7] and not overflowed
+
+def test_broker_limits_and_cleans_up_subscribers():
+    broker = AlertBroker(max_subscribers=2)
+    first = broker.subscribe()
+    assert broker.subscribe() is not None
+    assert broker.subscribe() is None
+
+    broker.unsubscribe(first)
+    assert broker.subscribe() is not None
+
+    # Assinante cujo event loop já foi encerrado é removido na publicação
+    loop = asyncio.new_event_loop()
+    closed = AlertSubscription(loop=loop)
+    loop.close()
+    broker._subscribers.add(closed)
+    broker.publish(_alert(1))
+    assert closed not in broker._subscribers
+    assert broker.get_stats()['published'] == 1
+
+def test_deferred_alerts_are_published_only_on_flush():
+    subscription = alert_broker.subscribe()
+    try:
+        defer_alert(_alert(1))
+        assert subscription.wait(timeout=0.05) == ([], False)
+
+        flush_alerts()
+        alerts, _ = subscription.wait(timeout=1)
+        assert alerts == [{'is_read': False, **_alert(1)}]
+    finally:
+        alert_broker.unsubscribe(subscription)
+
+def test_discard_keeps_alerts_before_the_savepoint():
+    defer_alert(_alert(1))
+    kept = pending_alert_count()
+    defer_alert(_alert(2))
+
+    discard_alerts(keep=kept)
+    assert pending_alert_count() == 1
+
+def test_initial_alerts_after_last_event_id(conn):
+    conn.executemany("INSERT INTO alerts (type, message, date, is_read) VALUES ('info', ?, '2024-01-01', ?)",
+                     [('lido', 1), ('novo 1', 0), ('novo 2', 0)])
+    conn.commit()
+
+    assert [alert['message'] for alert in get_initial_alerts(conn)] == ['novo 1', 'novo 2']
+    assert [alert['message'] for alert in get_initial_alerts(conn, last_event_id=1)] == ['novo 1', 'novo 2']
+    assert get_initial_alerts(conn, last_event_id=3) == []
+
+@pytest.mark.parametrize('value, expected', [('12', 12), (' 3 ', 3), ('', None), (None, None), ('-1', None),
+                                             ('abc', None)])
+def test_parse_last_event_id(value, expected):
+    assert parse_last_event_id(value) == expected
+
+def test_stream_route_sends_initial_then_published_alerts(db_path, conn):
+    import app as app_module
+
+    conn.execute("INSERT INTO alerts (type, message, date) VALUES ('info', 'pendente', '2024-01-01')")
+    conn.commit()
+    client = app_module.app.test_client()
+
+    response = client.get('/api/alerts/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    first = next(chunks).decode()
+    assert first.startswith('id: 1\nevent: alert') and 'pendente' in first
+    assert next(chunks).decode().startswith('event: ready')
+    assert alert_broker.subscriber_count == 1
+
+    # Alerta repetido da carga inicial é ignorado; um novo é enviado
+    alert_broker.publish(_alert(1, 'pendente'))
+    alert_broker.publish(_alert(2, 'novo'))
+    event = next(chunks).decode()
+    assert event.startswith('id: 2\nevent: alert') and 'novo' in event
+
+    response.close()
+    assert alert_broker.subscriber_count == 0
+
+def test_anomalous_expense_is_published_after_commit(conn, category_ids):
+    from db import insert_transaction
+
+    food = category_ids[('Alimentação', 'expense')]
+    for day, amount in enumerate([30, 55, 42, 60, 38, 47, 52, 35, 58, 44, 41, 50], start=1):
+        insert_transaction(conn, f'2024-01-{day:02d}', 'Mercado', amount, 'expense', food)
+
+    subscription = alert_broker.subscribe()
+    try:
+        insert_transaction(conn, '2024-01-20', 'Jantar caro', 900, 'expense', food, commit=False)
+        assert subscription.wait(timeout=0.05) == ([], False)
+        conn.rollback()
+        discard_alerts()
+
+        insert_transaction(conn, '2024-01-21', 'Jantar caro', 900, 'expense', food)
+        alerts, _ = subscription.wait(timeout=1)
+        assert [alert['type'] for alert in alerts] == ['anomaly']
+        stored = conn.execute("SELECT id FROM alerts WHERE type = 'anomaly'").fetchall()
+        assert [alert['id'] for alert in alerts] == [row[0] for row in stored]
+    finally:
+        alert_broker.unsubscribe(subscription)
@@ -0,0 +1,71 @@
+"""Testes da detecção de gastos incomuns (anomaly_detector)"""
+import random
+
+import db
+from anomaly_detector import MIN_BASELINE, CategoryStats, P2Quantile, rebuild_category_stats
+from db import insert_transaction
+
+# Linha de base com alguma variação (valores dentro dela não são incomuns)
+BASELINE = [30, 55, 42, 60, 38, 47, 52, 35, 58, 44, 41, 50]
+
+def _insert_history(conn, category_id, amounts, start_day=1):
+    for day, amount in enumerate(amounts, start=start_day):
+        conn.execute("INSERT INTO transactions (date, description, amount, type, category_id) "
+                     "VALUES (?, 'Mercado', ?, 'expense', ?)", (f'2024-01-{day:02d}', amount, category_id))
+    conn.commit()
+
+def _flagged(conn):
+    return [row[0] for row in conn.execute('SELECT amount FROM transactions WHERE is_anomaly = 1 ORDER BY id')]
+
+def test_p2_quantile_tracks_the_exact_quantile():
+    rng = random.Random(7)
+    values = [rng.gauss(100, 15) for _ in range(5000)]
+    estimator = P2Quantile(0.9)
+    for value in values:
+        estimator.add(value)
+
+    exact = sorted(values)[int(0.9 * len(values))]
+    assert abs(estimator.value() - exact) < 2
+
+def test_no_anomaly_before_baseline():
+    stats = CategoryStats()
+    for _ in range(MIN_BASELINE - 1):
+        stats.add(50)
+    assert not stats.is_anomaly(5000)
+
+def test_new_expense_is_flagged_on_write(conn, category_ids):
+    food = category_ids[('Alimentação', 'expense')]
+    for day, amount in enumerate(BASELINE, start=1):
+        insert_transaction(conn, f'2024-01-{day:02d}', 'Mercado', amount, 'expense', food)
+
+    insert_transaction(conn, '2024-01-20', 'Mercado', 45, 'expense', food)
+    insert_transaction(conn, '2024-01-21', 'Jantar caro', 900, 'expense', food)
+
+    assert _flagged(conn) == [900]
+    assert conn.execute("SELECT COUNT(*) FROM alerts WHERE type = 'anomaly'").fetchone()[0] == 1
+
+def test_rebuild_backfills_historical_rows(conn, category_ids):
+    food = category_ids[('Alimentação', 'expense')]
+    # Gravadas diretamente, como antes da coluna is_anomaly existir
+    _insert_history(conn, food, BASELINE + [900, 43])
+    conn.execute('UPDATE transactions SET is_anomaly = 1 WHERE amount = 43')
+    conn.commit()
+
+    rebuild_category_stats(conn)
+
+    assert _flagged(conn) == [900]
+    # O histórico não gera alertas
+    assert conn.execute("SELECT COUNT(*) FROM alerts WHERE type = 'anomaly'").fetchone()[0] == 0
+
+def test_init_db_rebuilds_stats_from_an_older_version(db_path, conn, category_ids):
+    food = category_ids[('Alimentação', 'expense')]
+    _insert_history(conn, food, BASELINE + [900])
+    # Estatísticas gravadas por uma versão anterior (sem a remarcação do histórico)
+    conn.execute('UPDATE category_stats SET version = 1')
+    conn.commit()
+
+    db.init_db()
+
+    assert _flagged(conn) == [900]
+    versions = {row[0] for row in conn.execute('SELECT version FROM category_stats')}
+    assert versions == {2}
@@ -0,0 +1,94 @@
+"""Testes do modo ASGI (asgi.py) por um cliente ASGI: rotas nativas e app Flask no pool de threads"""
+import asyncio
+import threading
+
+import pytest
+
+httpx = pytest.importorskip('httpx')
+
+@pytest.fixture
+def asgi_module(db_path):
+    import asgi
+    from finance_agent import agent_cache
+
+    agent_cache.clear()
+    yield asgi
+    agent_cache.clear()
+
+def _request(asgi_module, method, url, **kwargs):
+    async def send():
+        transport = httpx.ASGITransport(app=asgi_module.application, client=('10.0.0.1', 4321))
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+            return await client.request(method, url, **kwargs)
+    return asyncio.run(send())
+
+def test_flask_routes_receive_body_and_query_string(asgi_module):
+    items = [{'idempotency_key': f'k{i}', 'date': '2024-05-10', 'description': f'Compra {i}', 'amount': 10 + i,
+              'type': 'expense'} for i in range(3)]
+    created = _request(asgi_module, 'POST', '/api/sync/transactions', json={'transactions': items})
+    assert created.status_code == 200
+    assert [result['status'] for result in created.json()['results']] == ['created'] * 3
+
+    page = _request(asgi_module, 'GET', '/api/sync?since=0&limit=2')
+    assert page.status_code == 200
+    assert page.json()['has_more'] is True
+    assert len(page.json()['changes']['transactions']['inserted']) == 2
+
+    assert _request(asgi_module, 'GET', '/api/sync?since=abc').status_code == 400
+
+def test_flask_routes_run_on_the_wsgi_pool(asgi_module, monkeypatch):
+    from flask import jsonify, request
+
+    seen = {}
+
+    def record():
+        seen['thread'] = threading.current_thread().name
+        seen['remote_addr'] = request.remote_addr
+        seen['header'] = request.headers.get('X-Custom')
+        return jsonify({"ok": True})
+    monkeypatch.setitem(asgi_module.app.view_functions, 'cache_stats', record)
+
+    response = _request(asgi_module, 'GET', '/api/cache/stats', headers={'X-Custom': 'valor'})
+    assert response.json() == {"ok": True}
+    assert seen['thread'].startswith('wsgi')
+    assert seen['remote_addr'] == '10.0.0.1'
+    assert seen['header'] == 'valor'
+
+def test_flask_streamed_response_is_forwarded_and_closed(asgi_module, monkeypatch):
+    from flask import Response
+
+    closed = []
+
+    def chunks():
+        try:
+            yield 'a'
+            yield ''
+            yield 'b'
+        finally:
+            closed.append(True)
+    monkeypatch.setitem(asgi_module.app.view_functions, 'cache_stats',
+                        lambda: Response(chunks(), mimetype='text/plain', status=202))
+
+    response = _request(asgi_module, 'GET', '/api/cache/stats')
+    assert response.status_code == 202
+    assert response.text == 'ab'
+    assert closed == [True]
+
+def test_native_chatbot_errors_return_the_session(asgi_module, monkeypatch):
+    for path in ('/api/finance-agent/chatbot', '/api/finance-agent/chatbot/stream'):
+        missing = _request(asgi_module, 'POST', path, json={}, headers={'X-Session-Id': 'sessao-a'})
+        assert missing.status_code == 400
+        assert missing.headers['X-Session-Id'] == 'sessao-a'
+
+        # Sem sessão informada, o cliente recebe uma nova mesmo na resposta de erro
+        assert _request(asgi_module, 'POST', path, json={}).headers['X-Session-Id']
+
+    def fail(*args):
+        raise RuntimeError('falha ao carregar o agente')
+    monkeypatch.setattr(asgi_module, 'get_financial_agent', fail)
+
+    failed = _request(asgi_module, 'POST', '/api/finance-agent/chatbot', json={'message': 'Olá'},
+                      headers={'X-Session-Id': 'sessao-b'})
+    assert failed.status_code == 500
+    assert failed.json()['response'] == asgi_module.CHAT_ERROR_MESSAGE
+    assert failed.headers['X-Session-Id'] == 'sessao-b'
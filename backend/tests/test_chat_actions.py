@@ -0,0 +1,113 @@
+"""Testes das análises disparadas pelo chat (chat_actions): prazo e liberação do executor"""
+import asyncio
+import threading
+import time
+from concurrent.futures import wait
+
+import pytest
+
+import chat_actions
+from chat_actions import (CHAT_ACTION_WORKERS, await_chat_actions, collect_chat_actions, respond_with_actions,
+                          submit_chat_actions)
+from db import run_with_deadline
+
+# Consulta que leva muitos segundos se não for interrompida
+SLOW_QUERY = '''
+    WITH RECURSIVE counter(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM counter WHERE n < 1000000000)
+    SELECT COUNT(*) FROM counter
+'''
+
+class SlowAgent:
+    """Agente cujas análises ficam presas em uma consulta longa"""
+
+    def suggest_expense_cuts(self, conn):
+        return conn.execute(SLOW_QUERY).fetchone()[0]
+
+    def get_investment_recommendation(self, conn):
+        return conn.execute(SLOW_QUERY).fetchone()[0]
+
+class QuickAgent:
+    def suggest_expense_cuts(self, conn):
+        return {'savings_target': conn.execute('SELECT 100').fetchone()[0]}
+
+def _route(*triggers):
+    return {'triggers': triggers, 'name': None}
+
+def test_deadline_interrupts_the_query(db_path):
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        run_with_deadline(start + 0.2, lambda conn: conn.execute(SLOW_QUERY).fetchone())
+    assert time.monotonic() - start < 2
+
+def test_expired_job_does_not_run(db_path):
+    calls = []
+    with pytest.raises(TimeoutError):
+        run_with_deadline(time.monotonic() - 1, calls.append)
+    assert calls == []
+
+def test_other_database_errors_are_not_timeouts(db_path):
+    with pytest.raises(Exception) as error:
+        run_with_deadline(time.monotonic() + 5, lambda conn: conn.execute('SELECT * FROM missing_table'))
+    assert not isinstance(error.value, TimeoutError)
+
+def test_timed_out_actions_free_the_executor(db_path, monkeypatch):
+    monkeypatch.setattr(chat_actions, 'ACTION_TIMEOUT_SECONDS', 0.3)
+
+    # Ocupa todos os threads do executor com análises que não terminariam
+    slow_jobs = []
+    for _ in range(CHAT_ACTION_WORKERS // 2):
+        slow_jobs.extend(submit_chat_actions(SlowAgent(), _route('savings', 'investment')))
+    actions, partial = collect_chat_actions(SlowAgent(), _route(), slow_jobs, timeout=0.3)
+    assert actions == [] and partial
+
+    # Após o prazo os threads voltam ao executor e a próxima mensagem é atendida
+    start = time.monotonic()
+    jobs = submit_chat_actions(QuickAgent(), _route('savings'))
+    actions, partial = collect_chat_actions(QuickAgent(), _route(), jobs, timeout=5)
+    assert actions == [{'type': 'savings_recommendation', 'data': {'savings_target': 100}}]
+    assert not partial
+    assert time.monotonic() - start < 2
+    # As análises expiradas terminaram (interrompidas) em vez de seguir ocupando threads
+    done, running = wait([future for _, future, _ in slow_jobs], timeout=1)
+    assert not running
+    assert all(isinstance(future.exception(), TimeoutError) for future in done)
+
+def test_executor_covers_the_chatbot_admission_limit():
+    from admission import ADMISSION_LIMITS
+
+    assert CHAT_ACTION_WORKERS >= 2 * ADMISSION_LIMITS['chatbot']['concurrency']
+
+class NamingAgent:
+    """Agente que registra o thread em que o nome foi gravado"""
+
+    def __init__(self):
+        self.saved = []
+
+    async def get_ai_response(self, message):
+        return 'Olá!'
+
+    def save_preference(self, conn, key, value):
+        self.saved.append((key, value, threading.current_thread()))
+
+def test_async_paths_save_the_name_off_the_event_loop(db_path):
+    route = {'triggers': (), 'name': 'Ana'}
+    expected = [{'type': 'user_name_updated', 'data': {'name': 'Ana'}}]
+
+    async def respond(agent):
+        loop_thread = threading.current_thread()
+        result = await respond_with_actions(agent, 'Meu nome é Ana', route)
+        return result, loop_thread
+
+    agent = NamingAgent()
+    (response, actions, partial), loop_thread = asyncio.run(respond(agent))
+    assert (response, actions, partial) == ('Olá!', expected, False)
+    assert [(key, value) for key, value, _ in agent.saved] == [('user_name', 'Ana')]
+    assert agent.saved[0][2] is not loop_thread
+
+    async def await_actions(agent):
+        return await await_chat_actions(agent, route, []), threading.current_thread()
+
+    agent = NamingAgent()
+    (actions, partial), loop_thread = asyncio.run(await_actions(agent))
+    assert (actions, partial) == (expected, False)
+    assert agent.saved[0][2] is not loop_thread
@@ -0,0 +1,30 @@
+"""Testes do painel (dashboard): previsões apenas por inferência"""
+import ml_prediction
+from dashboard import build_dashboard
+from db import insert_transaction
+
+def _insert_monthly_expenses(conn, category_ids, months=6):
+    category_id = category_ids[('Alimentação', 'expense')]
+    for month in range(1, months + 1):
+        insert_transaction(conn, f'2024-{month:02d}-10', 'Mercado', 100 + 10 * month, 'expense', category_id,
+                           commit=False)
+    conn.commit()
+
+def test_dashboard_never_trains_models(conn, category_ids, models_dir, monkeypatch):
+    _insert_monthly_expenses(conn, category_ids)
+
+    def fail_training(*args, **kwargs):
+        raise AssertionError('treinamento inesperado no painel')
+    monkeypatch.setattr(ml_prediction, 'train_prediction_models', fail_training)
+
+    assert build_dashboard(conn, fields=['predictions']) == {'predictions': None}
+    assert not models_dir.exists()
+
+def test_dashboard_uses_trained_models(conn, category_ids, models_dir):
+    _insert_monthly_expenses(conn, category_ids)
+    assert ml_prediction.train_prediction_models(conn, force_retrain=True) > 0
+
+    predictions = build_dashboard(conn, fields=['predictions'])['predictions']
+    assert predictions['method'] == 'ml_model'
+    assert predictions['prediction_date'] == '2024-07'
+    assert set(predictions['category_predictions']) == {'Alimentação'}
@@ -0,0 +1,61 @@
+"""Testes do snapshot financeiro mantido na escrita (financial_snapshot)"""
+from datetime import datetime
+
+from db import insert_transaction
+from financial_snapshot import get_financial_snapshot
+
+def _today():
+    return datetime.now().strftime('%Y-%m-%d')
+
+def _stored_month(conn):
+    return conn.execute('SELECT month FROM financial_snapshot').fetchone()[0]
+
+def test_init_db_persists_the_snapshot(conn):
+    assert _stored_month(conn) == datetime.now().strftime('%Y-%m')
+
+def test_insert_transaction_updates_the_stored_snapshot(conn, category_ids):
+    food = category_ids[('Alimentação', 'expense')]
+    insert_transaction(conn, _today(), 'Salário', 3000, 'income', category_ids[('Salário', 'income')])
+    insert_transaction(conn, _today(), 'Mercado', 200, 'expense', food)
+
+    changes = conn.total_changes
+    snapshot = get_financial_snapshot(conn)
+    assert conn.total_changes == changes
+    assert snapshot['total_income'] == 3000
+    assert snapshot['total_expense'] == 200
+    assert snapshot['top_categories'] == [{'category': 'Alimentação', 'amount': 200}]
+
+def test_stale_snapshot_is_computed_without_writing(conn, category_ids):
+    food = category_ids[('Alimentação', 'expense')]
+    # Escritas fora de insert_transaction deixam o snapshot gravado desatualizado
+    conn.execute("INSERT INTO transactions (date, description, amount, type, category_id) "
+                 "VALUES (?, 'Mercado', 80, 'expense', ?)", (_today(), food))
+    conn.execute("INSERT INTO category_limits (category_id, limit_amount, period) VALUES (?, 100, 'monthly')",
+                 (food,))
+    conn.commit()
+
+    changes = conn.total_changes
+    for _ in range(3):
+        snapshot = get_financial_snapshot(conn)
+    assert conn.total_changes == changes
+    assert not conn.in_transaction
+    assert snapshot['total_expense'] == 80
+    assert snapshot['limit_status'][0]['percentage'] == 80
+
+    # A próxima escrita grava o snapshot recalculado (já com a nova transação)
+    insert_transaction(conn, _today(), 'Padaria', 30, 'expense', food)
+    conn.commit()
+    changes = conn.total_changes
+    snapshot = get_financial_snapshot(conn)
+    assert conn.total_changes == changes
+    assert snapshot['total_expense'] == 110
+    assert snapshot['limit_status'][0]['exceeded'] is True
+
+def test_month_rollover_is_computed_on_read(conn):
+    conn.execute("UPDATE financial_snapshot SET month = '2000-01'")
+    conn.commit()
+
+    changes = conn.total_changes
+    assert get_financial_snapshot(conn)['month'] == datetime.now().strftime('%Y-%m')
+    assert conn.total_changes == changes
+    assert _stored_month(conn) == '2000-01'
@@ -0,0 +1,102 @@
+"""Testes das respostas condicionais (http_cache): ETag, Last-Modified e 304"""
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+import http_cache
+from http_cache import conditional_get, get_validators
+
+@pytest.fixture
+def guarded_app(conn, monkeypatch):
+    monkeypatch.setattr(http_cache, 'get_db_connection', lambda: conn)
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/goals')
+    @conditional_get('savings_goals')
+    def goals():
+        calls.append('goals')
+        return {'count': conn.execute('SELECT COUNT(*) FROM savings_goals').fetchone()[0]}
+
+    @app.route('/broken')
+    @conditional_get('savings_goals')
+    def broken():
+        return {'error': 'falha'}, 500
+
+    return app.test_client(), calls
+
+def _add_goal(conn, name='Viagem'):
+    conn.execute("INSERT INTO savings_goals (name, target_amount, created_at) VALUES (?, 1000, ?)",
+                 (name, datetime.now().isoformat()))
+    conn.commit()
+
+def test_response_carries_validators(guarded_app):
+    client, _ = guarded_app
+    response = client.get('/goals')
+
+    assert response.status_code == 200
+    assert response.headers['ETag'].startswith('W/"')
+    assert 'Last-Modified' in response.headers
+    assert 'no-cache' in response.headers['Cache-Control']
+
+def test_matching_etag_returns_304_without_running_the_view(guarded_app):
+    client, calls = guarded_app
+    etag = client.get('/goals').headers['ETag']
+
+    cached = client.get('/goals', headers={'If-None-Match': etag})
+
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert cached.headers['ETag'] == etag
+    assert calls == ['goals']
+
+def test_write_to_a_scope_changes_the_etag(guarded_app, conn):
+    client, _ = guarded_app
+    etag = client.get('/goals').headers['ETag']
+
+    _add_goal(conn)
+    fresh = client.get('/goals', headers={'If-None-Match': etag})
+
+    assert fresh.status_code == 200
+    assert fresh.json == {'count': 1}
+    assert fresh.headers['ETag'] != etag
+
+def test_write_to_other_tables_keeps_the_etag(guarded_app, conn):
+    client, _ = guarded_app
+    etag = client.get('/goals').headers['ETag']
+
+    conn.execute("INSERT INTO alerts (type, message, date) VALUES ('info', 'Olá', '2024-01-01')")
+    conn.commit()
+
+    assert client.get('/goals', headers={'If-None-Match': etag}).status_code == 304
+
+def test_error_responses_are_not_validated(guarded_app):
+    client, _ = guarded_app
+    response = client.get('/broken')
+
+    assert response.status_code == 500
+    assert 'ETag' not in response.headers
+
+def test_validators_depend_on_route_and_period(conn):
+    goals, _ = get_validators(conn, 'goals', ('savings_goals',))
+    other, _ = get_validators(conn, 'other', ('savings_goals',))
+    daily, modified = get_validators(conn, 'goals', ('savings_goals',), period='day')
+
+    assert len({goals, other, daily}) == 3
+    # Respostas que dependem da data não são mais antigas que o início do dia
+    assert modified.astimezone().date() == datetime.now().astimezone().date()
+
+def test_route_without_data_versions_still_responds(conn, monkeypatch):
+    conn.execute('DROP TABLE data_versions')
+    monkeypatch.setattr(http_cache, 'get_db_connection', lambda: conn)
+    app = Flask(__name__)
+
+    @app.route('/plain')
+    @conditional_get('savings_goals')
+    def plain():
+        return {'ok': True}
+
+    response = app.test_client().get('/plain')
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
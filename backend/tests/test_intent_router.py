@@ -0,0 +1,72 @@
+"""Testes do roteador de mensagens compilado (intent_router) contra as varreduras anteriores"""
+from itertools import permutations
+
+import pytest
+
+from intent_router import (ACTION_KEYWORDS, ACTION_TRIGGERS, FALLBACK_KEYWORDS, QUESTION_WORDS,
+                           SENTIMENT_KEYWORDS, TOPIC_KEYWORDS, _route_by_scanning, route_message)
+
+# Todas as palavras-chave das tabelas anteriores
+KEYWORDS = sorted(set(QUESTION_WORDS) | set(ACTION_KEYWORDS) | set(TOPIC_KEYWORDS)
+                  | set(FALLBACK_KEYWORDS) | set(ACTION_TRIGGERS)
+                  | {word for words in SENTIMENT_KEYWORDS.values() for word in words})
+
+def _intent(result):
+    """Campos comparáveis: os tópicos são comparados como conjunto (a ordem difere, ver abaixo)"""
+    return {
+        'is_question': result['is_question'],
+        'action': result['action'],
+        'sentiment': result['sentiment'],
+        'topics': set(result['topics']),
+        'fallback_keyword': result['fallback_keyword'],
+        'triggers': set(result['triggers'])
+    }
+
+def _assert_same_intent(message):
+    assert _intent(route_message.__wrapped__(message)) == _intent(_route_by_scanning(message)), message
+
+@pytest.mark.parametrize('keyword', KEYWORDS)
+def test_single_keyword_matches_scanning(keyword):
+    _assert_same_intent(keyword)
+    _assert_same_intent(f"Olá, {keyword.capitalize()} hoje?")
+    _assert_same_intent(f"{keyword}s e mais")
+
+def test_keyword_pairs_match_scanning():
+    for first, second in permutations(KEYWORDS, 2):
+        _assert_same_intent(f"{first} e {second}")
+
+@pytest.mark.parametrize('message', [
+    "Como posso economizar mais este mês?",
+    "Quero investir em ações, qual o melhor investimento?",
+    "Mostrar meus gastos com alimentação do último mês",
+    "Não entendo como funciona o orçamento 50-30-20",
+    "Estou feliz, consegui guardar dinheiro para a minha meta!",
+    "Estou preocupado com a dívida do cartão, preciso de ajuda",
+    "Olá",
+    ""
+])
+def test_sentences_match_scanning(message):
+    _assert_same_intent(message)
+
+def test_topics_follow_order_of_appearance():
+    # As varreduras listavam os tópicos na ordem da tabela (e repetiam "despesa"/"gasto")
+    assert route_message("despesa e orçamento")['topics'] == ('análise de gastos', 'orçamento pessoal')
+    assert _route_by_scanning("despesa e orçamento")['topics'] == ['orçamento pessoal', 'análise de gastos']
+    assert route_message("gasto e despesa")['topics'] == ('análise de gastos',)
+
+def test_keywords_only_match_at_word_start():
+    # Diferença intencional: as varreduras casavam também no meio das palavras
+    assert _route_by_scanning("Quero reinvestir")['topics'] == ['investimentos']
+    assert route_message("Quero reinvestir")['topics'] == ()
+    assert route_message("Quero investir")['topics'] == ('investimentos',)
+
+@pytest.mark.parametrize('message, name', [
+    ("Meu nome é ana", "Ana"),
+    ("Oi, me chamo Bruno.", "Bruno"),
+    ("pode me chamar de carla!", "Carla"),
+    ("Sou a Duda e me chamo Eduarda", "Duda"),
+    ("Meu nome é x", None),
+    ("Como economizar?", None)
+])
+def test_name_extraction(message, name):
+    assert route_message(message)['name'] == name
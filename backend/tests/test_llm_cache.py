@@ -0,0 +1,90 @@
+"""Testes do cache de respostas do modelo (llm_cache) com um modelo local de teste"""
+import asyncio
+
+import pytest
+
+from finance_agent import agent_cache, get_financial_agent
+from llm_cache import llm_cache
+
+class StubModel:
+    """Modelo local: responde com o número da chamada e registra os prompts recebidos"""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def generate_content_async(self, prompt, stream=False):
+        self.prompts.append(prompt)
+        text = f"resposta {len(self.prompts)}"
+        if not stream:
+            return _Result(text)
+        return _stream([_Result(word + ' ') for word in text.split()])
+
+class _Result:
+    def __init__(self, text):
+        self.text = text
+
+async def _stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+@pytest.fixture
+def model(db_path):
+    agent_cache.clear()
+    llm_cache._pending_hits.clear()
+    llm_cache._pending_since = None
+    yield StubModel()
+    agent_cache.clear()
+
+def _ask(conn, model, session_id, message):
+    agent = get_financial_agent(conn, session_id)
+    agent.model = model
+    return asyncio.run(agent.get_ai_response(message))
+
+def test_opening_question_is_shared_between_sessions(conn, model):
+    first = _ask(conn, model, 'a', 'Como posso economizar mais este mês?')
+    second = _ask(conn, model, 'b', 'como posso economizar mais este mes')
+
+    assert first == second
+    assert len(model.prompts) == 1
+
+def test_follow_up_does_not_reuse_another_conversation(conn, model):
+    _ask(conn, model, 'a', 'Quero investir')
+    _ask(conn, model, 'b', 'Quero quitar dívidas')
+    calls = len(model.prompts)
+
+    # A mesma continuação depois de conversas diferentes não compartilha a resposta
+    answer_a = _ask(conn, model, 'a', 'E quanto devo guardar?')
+    answer_b = _ask(conn, model, 'b', 'E quanto devo guardar?')
+
+    assert len(model.prompts) == calls + 2
+    assert answer_a != answer_b
+    assert 'Quero quitar dívidas' in model.prompts[-1]
+
+def test_streamed_response_is_cached(conn, model):
+    agent = get_financial_agent(conn, 'a')
+    agent.model = model
+
+    async def collect():
+        return ''.join([text async for text in agent.stream_ai_response('Dicas para investimentos iniciantes')])
+
+    streamed = asyncio.run(collect())
+    cached = _ask(conn, model, 'b', 'Dicas para investimentos iniciantes')
+
+    assert cached == streamed.strip()
+    assert len(model.prompts) == 1
+
+def test_cache_hit_does_not_write(conn, model):
+    context = {'financial': {}, 'history': None}
+    llm_cache.put(conn, 'pergunta', context, 'resposta')
+
+    changes = conn.total_changes
+    for _ in range(5):
+        assert llm_cache.get(conn, 'pergunta', context) == 'resposta'
+    assert conn.total_changes == changes
+    assert conn.execute('SELECT hits FROM llm_response_cache').fetchone()[0] == 0
+    assert llm_cache.stats(conn)['total_hits'] == 5
+
+    # Os acertos pendentes são gravados junto com a próxima resposta nova
+    llm_cache.put(conn, 'outra pergunta', context, 'outra resposta')
+    hits = dict(conn.execute('SELECT normalized_message, hits FROM llm_response_cache').fetchall())
+    assert hits == {'pergunta': 5, 'outra pergunta': 0}
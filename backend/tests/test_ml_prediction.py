@@ -0,0 +1,42 @@
+"""Testes das previsões (ml_prediction): valores inválidos do modelo viram 0 na origem"""
+import numpy as np
+
+import ml_prediction
+from db import insert_transaction
+from serialization import dumps, loads
+
+class _InfiniteModel:
+    """Modelo e scaler falsos: a previsão é infinita"""
+    def transform(self, X):
+        return X
+
+    def predict(self, X):
+        return np.array([np.inf])
+
+def _use_infinite_model(conn, category_ids, models_dir, monkeypatch):
+    category_id = category_ids[('Alimentação', 'expense')]
+    for month in range(1, 7):
+        insert_transaction(conn, f'2024-{month:02d}-10', 'Mercado', 100 + 10 * month, 'expense', category_id,
+                           commit=False)
+    conn.commit()
+
+    models_dir.mkdir()
+    (models_dir / 'Alimentação_model.joblib').touch()
+    (models_dir / 'Alimentação_scaler.joblib').touch()
+    monkeypatch.setattr(ml_prediction.joblib, 'load', lambda path: _InfiniteModel())
+
+def test_non_finite_category_prediction_becomes_zero(conn, category_ids, models_dir, monkeypatch):
+    _use_infinite_model(conn, category_ids, models_dir, monkeypatch)
+
+    predictions = ml_prediction.predict_next_month_expenses(conn)
+    assert predictions['method'] == 'ml_model'
+    assert predictions['category_predictions'] == {'Alimentação': 0}
+    # Serializado como 0, não como null
+    assert loads(dumps(predictions))['category_predictions'] == {'Alimentação': 0}
+
+def test_non_finite_prediction_row_becomes_zero(conn, category_ids, models_dir, monkeypatch):
+    _use_infinite_model(conn, category_ids, models_dir, monkeypatch)
+
+    comparison = ml_prediction.get_historical_vs_predicted_data(conn)
+    assert comparison['prediction']['total_expense'] == 0
+    assert comparison['prediction']['is_prediction'] is True
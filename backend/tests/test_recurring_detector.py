@@ -0,0 +1,88 @@
+"""Testes da detecção de séries recorrentes e da previsão de fluxo de caixa (recurring_detector)"""
+from datetime import datetime, timedelta
+
+import db
+from db import insert_transaction
+from recurring_detector import (MAX_FORECAST_DAYS, _group_rows, detect_periodicity, get_recurring_series,
+                                get_upcoming_recurring, rebuild_recurring_series)
+
+def _monthly(start, count):
+    return [(datetime(2024, 1, 15) + timedelta(days=30 * index)).strftime('%Y-%m-%d')
+            for index in range(start, start + count)]
+
+def test_detect_periodicity():
+    dates = [datetime(2024, 1, 1) + timedelta(days=7 * index) for index in range(6)]
+    assert detect_periodicity(dates)[0] == 'weekly'
+    assert detect_periodicity(dates[:2]) is None
+    assert detect_periodicity([datetime(2024, 1, 1), datetime(2024, 1, 9), datetime(2024, 3, 1)]) is None
+
+def test_close_amounts_across_a_band_edge_share_a_series():
+    # 95,00 e 95,80 ficavam em faixas logarítmicas diferentes
+    rows = [('netflix', 'expense', date, amount, 1, 'Netflix')
+            for date, amount in zip(_monthly(0, 4), [95.0, 95.8, 95.0, 95.8])]
+    groups = _group_rows(rows)
+
+    assert len(groups) == 1
+    assert [row[0] for row in next(iter(groups.values()))] == _monthly(0, 4)
+
+def test_distant_amounts_are_separate_series():
+    rows = [('loja', 'expense', date, amount, 0, 'Loja')
+            for date, amount in zip(_monthly(0, 6), [50, 200, 51, 205, 52, 210])]
+
+    assert sorted(len(group) for group in _group_rows(rows).values()) == [3, 3]
+
+def test_incremental_update_follows_the_amount_groups(conn):
+    for date, amount in zip(_monthly(0, 3), [95.0, 95.8, 95.0]):
+        insert_transaction(conn, date, 'Netflix', amount, 'expense')
+    insert_transaction(conn, _monthly(3, 1)[0], 'Netflix', 95.8, 'expense')
+    conn.commit()
+
+    series = get_recurring_series(conn)
+    assert len(series) == 1
+    assert series[0]['occurrences'] == 4
+    assert series[0]['period'] == 'monthly'
+
+    # O resultado incremental é o mesmo da reconstrução completa
+    rebuild_recurring_series(conn)
+    rebuilt = get_recurring_series(conn)
+    assert [(row['amount_band'], row['occurrences']) for row in rebuilt] == \
+        [(row['amount_band'], row['occurrences']) for row in series]
+
+def test_unparseable_dates_are_skipped(db_path, conn):
+    for date in _monthly(0, 4) + ['15/05/2024', '']:
+        conn.execute("INSERT INTO transactions (date, description, amount, type, merchant_key) "
+                     "VALUES (?, 'Spotify', 19.9, 'expense', 'spotify')", (date,))
+    conn.execute('DELETE FROM recurring_series')
+    conn.commit()
+
+    # init_db reconstrói as séries na inicialização e não pode falhar
+    db.init_db()
+
+    series = get_recurring_series(conn)
+    assert [(row['merchant_key'], row['occurrences']) for row in series] == [('spotify', 4)]
+
+def test_upcoming_projection(conn):
+    for date in _monthly(0, 4):
+        insert_transaction(conn, date, 'Netflix', 39.9, 'expense')
+    conn.commit()
+
+    start = datetime.strptime(_monthly(4, 1)[0], '%Y-%m-%d') - timedelta(days=1)
+    forecast = get_upcoming_recurring(conn, days=60, start_date=start)
+
+    assert [item['date'] for item in forecast['occurrences']] == _monthly(4, 2)
+    assert forecast['expected_expenses'] == 39.9 * 2
+
+def test_upcoming_route_clamps_days(db_path):
+    import app as app_module
+
+    client = app_module.app.test_client()
+    far = client.get('/api/recurring/upcoming?days=100000000')
+    assert far.status_code == 200
+    start, end = (datetime.strptime(far.json[key], '%Y-%m-%d') for key in ('start_date', 'end_date'))
+    assert (end - start).days == MAX_FORECAST_DAYS
+
+    negative = client.get('/api/recurring/upcoming?days=-5')
+    assert negative.status_code == 200
+    assert negative.json['start_date'] != negative.json['end_date']
+
+    assert client.get('/api/recurring/upcoming?days=abc').status_code == 400
@@ -0,0 +1,115 @@
+"""Testes do feed de sincronização e do lote idempotente de transações (sync_feed)"""
+from datetime import date, timedelta
+
+import pytest
+
+from db import insert_transaction
+from sync_feed import apply_transaction_batch, get_changes, get_sync_token, parse_sync_token
+
+def _item(key, **fields):
+    item = {'idempotency_key': key, 'date': '2024-03-10', 'description': 'Mercado', 'amount': 120.5,
+            'type': 'expense'}
+    item.update(fields)
+    return item
+
+def _count_transactions(conn):
+    return conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+def test_batch_is_idempotent(conn):
+    first = apply_transaction_batch(conn, [_item('a'), _item('b')], insert_transaction)
+    again = apply_transaction_batch(conn, [_item('a'), _item('b')], insert_transaction)
+
+    assert [result['status'] for result in first] == ['created', 'created']
+    assert [result['status'] for result in again] == ['duplicate', 'duplicate']
+    assert [result['id'] for result in again] == [result['id'] for result in first]
+    assert _count_transactions(conn) == 2
+
+@pytest.mark.parametrize('amount', ['nan', float('nan'), 'inf', float('-inf'), True, [1]])
+def test_non_finite_amount_is_rejected_without_aborting_the_batch(conn, amount):
+    results = apply_transaction_batch(conn, [_item('ok-1'), _item('bad', amount=amount), _item('ok-2')],
+                                      insert_transaction)
+
+    assert [result['status'] for result in results] == ['created', 'error', 'created']
+    assert _count_transactions(conn) == 2
+
+    # Reenvio do mesmo lote: os válidos são duplicados, o inválido continua com erro (sem 500)
+    retry = apply_transaction_batch(conn, [_item('ok-1'), _item('bad', amount=amount), _item('ok-2')],
+                                    insert_transaction)
+    assert [result['status'] for result in retry] == ['duplicate', 'error', 'duplicate']
+
+@pytest.mark.parametrize('value', ['2024-01-01junk', '2024-02-30', '1850-01-01', '9999-12-31', 20240101, ''])
+def test_invalid_or_out_of_range_date_is_rejected(conn, value):
+    results = apply_transaction_batch(conn, [_item('d', date=value)], insert_transaction)
+
+    assert results[0]['status'] == 'error'
+    assert _count_transactions(conn) == 0
+
+def test_date_is_normalised(conn):
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    results = apply_transaction_batch(conn, [_item('iso', date='2024-03-10T14:30:00Z'),
+                                             _item('next', date=tomorrow)], insert_transaction)
+
+    stored = dict(conn.execute('SELECT id, date FROM transactions').fetchall())
+    assert stored[results[0]['id']] == '2024-03-10'
+    assert stored[results[1]['id']] == tomorrow
+
+def test_unknown_category_is_rejected(conn, category_ids):
+    existing = category_ids[('Alimentação', 'expense')]
+    results = apply_transaction_batch(conn, [_item('known', category_id=existing),
+                                             _item('unknown', category_id=99999)], insert_transaction)
+
+    assert [result['status'] for result in results] == ['created', 'error']
+
+def test_database_error_only_fails_its_item(conn):
+    def insert(conn, date, description, amount, type, category_id=None, commit=True):
+        # Simula uma falha do banco (NOT NULL) no segundo item
+        if description == 'falha':
+            description = None
+        return insert_transaction(conn, date, description, amount, type, category_id, commit=commit)
+
+    results = apply_transaction_batch(conn, [_item('a'), _item('b', description='falha'), _item('c')], insert)
+
+    assert [result['status'] for result in results] == ['created', 'error', 'created']
+    assert _count_transactions(conn) == 2
+    keys = {row[0] for row in conn.execute('SELECT key FROM sync_idempotency_keys')}
+    assert keys == {'a', 'c'}
+
+def test_changes_feed_reports_inserts_updates_and_deletes(conn):
+    token = get_sync_token(conn)
+    created = apply_transaction_batch(conn, [_item('a'), _item('b')], insert_transaction)
+    first_id, second_id = (result['id'] for result in created)
+
+    page = get_changes(conn, token)
+    inserted = {row['id'] for row in page['changes']['transactions']['inserted']}
+    assert inserted == {first_id, second_id}
+
+    conn.execute('UPDATE transactions SET amount = 99 WHERE id = ?', (first_id,))
+    conn.execute('DELETE FROM transactions WHERE id = ?', (second_id,))
+    conn.commit()
+
+    page = get_changes(conn, page['sync_token'])
+    group = page['changes']['transactions']
+    assert [row['id'] for row in group['updated']] == [first_id]
+    assert group['updated'][0]['amount'] == 99
+    assert group['deleted'] == [second_id]
+    assert page['has_more'] is False
+
+def test_changes_feed_pages(conn):
+    token = get_sync_token(conn)
+    apply_transaction_batch(conn, [_item(str(index)) for index in range(5)], insert_transaction)
+
+    seen = []
+    while True:
+        page = get_changes(conn, token, limit=2)
+        seen.extend(row['id'] for row in page['changes'].get('transactions', {}).get('inserted', []))
+        token = page['sync_token']
+        if not page['has_more']:
+            break
+
+    assert len(seen) == 5 == len(set(seen))
+
+def test_invalid_sync_token():
+    assert parse_sync_token(None) == 0
+    assert parse_sync_token('42') == 42
+    with pytest.raises(ValueError):
+        parse_sync_token('-1')
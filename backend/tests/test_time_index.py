@@ -0,0 +1,160 @@
+"""Testes do índice de somas acumuladas por categoria (time_index) e do seu uso em budget_analyzer"""
+import random
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+from budget_analyzer import _CATEGORY_MONTHLY_STATS_QUERY, _category_monthly_stats, get_expense_analysis
+from db import insert_transaction
+from sync_feed import apply_transaction_batch
+from time_index import (CategoryPrefixIndex, get_index_version, get_rolling_comparison, get_time_index,
+                        get_window_summary, time_index)
+
+def _insert_random_expenses(conn, category_ids, count=300, seed=7):
+    rng = random.Random(seed)
+    expense_categories = [category_id for (name, type), category_id in category_ids.items() if type == 'expense']
+    today = date.today()
+    for _ in range(count):
+        day = today - timedelta(days=rng.randint(0, 400))
+        insert_transaction(conn, day.isoformat(), 'Compra', round(rng.uniform(5, 500), 2), 'expense',
+                           rng.choice(expense_categories + [None]), commit=False)
+    conn.commit()
+
+def _sql_window(conn, start, end):
+    rows = conn.execute('''
+        SELECT c.name, SUM(t.amount), COUNT(*)
+        FROM transactions t LEFT JOIN categories c ON c.id = t.category_id
+        WHERE t.type = 'expense' AND t.date >= ? AND t.date < ?
+        GROUP BY c.name
+    ''', (start, end)).fetchall()
+    return {name or 'Sem categoria': (total, count) for name, total, count in rows}
+
+def test_window_matches_sql(conn, category_ids):
+    _insert_random_expenses(conn, category_ids)
+    today = date.today()
+
+    for days_back, length in ((400, 400), (90, 30), (30, 31), (1, 1)):
+        start = (today - timedelta(days=days_back)).isoformat()
+        end = (today - timedelta(days=days_back) + timedelta(days=length)).isoformat()
+        summary = get_window_summary(conn, start, end)
+        expected = _sql_window(conn, start, end)
+
+        assert set(summary['categories']) == set(expected)
+        for name, (total, count) in expected.items():
+            assert summary['categories'][name]['total'] == pytest.approx(total)
+            assert summary['categories'][name]['count'] == count
+
+def test_retroactive_and_incremental_inserts_keep_prefixes_consistent():
+    index = CategoryPrefixIndex()
+    index.category_names = {1: 'Lazer'}
+    for ordinal, amount in ((10, 5.0), (30, 7.0), (20, 11.0), (5, 2.0), (30, 1.0)):
+        index.add('expense', 1, ordinal, amount)
+
+    assert index.series[('expense', 1)][0] == [5, 10, 20, 30]
+    window = index.window(date.fromordinal(6), date.fromordinal(31))
+    assert window['Lazer']['total'] == 24.0
+    assert window['Lazer']['count'] == 4
+
+def test_far_future_date_does_not_grow_the_index(conn, category_ids):
+    category_id = category_ids[('Lazer', 'expense')]
+    insert_transaction(conn, '2024-01-01', 'Cinema', 30, 'expense', category_id)
+    insert_transaction(conn, '9999-12-31', 'Data digitada errada', 10, 'expense', category_id)
+
+    index = get_time_index(conn)
+    days, amounts, counts = index.series[('expense', category_id)]
+    assert days == [date(2024, 1, 1).toordinal(), date(9999, 12, 31).toordinal()]
+    assert sys.getsizeof(amounts) < 1024
+
+    summary = get_window_summary(conn, '2024-01-01', '2024-02-01')
+    assert summary['total'] == 30
+
+def test_expense_analysis_uses_index_and_matches_sql(conn, category_ids):
+    _insert_random_expenses(conn, category_ids)
+    start_date = (date.today() - timedelta(days=30 * 6)).isoformat()
+
+    query = _CATEGORY_MONTHLY_STATS_QUERY.format(category="c.name",
+                                                 join="LEFT JOIN categories c ON t.category_id = c.id")
+    cursor = conn.execute(query, (start_date,))
+    columns = [column[0] for column in cursor.description]
+    expected = {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+    analysis = get_expense_analysis(conn)
+    assert analysis['status'] != 'insufficient_data'
+
+    stats = {row['category']: row for row in _category_monthly_stats(get_time_index(conn).monthly_totals(start_date))}
+    assert set(stats) == set(expected)
+    for category, row in expected.items():
+        for field in ('amount', 'monthly_avg', 'variance', 'max_month', 'min_month'):
+            assert stats[category][field] == pytest.approx(row[field])
+        for field in ('months', 'tx_count', 'window_months'):
+            assert stats[category][field] == row[field]
+
+def _rolling_total(conn):
+    return sum(window['total'] for window in get_rolling_comparison(conn, window_days=30, periods=2))
+
+def test_committed_insert_updates_the_index_without_rebuild(conn, category_ids, monkeypatch):
+    category_id = category_ids[('Lazer', 'expense')]
+    today = date.today().isoformat()
+    insert_transaction(conn, today, 'Cinema', 30, 'expense', category_id)
+    assert _rolling_total(conn) == 30
+
+    def fail_rebuild(*args):
+        raise AssertionError('reconstrução inesperada')
+    monkeypatch.setattr(CategoryPrefixIndex, 'rebuild', fail_rebuild)
+
+    insert_transaction(conn, today, 'Teatro', 45, 'expense', category_id)
+    assert time_index.version == get_index_version(conn)
+    assert _rolling_total(conn) == 75
+
+def test_rolled_back_insert_never_reaches_the_index(conn, category_ids):
+    category_id = category_ids[('Lazer', 'expense')]
+    today = date.today().isoformat()
+    insert_transaction(conn, today, 'Cinema', 30, 'expense', category_id)
+    assert _rolling_total(conn) == 30
+
+    insert_transaction(conn, today, 'Desfeita', 500, 'expense', category_id, commit=False)
+    conn.rollback()
+
+    # A próxima escrita confirmada recebe a mesma versão que a desfeita teria
+    insert_transaction(conn, today, 'Teatro', 45, 'expense', category_id)
+    assert _rolling_total(conn) == 75
+    assert _rolling_total(conn) == _sql_window(conn, (date.today() - timedelta(days=59)).isoformat(),
+                                               (date.today() + timedelta(days=1)).isoformat())['Lazer'][0]
+
+def test_failed_sync_item_is_not_added_to_the_index(conn, category_ids):
+    category_id = category_ids[('Lazer', 'expense')]
+    today = date.today().isoformat()
+    insert_transaction(conn, today, 'Cinema', 30, 'expense', category_id)
+    assert _rolling_total(conn) == 30
+
+    def insert(conn, date, description, amount, type, category_id=None, commit=True):
+        transaction_id = insert_transaction(conn, date, description, amount, type, category_id, commit=commit)
+        if description == 'falha':
+            # Falha do banco depois da gravação: o item é desfeito pelo savepoint
+            conn.execute('INSERT INTO sync_idempotency_keys (key) VALUES (NULL)')
+        return transaction_id
+
+    items = [{'idempotency_key': key, 'date': today, 'description': description, 'amount': amount,
+              'type': 'expense', 'category_id': category_id}
+             for key, description, amount in (('a', 'ok', 10), ('b', 'falha', 500), ('c', 'ok', 20))]
+    results = apply_transaction_batch(conn, items, insert)
+
+    assert [result['status'] for result in results] == ['created', 'error', 'created']
+    assert time_index.version == get_index_version(conn)
+    assert _rolling_total(conn) == 60
+
+def test_rolling_route_bounds_window_and_periods(db_path):
+    import app as app_module
+    from time_index import MAX_ROLLING_PERIODS, MAX_ROLLING_WINDOW_DAYS
+
+    client = app_module.app.test_client()
+    response = client.get('/api/analysis/rolling?window=100000000&periods=100000000')
+    assert response.status_code == 200
+    assert len(response.json) == MAX_ROLLING_PERIODS
+    last = response.json[-1]
+    assert (date.fromisoformat(last['end']) - date.fromisoformat(last['start'])).days == MAX_ROLLING_WINDOW_DAYS
+
+    assert client.get('/api/analysis/rolling?end=0001-03-01').status_code == 400
+    assert client.get('/api/analysis/rolling?periods=0').status_code == 400
+    assert client.get('/api/analysis/rolling?window=abc').status_code == 400
@@ -0,0 +1,98 @@
+"""Testes da listagem paginada por cursor (transaction_query e /api/transactions)"""
+import json
+
+import pytest
+
+from transaction_query import decode_cursor, encode_cursor, iter_transactions, list_transactions, parse_filters
+
+def _insert(conn, rows):
+    conn.executemany("INSERT INTO transactions (date, description, amount, type) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+
+def _sample(count, dates=('2024-01-01', '2024-01-02', '2024-01-03')):
+    # Várias transações na mesma data: a ordem é desempatada pelo id
+    return [(dates[index % len(dates)], f'Compra {index}', 10 + index, 'expense') for index in range(count)]
+
+def _all_pages(conn, args):
+    seen = []
+    args = dict(args)
+    while True:
+        rows, next_cursor = list_transactions(conn, parse_filters(args))
+        seen.extend(rows)
+        if not next_cursor:
+            return seen
+        args['cursor'] = next_cursor
+
+@pytest.mark.parametrize('order', ['desc', 'asc'])
+def test_pages_cover_every_row_once_in_order(conn, order):
+    _insert(conn, _sample(23))
+
+    rows = _all_pages(conn, {'limit': '5', 'order': order})
+    keys = [(row['date'], row['id']) for row in rows]
+
+    assert len(keys) == 23 == len(set(keys))
+    assert keys == sorted(keys, reverse=(order == 'desc'))
+
+def test_rows_inserted_between_pages_do_not_shift_the_next_page(conn):
+    _insert(conn, _sample(10))
+    first, next_cursor = list_transactions(conn, parse_filters({'limit': '4'}))
+
+    # Uma nova transação mais recente (com OFFSET, deslocaria a página seguinte)
+    _insert(conn, [('2024-02-01', 'Nova', 5, 'expense')])
+    second, _ = list_transactions(conn, parse_filters({'limit': '4', 'cursor': next_cursor}))
+
+    assert not {row['id'] for row in first} & {row['id'] for row in second}
+    assert (second[0]['date'], second[0]['id']) < (first[-1]['date'], first[-1]['id'])
+
+def test_filters_apply_to_every_page(conn):
+    _insert(conn, _sample(30) + [('2024-01-02', '100%_real', 1, 'income')])
+
+    rows = _all_pages(conn, {'limit': '3', 'start': '2024-01-02', 'end': '2024-01-03', 'min_amount': '15'})
+    assert rows and all(row['date'] == '2024-01-02' and row['amount'] >= 15 for row in rows)
+
+    # Curingas do LIKE são tratados como texto
+    assert [row['description'] for row in _all_pages(conn, {'q': '%_'})] == ['100%_real']
+
+def test_export_streams_from_the_cursor(conn):
+    _insert(conn, _sample(12))
+    _, next_cursor = list_transactions(conn, parse_filters({'limit': '5'}))
+
+    exported = list(iter_transactions(conn, parse_filters({'cursor': next_cursor}), batch_size=3))
+    assert [row['id'] for row in exported] == [row['id'] for row in _all_pages(conn, {'limit': '5'})[5:]]
+
+    limited = list(iter_transactions(conn, parse_filters({'limit': '4'}), batch_size=3))
+    assert len(limited) == 4
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor('2024-01-02', 7)) == ('2024-01-02', 7)
+
+@pytest.mark.parametrize('cursor', ['###', 'e30', encode_cursor('2024-01-01', 1)[:-2],
+                                    'WyIyMDI0LTAxLTAxIiwgdHJ1ZV0', 'WyIyMDI0LTAxLTAxIiwgIjEiXQ'])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+@pytest.mark.parametrize('args', [{'type': 'other'}, {'start': '2024-13-01'}, {'limit': '0'}, {'limit': 'x'},
+                                  {'order': 'sideways'}, {'min_amount': 'abc'}, {'max_amount': 'nan'},
+                                  {'min_amount': 'inf'}, {'account': '1'}])
+def test_invalid_filters_are_rejected(args):
+    with pytest.raises(ValueError):
+        parse_filters(args)
+
+def test_route_returns_next_cursor_headers_and_400s(db_path, conn):
+    import app as app_module
+
+    _insert(conn, _sample(7))
+    client = app_module.app.test_client()
+
+    first = client.get('/api/transactions?limit=5')
+    assert first.status_code == 200 and len(first.json) == 5
+    second = client.get(f"/api/transactions?limit=5&cursor={first.headers['X-Next-Cursor']}")
+    assert len(second.json) == 2 and 'X-Next-Cursor' not in second.headers
+    assert 'rel="next"' in first.headers['Link']
+
+    ndjson = client.get('/api/transactions?format=ndjson')
+    assert len([json.loads(line) for line in ndjson.data.splitlines()]) == 7
+
+    assert client.get('/api/transactions?cursor=invalido').status_code == 400
+    assert client.get('/api/transactions?min_amount=nan').status_code == 400
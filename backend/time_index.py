@@ -0,0 +1,271 @@
+import threading
+from bisect import bisect_left
+from datetime import datetime, date, timedelta
+
+from analysis_cache import get_data_versions
+
+# Tabelas das quais o índice depende (uma escrita externa força reconstrução)
+INDEX_SCOPES = ('transactions', 'categories')
+
+# Limites da comparação de janelas (tamanho em dias e número de janelas)
+MAX_ROLLING_WINDOW_DAYS = 366
+MAX_ROLLING_PERIODS = 60
+
+def _to_ordinal(value):
+    """Converte 'YYYY-MM-DD' (ou date/datetime) para o número ordinal do dia"""
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').toordinal()
+
+class CategoryPrefixIndex:
+    """
+    Somas acumuladas diárias por (tipo, categoria).
+
+    Cada série guarda apenas os dias com dados, em ordem, com o total e a
+    contagem acumulados até cada um deles. O total de qualquer janela
+    [início, fim) é a diferença de dois prefixos localizados por busca
+    binária, então uma consulta custa O(categorias · log dias) independentemente
+    do número de transações no período, e a memória é proporcional aos dias
+    com lançamentos (uma data isolada muito distante ocupa uma única entrada).
+    Anexar uma transação no último dia (o caso comum) é O(1); lançamentos
+    retroativos atualizam os prefixos seguintes da série.
+    """
+
+    def __init__(self):
+        self.series = {}
+        self.category_names = {}
+        self.version = None
+        self.lock = threading.RLock()
+
+    def add(self, type, category_id, ordinal, amount, count=1):
+        """Acrescenta valores ao dia informado da série (tipo, categoria)"""
+        with self.lock:
+            days, amounts, counts = self.series.setdefault((type, category_id), ([], [], []))
+            i = bisect_left(days, ordinal)
+            if i == len(days) or days[i] != ordinal:
+                days.insert(i, ordinal)
+                amounts.insert(i, amounts[i - 1] if i else 0.0)
+                counts.insert(i, counts[i - 1] if i else 0)
+            for j in range(i, len(days)):
+                amounts[j] += amount
+                counts[j] += count
+
+    @staticmethod
+    def _prefix(days, values, ordinal):
+        """Valor acumulado até o dia anterior a `ordinal` (inclusive)"""
+        i = bisect_left(days, ordinal)
+        return values[i - 1] if i else 0
+
+    def window(self, start, end, type='expense'):
+        """
+        Totais por categoria na janela [start, end).
+
+        Returns:
+            Dicionário {categoria: {'total', 'count', 'mean', 'daily_avg'}}
+        """
+        start_ordinal = _to_ordinal(start)
+        end_ordinal = _to_ordinal(end)
+        days = max(end_ordinal - start_ordinal, 0)
+
+        result = {}
+        with self.lock:
+            if days == 0:
+                return result
+
+            for (series_type, category_id), (series_days, amounts, counts) in self.series.items():
+                if series_type != type:
+                    continue
+
+                total = (self._prefix(series_days, amounts, end_ordinal)
+                         - self._prefix(series_days, amounts, start_ordinal))
+                count = (self._prefix(series_days, counts, end_ordinal)
+                         - self._prefix(series_days, counts, start_ordinal))
+                if count == 0:
+                    continue
+
+                name = self.category_names.get(category_id, 'Sem categoria')
+                entry = result.setdefault(name, {'total': 0.0, 'count': 0})
+                entry['total'] += total
+                entry['count'] += count
+
+        for entry in result.values():
+            entry['mean'] = entry['total'] / entry['count']
+            entry['daily_avg'] = entry['total'] / days
+        return result
+
+    def monthly_totals(self, start, type='expense'):
+        """
+        Totais e contagens por categoria e mês a partir de `start` (inclusive),
+        incluindo meses futuros com lançamentos agendados. Percorre apenas os
+        dias com dados a partir de `start`.
+
+        Returns:
+            Dicionário {categoria: {'YYYY-MM': (total, contagem)}}; séries sem
+            categoria cadastrada são omitidas
+        """
+        start_ordinal = _to_ordinal(start)
+        result = {}
+        with self.lock:
+            for (series_type, category_id), (days, amounts, counts) in self.series.items():
+                if series_type != type or category_id not in self.category_names:
+                    continue
+
+                first = bisect_left(days, start_ordinal)
+                if first == len(days):
+                    continue
+
+                months = result.setdefault(self.category_names[category_id], {})
+                for i in range(first, len(days)):
+                    # Valores do dia: diferença entre prefixos consecutivos
+                    amount = amounts[i] - (amounts[i - 1] if i else 0.0)
+                    count = counts[i] - (counts[i - 1] if i else 0)
+                    month = date.fromordinal(days[i]).strftime('%Y-%m')
+                    month_total, month_count = months.get(month, (0.0, 0))
+                    months[month] = (month_total + amount, month_count + count)
+        return result
+
+    def rebuild(self, conn, version):
+        """Reconstrói o índice a partir de um GROUP BY por (tipo, categoria, dia)"""
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, name FROM categories')
+        category_names = {category_id: name for category_id, name in cursor.fetchall()}
+
+        cursor.execute('''
+            SELECT type, category_id, date(date) AS day, SUM(amount), COUNT(*)
+            FROM transactions
+            WHERE date(date) IS NOT NULL
+            GROUP BY type, category_id, day
+            ORDER BY day
+        ''')
+        rows = cursor.fetchall()
+
+        with self.lock:
+            self.series = {}
+            self.category_names = category_names
+            for type, category_id, day, amount, count in rows:
+                self.add(type, category_id, _to_ordinal(day), amount, count)
+            self.version = version
+
+# Índice do processo, reconstruído sob demanda quando os dados mudam por fora
+time_index = CategoryPrefixIndex()
+
+def get_index_version(conn, versions=None):
+    """Versão dos dados da qual o índice depende (a partir de get_data_versions, se já lidas)"""
+    if versions is None:
+        versions = get_data_versions(conn)
+    return tuple(versions.get(scope, 0) for scope in INDEX_SCOPES)
+
+def get_time_index(conn):
+    """Retorna o índice de prefixos atualizado com o estado atual do banco"""
+    version = get_index_version(conn)
+    if time_index.version != version:
+        time_index.rebuild(conn, version)
+    return time_index
+
+# Transações gravadas na transação em andamento de cada thread, aplicadas ao índice após o commit
+_pending = threading.local()
+
+def defer_transaction(conn, version_before, date, type, category_id, amount):
+    """
+    Agenda a inclusão de uma transação recém-gravada no índice (sem reconstruí-lo),
+    feita por flush_index depois do commit: uma escrita desfeita por rollback
+    nunca chega ao índice do processo.
+
+    Args:
+        conn: Conexão da escrita (ainda não confirmada)
+        version_before: Versão do índice antes da escrita (get_index_version)
+    """
+    deltas = getattr(_pending, 'deltas', [])
+    # Uma cadeia de versões interrompida indica escritas desfeitas sem discard_index
+    if deltas and deltas[-1][1] != version_before:
+        deltas = []
+    deltas.append((version_before, get_index_version(conn), date, type, category_id, amount))
+    _pending.deltas = deltas
+
+def flush_index():
+    """
+    Aplica as transações agendadas pelo thread atual (chamar após o commit).
+
+    Cada uma só é aplicada se o índice refletia exatamente o estado anterior
+    a ela; caso contrário ele será reconstruído na próxima leitura.
+    """
+    deltas = getattr(_pending, 'deltas', None)
+    if not deltas:
+        return
+    _pending.deltas = []
+
+    with time_index.lock:
+        for version_before, version_after, date, type, category_id, amount in deltas:
+            if time_index.version is None or time_index.version != version_before:
+                continue
+            try:
+                ordinal = _to_ordinal(date)
+            except ValueError:
+                # Data fora do formato do índice: a reconstrução decide como tratá-la
+                time_index.version = None
+                continue
+            time_index.add(type, category_id, ordinal, amount)
+            time_index.version = version_after
+
+def discard_index(keep=0):
+    """
+    Descarta as transações agendadas pelo thread atual (chamar após o rollback).
+
+    Args:
+        keep: Transações agendadas antes do savepoint desfeito, que são mantidas
+            (ver pending_index_count)
+    """
+    _pending.deltas = getattr(_pending, 'deltas', [])[:keep]
+
+def pending_index_count():
+    """Número de transações agendadas pelo thread atual e ainda não aplicadas ao índice"""
+    return len(getattr(_pending, 'deltas', ()))
+
+def get_window_summary(conn, start, end, type='expense'):
+    """
+    Totais, contagens e médias por categoria em uma janela arbitrária [start, end).
+
+    Args:
+        conn: Conexão com o banco de dados
+        start: Data inicial (inclusiva, 'YYYY-MM-DD')
+        end: Data final (exclusiva, 'YYYY-MM-DD')
+        type: 'expense' ou 'income'
+
+    Returns:
+        Dicionário com a janela, os totais por categoria e o total geral
+    """
+    categories = get_time_index(conn).window(start, end, type)
+    return {
+        'start': str(start)[:10],
+        'end': str(end)[:10],
+        'type': type,
+        'categories': categories,
+        'total': sum(entry['total'] for entry in categories.values()),
+        'count': sum(entry['count'] for entry in categories.values())
+    }
+
+def get_rolling_comparison(conn, window_days=30, periods=6, end=None, type='expense'):
+    """
+    Compara janelas consecutivas de mesmo tamanho terminando em `end` (padrão: amanhã,
+    para incluir o dia de hoje). Cada janela custa O(categorias).
+
+    Returns:
+        Lista de resumos de janela, da mais antiga para a mais recente
+    """
+    end_date = datetime.strptime(end[:10], '%Y-%m-%d').date() if end else date.today() + timedelta(days=1)
+    index = get_time_index(conn)
+
+    windows = []
+    for period in range(periods - 1, -1, -1):
+        window_end = end_date - timedelta(days=window_days * period)
+        window_start = window_end - timedelta(days=window_days)
+        categories = index.window(window_start, window_end, type)
+        windows.append({
+            'start': window_start.strftime('%Y-%m-%d'),
+            'end': window_end.strftime('%Y-%m-%d'),
+            'categories': categories,
+            'total': sum(entry['total'] for entry in categories.values())
+        })
+    return windows
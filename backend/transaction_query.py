@@ -0,0 +1,250 @@
+import base64
+import json
+import math
+from datetime import datetime
+
+# Tamanho padrão e máximo de uma página
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Linhas lidas por consulta ao exportar em NDJSON
+EXPORT_BATCH_SIZE = 500
+
+# Origens paginadas: tabela, colunas da ordenação e dos filtros e colunas retornadas
+TRANSACTION_SOURCES = {
+    'transactions': {
+        'table': 'transactions',
+        'date_column': 'date',
+        'type_column': 'type',
+        'types': ('income', 'expense'),
+        'account_column': None,
+        'columns': ('id', 'date', 'description', 'amount', 'type', 'category_id')
+    },
+    'bank_transactions': {
+        'table': 'bank_transactions',
+        'date_column': 'transaction_date',
+        'type_column': 'transaction_type',
+        'types': ('deposit', 'withdrawal', 'transfer'),
+        'account_column': 'account_id',
+        'columns': ('id', 'account_id', 'transaction_type', 'amount', 'description', 'transaction_date',
+                    'destination_account_id', 'category_id', 'transaction_reference', 'import_method')
+    }
+}
+
+def init_transaction_indexes(cursor, has_bank_transactions=True):
+    """Índices da paginação por (data, id), inclusive por conta nas transações bancárias"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_date_id ON transactions (date, id)')
+    if has_bank_transactions:
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bank_transactions_date_id ON bank_transactions (transaction_date, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bank_transactions_account_date_id '
+                       'ON bank_transactions (account_id, transaction_date, id)')
+
+def encode_cursor(date, row_id):
+    """Cursor opaco da próxima página (data e id da última linha retornada)"""
+    return base64.urlsafe_b64encode(json.dumps([date, row_id]).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Decodifica um cursor de encode_cursor (ValueError se inválido)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("Cursor inválido")
+    if not isinstance(date, str) or not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError("Cursor inválido")
+    return date, row_id
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Parâmetro '{name}' inválido. Use o formato YYYY-MM-DD")
+
+def _parse_amount(value, name):
+    try:
+        amount = float(value)
+    except ValueError:
+        raise ValueError(f"Parâmetro '{name}' inválido")
+    # NaN e infinito seriam aceitos por float() e filtrariam tudo (ou nada) sem aviso
+    if not math.isfinite(amount):
+        raise ValueError(f"Parâmetro '{name}' inválido")
+    return amount
+
+def parse_filters(args, source='transactions'):
+    """
+    Valida os filtros da listagem a partir dos parâmetros da requisição.
+
+    Parâmetros aceitos: type, category (id ou nome), account (só transações
+    bancárias), start e end (intervalo [start, end), YYYY-MM-DD), min_amount,
+    max_amount, q (trecho da descrição), order (desc ou asc), limit e cursor.
+
+    Returns:
+        Dicionário de filtros para list_transactions/iter_transactions
+
+    Raises:
+        ValueError: Parâmetro inválido (mensagem para o cliente)
+    """
+    spec = TRANSACTION_SOURCES[source]
+    filters = {}
+
+    if args.get('type'):
+        if args['type'] not in spec['types']:
+            raise ValueError(f"Parâmetro 'type' inválido. Valores aceitos: {', '.join(spec['types'])}")
+        filters['type'] = args['type']
+
+    if args.get('category'):
+        category = args['category'].strip()
+        filters['category'] = int(category) if category.isdigit() else category
+
+    if args.get('account'):
+        if spec['account_column'] is None:
+            raise ValueError("Parâmetro 'account' disponível apenas em /api/bank-transactions")
+        if not args['account'].isdigit():
+            raise ValueError("Parâmetro 'account' inválido")
+        filters['account'] = int(args['account'])
+
+    if args.get('start'):
+        filters['start'] = _parse_date(args['start'], 'start')
+    if args.get('end'):
+        filters['end'] = _parse_date(args['end'], 'end')
+
+    if args.get('min_amount'):
+        filters['min_amount'] = _parse_amount(args['min_amount'], 'min_amount')
+    if args.get('max_amount'):
+        filters['max_amount'] = _parse_amount(args['max_amount'], 'max_amount')
+
+    if args.get('q'):
+        filters['q'] = args['q']
+
+    order = args.get('order', 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("Parâmetro 'order' inválido. Valores aceitos: asc, desc")
+    filters['order'] = order
+
+    if args.get('limit'):
+        try:
+            limit = int(args['limit'])
+        except ValueError:
+            raise ValueError("Parâmetro 'limit' inválido")
+        if limit <= 0:
+            raise ValueError("Parâmetro 'limit' deve ser positivo")
+        filters['limit'] = min(limit, MAX_PAGE_SIZE)
+
+    if args.get('cursor'):
+        filters['cursor'] = decode_cursor(args['cursor'])
+
+    return filters
+
+def _build_query(spec, filters, after, limit):
+    table = spec['table']
+    date_column = f"t.{spec['date_column']}"
+    columns = ', '.join(f't.{column}' for column in spec['columns'])
+
+    conditions = []
+    params = []
+    if 'type' in filters:
+        conditions.append(f"t.{spec['type_column']} = ?")
+        params.append(filters['type'])
+    if 'category' in filters:
+        if isinstance(filters['category'], int):
+            conditions.append('t.category_id = ?')
+        else:
+            conditions.append('t.category_id IN (SELECT id FROM categories WHERE name = ?)')
+        params.append(filters['category'])
+    if 'account' in filters:
+        conditions.append(f"t.{spec['account_column']} = ?")
+        params.append(filters['account'])
+    if 'start' in filters:
+        conditions.append(f'{date_column} >= ?')
+        params.append(filters['start'])
+    if 'end' in filters:
+        conditions.append(f'{date_column} < ?')
+        params.append(filters['end'])
+    if 'min_amount' in filters:
+        conditions.append('t.amount >= ?')
+        params.append(filters['min_amount'])
+    if 'max_amount' in filters:
+        conditions.append('t.amount <= ?')
+        params.append(filters['max_amount'])
+    if 'q' in filters:
+        conditions.append("t.description LIKE ? ESCAPE '\\'")
+        escaped = filters['q'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        params.append(f'%{escaped}%')
+
+    # Keyset: continua a partir da última linha da página anterior, pelo índice (data, id)
+    descending = filters.get('order', 'desc') == 'desc'
+    if after is not None:
+        conditions.append(f"({date_column}, t.id) {'<' if descending else '>'} (?, ?)")
+        params.extend(after)
+
+    direction = 'DESC' if descending else 'ASC'
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    query = f'''
+        SELECT {columns}, c.name
+        FROM {table} t
+        LEFT JOIN categories c ON c.id = t.category_id
+        {where}
+        ORDER BY {date_column} {direction}, t.id {direction}
+        LIMIT ?
+    '''
+    params.append(limit)
+    return query, params
+
+def _fetch(conn, spec, filters, after, limit):
+    query, params = _build_query(spec, filters, after, limit)
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    rows = []
+    for row in cursor.fetchall():
+        item = dict(zip(spec['columns'], row))
+        item['category'] = row[-1]
+        rows.append(item)
+    return rows
+
+def list_transactions(conn, filters, source='transactions'):
+    """
+    Retorna uma página de transações em ordem de (data, id), sem OFFSET: o
+    custo de cada página não depende de quantas vieram antes.
+
+    Args:
+        conn: Conexão com o banco
+        filters: Resultado de parse_filters
+        source: 'transactions' ou 'bank_transactions'
+
+    Returns:
+        Tupla (linhas da página, cursor da próxima página ou None)
+    """
+    spec = TRANSACTION_SOURCES[source]
+    limit = filters.get('limit', DEFAULT_PAGE_SIZE)
+
+    # Uma linha a mais indica se existe próxima página
+    rows = _fetch(conn, spec, filters, filters.get('cursor'), limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[spec['date_column']], last['id'])
+    return rows, next_cursor
+
+def iter_transactions(conn, filters, source='transactions', batch_size=EXPORT_BATCH_SIZE):
+    """
+    Percorre todas as transações que atendem aos filtros (a partir do cursor,
+    se houver) em lotes pelo mesmo keyset, para exportação em streaming.
+
+    Yields:
+        Uma transação (dicionário) por vez
+    """
+    spec = TRANSACTION_SOURCES[source]
+    after = filters.get('cursor')
+    remaining = filters.get('limit')
+    while True:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        rows = _fetch(conn, spec, filters, after, size)
+        yield from rows
+        if remaining is not None:
+            remaining -= len(rows)
+            if remaining <= 0:
+                return
+        if len(rows) < size:
+            return
+        after = (rows[-1][spec['date_column']], rows[-1]['id'])
@@ -5,22 +5,50 @@ function Alerts() {
   const [alerts, setAlerts] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [streamKey, setStreamKey] = useState(0);
 
   useEffect(() => {
-    fetchAlerts();
-  }, []);
+    // Os alertas chegam pelo servidor (Server-Sent Events), sem consultas periódicas
+    let source = null;
 
-  const fetchAlerts = async () => {
-    try {
-      setLoading(true);
-      const response = await axios.get('/api/alertas');
-      setAlerts(response.data);
-      setLoading(false);
-    } catch (err) {
-      console.error('Erro ao buscar alertas:', err);
-      setError('Erro ao buscar alertas. Verifique se o servidor está rodando.');
-      setLoading(false);
-    }
+    const connect = () => {
+      source = new EventSource('/api/alerts/stream');
+
+      source.addEventListener('alert', (event) => {
+        const alert = JSON.parse(event.data);
+        setAlerts(current => [alert, ...current.filter(item => item.id !== alert.id)]);
+      });
+
+      source.addEventListener('ready', () => {
+        setError(null);
+        setLoading(false);
+      });
+
+      // Fila do cliente descartada no servidor: reconectar recarrega os alertas não lidos
+      source.addEventListener('resync', () => {
+        source.close();
+        setAlerts([]);
+        connect();
+      });
+
+      source.onerror = () => {
+        // O navegador reconecta sozinho e envia o Last-Event-ID recebido
+        if (source.readyState === EventSource.CLOSED) {
+          setError('Erro ao buscar alertas. Verifique se o servidor está rodando.');
+          setLoading(false);
+        }
+      };
+    };
+
+    connect();
+    return () => source && source.close();
+  }, [streamKey]);
+
+  // Reabre o canal: recebe novamente os alertas não lidos
+  const fetchAlerts = () => {
+    setAlerts([]);
+    setLoading(true);
+    setStreamKey(key => key + 1);
   };
 
   const markAsRead = async (alertId) => {
@@ -3,6 +3,27 @@ import ReactDOM from 'react-dom/client';
 import 'bootstrap/dist/css/bootstrap.min.css';  // Importação do CSS do Bootstrap
 import './index.css';
 import App from './App';
+import axios from 'axios';
+
+// Sessão do agente financeiro: criada pelo backend na primeira resposta
+// (cabeçalho X-Session-Id) e reenviada nas requisições seguintes da aba
+const SESSION_STORAGE_KEY = 'financeAgentSessionId';
+
+axios.interceptors.request.use((config) => {
+  const sessionId = sessionStorage.getItem(SESSION_STORAGE_KEY);
+  if (sessionId) {
+    config.headers['X-Session-Id'] = sessionId;
+  }
+  return config;
+});
+
+axios.interceptors.response.use((response) => {
+  const sessionId = response.headers['x-session-id'];
+  if (sessionId) {
+    sessionStorage.setItem(SESSION_STORAGE_KEY, sessionId);
+  }
+  return response;
+});
 
 const root = ReactDOM.createRoot(document.getElementById('root'));
 root.render(
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useMemo, useRef } from 'react';
 import {
   SafeAreaView,
   ScrollView,
@@ -12,6 +12,7 @@ import {
   FlatList
 } from 'react-native';
 import { Picker } from '@react-native-picker/picker';
+import AsyncStorage from '@react-native-async-storage/async-storage';
 
 // Definição do tipo de transação
 interface Transaction {
@@ -29,13 +30,45 @@ interface Summary {
   balance: number;
 }
 
+// Transação criada no aparelho, ainda não confirmada pelo servidor
+interface PendingTransaction {
+  idempotency_key: string;
+  date: string;
+  description: string;
+  amount: number;
+  type: 'income' | 'expense';
+}
+
+// Transação recusada pelo servidor: não é reenviada, fica visível para o usuário
+interface FailedTransaction extends PendingTransaction {
+  error: string;
+}
+
+// Resultado de cada item em /api/sync/transactions
+interface SyncResult {
+  idempotency_key: string;
+  status: 'created' | 'duplicate' | 'error';
+  error?: string;
+}
+
+// Alterações de uma tabela retornadas por /api/sync
+interface TableChanges<T> {
+  inserted: T[];
+  updated: T[];
+  deleted: number[];
+}
+
+// Chaves do AsyncStorage: a fila sobrevive ao fechamento do app
+const PENDING_STORAGE_KEY = 'sync:pending';
+const FAILED_STORAGE_KEY = 'sync:failed';
+
+const newIdempotencyKey = () =>
+  `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+
 const App = () => {
   const [transactions, setTransactions] = useState<Transaction[]>([]);
-  const [summary, setSummary] = useState<Summary>({
-    total_income: 0,
-    total_expense: 0,
-    balance: 0
-  });
+  const [pending, setPending] = useState<PendingTransaction[]>([]);
+  const [failed, setFailed] = useState<FailedTransaction[]>([]);
   const [newTransaction, setNewTransaction] = useState({
     date: new Date().toISOString().split('T')[0],
     description: '',
@@ -44,33 +77,139 @@ const App = () => {
   });
   const [isLoading, setIsLoading] = useState(true);
 
+  // Token da última sincronização: o servidor envia apenas o que mudou depois dele
+  const syncToken = useRef(0);
+  // A fila só é gravada depois de carregada, para não sobrescrever a salva com a vazia
+  const queueLoaded = useRef(false);
+
   // URL do backend - substitua pelo seu IP quando estiver testando localmente
   const API_URL = 'http://10.0.2.2:5000'; // Funciona para emuladores Android 
   // const API_URL = 'http://localhost:5000'; // Opção para iOS
 
   useEffect(() => {
-    fetchData();
+    const loadQueue = async () => {
+      let queue: PendingTransaction[] = [];
+      try {
+        const [storedPending, storedFailed] = await Promise.all([
+          AsyncStorage.getItem(PENDING_STORAGE_KEY),
+          AsyncStorage.getItem(FAILED_STORAGE_KEY)
+        ]);
+        queue = storedPending ? JSON.parse(storedPending) : [];
+        setPending(queue);
+        setFailed(storedFailed ? JSON.parse(storedFailed) : []);
+      } catch (error) {
+        console.error('Erro ao carregar a fila local:', error);
+      }
+      queueLoaded.current = true;
+      await fetchData(queue);
+    };
+    loadQueue();
   }, []);
 
-  const fetchData = async () => {
-    try {
-      setIsLoading(true);
-      // Buscar transações
-      const transactionsResponse = await fetch(`${API_URL}/api/transactions`);
-      const transactionsData = await transactionsResponse.json();
+  // Persistir a fila a cada alteração
+  useEffect(() => {
+    if (!queueLoaded.current) {
+      return;
+    }
+    AsyncStorage.multiSet([
+      [PENDING_STORAGE_KEY, JSON.stringify(pending)],
+      [FAILED_STORAGE_KEY, JSON.stringify(failed)]
+    ]).catch((error) => console.error('Erro ao salvar a fila local:', error));
+  }, [pending, failed]);
+
+  // Resumo calculado localmente a partir das transações sincronizadas
+  const summary = useMemo<Summary>(() => {
+    let total_income = 0;
+    let total_expense = 0;
+    for (const item of [...transactions, ...pending]) {
+      if (item.type === 'income') {
+        total_income += item.amount;
+      } else {
+        total_expense += item.amount;
+      }
+    }
+    return { total_income, total_expense, balance: total_income - total_expense };
+  }, [transactions, pending]);
+
+  const applyChanges = (current: Transaction[], changes?: TableChanges<Transaction>) => {
+    if (!changes) {
+      return current;
+    }
+    const byId = new Map(current.map((item) => [item.id, item]));
+    for (const item of [...changes.inserted, ...changes.updated]) {
+      byId.set(item.id, item);
+    }
+    for (const id of changes.deleted) {
+      byId.delete(id);
+    }
+    return Array.from(byId.values()).sort((a, b) =>
+      a.date === b.date ? b.id - a.id : b.date.localeCompare(a.date)
+    );
+  };
+
+  // Envia as transações criadas offline; reenvios não duplicam (chave de idempotência).
+  // Falhas de rede ou do servidor mantêm a fila para a próxima sincronização; itens
+  // recusados pelo servidor saem da fila e vão para a lista de falhas.
+  const pushPending = async (queue: PendingTransaction[]) => {
+    if (queue.length === 0) {
+      return;
+    }
+    const response = await fetch(`${API_URL}/api/sync/transactions`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({ transactions: queue })
+    });
+    if (!response.ok) {
+      throw new Error(`Falha ao enviar transações: ${response.status}`);
+    }
+    const data: { results: SyncResult[] } = await response.json();
+    const results = new Map(data.results.map((result) => [result.idempotency_key, result]));
+    const rejected = queue
+      .filter((item) => results.get(item.idempotency_key)?.status === 'error')
+      .map((item) => ({
+        ...item,
+        error: results.get(item.idempotency_key)?.error || 'Transação recusada pelo servidor'
+      }));
+    setPending((current) => current.filter((item) => !results.has(item.idempotency_key)));
+    if (rejected.length > 0) {
+      setFailed((current) => [...current, ...rejected]);
+    }
+  };
 
-      // Buscar resumo
-      const summaryResponse = await fetch(`${API_URL}/api/summary`);
-      const summaryData = await summaryResponse.json();
+  const dismissFailed = (idempotencyKey: string) => {
+    setFailed((current) => current.filter((item) => item.idempotency_key !== idempotencyKey));
+  };
 
-      setTransactions(transactionsData);
-      setSummary(summaryData);
+  // Busca apenas as alterações desde o último token
+  const pullChanges = async () => {
+    let hasMore = true;
+    while (hasMore) {
+      const response = await fetch(`${API_URL}/api/sync?since=${syncToken.current}`);
+      const data = await response.json();
+      if (data.reset) {
+        // O histórico do servidor não cobre mais o token: recarregar tudo
+        syncToken.current = 0;
+        setTransactions([]);
+        continue;
+      }
+      setTransactions((current) => applyChanges(current, data.changes.transactions));
+      syncToken.current = data.sync_token;
+      hasMore = data.has_more;
+    }
+  };
+
+  const fetchData = async (queue: PendingTransaction[] = pending) => {
+    try {
+      await pushPending(queue);
+      await pullChanges();
       setIsLoading(false);
     } catch (error) {
-      console.error('Erro ao buscar dados:', error);
+      console.error('Erro ao sincronizar dados:', error);
       Alert.alert(
         'Erro',
-        'Não foi possível conectar ao servidor. Verifique se o backend está rodando.'
+        'Não foi possível conectar ao servidor. As transações novas serão enviadas na próxima sincronização.'
       );
       setIsLoading(false);
     }
@@ -82,38 +221,27 @@ const App = () => {
       return;
     }
 
-    try {
-      const response = await fetch(`${API_URL}/api/transactions`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({
-          date: newTransaction.date,
-          description: newTransaction.description,
-          amount: parseFloat(newTransaction.amount),
-          type: newTransaction.type
-        })
-      });
-
-      if (response.ok) {
-        // Limpar campos
-        setNewTransaction({
-          date: new Date().toISOString().split('T')[0],
-          description: '',
-          amount: '',
-          type: 'expense'
-        });
-        // Recarregar dados
-        fetchData();
-        Alert.alert('Sucesso', 'Transação adicionada com sucesso');
-      } else {
-        Alert.alert('Erro', 'Não foi possível adicionar a transação');
-      }
-    } catch (error) {
-      console.error('Erro ao adicionar transação:', error);
-      Alert.alert('Erro', 'Não foi possível conectar ao servidor');
-    }
+    // A transação entra na fila local e aparece no resumo mesmo sem conexão
+    const item: PendingTransaction = {
+      idempotency_key: newIdempotencyKey(),
+      date: newTransaction.date,
+      description: newTransaction.description,
+      amount: parseFloat(newTransaction.amount),
+      type: newTransaction.type as 'income' | 'expense'
+    };
+    const queue = [...pending, item];
+    setPending(queue);
+
+    // Limpar campos
+    setNewTransaction({
+      date: new Date().toISOString().split('T')[0],
+      description: '',
+      amount: '',
+      type: 'expense'
+    });
+
+    // Enviar a fila e receber somente o que mudou
+    await fetchData(queue);
   };
 
   const formatCurrency = (value: number) => {
@@ -203,14 +331,32 @@ const App = () => {
           </TouchableOpacity>
         </View>
 
+        {/* Transações recusadas pelo servidor */}
+        {failed.length > 0 && (
+          <View style={styles.failedContainer}>
+            <Text style={styles.sectionTitle}>Transações não enviadas</Text>
+            {failed.map((item) => (
+              <View key={item.idempotency_key} style={styles.failedCard}>
+                <Text style={styles.transactionDescription}>
+                  {item.description} - {formatCurrency(item.amount)}
+                </Text>
+                <Text style={styles.failedError}>{item.error}</Text>
+                <TouchableOpacity onPress={() => dismissFailed(item.idempotency_key)}>
+                  <Text style={styles.dismissText}>Descartar</Text>
+                </TouchableOpacity>
+              </View>
+            ))}
+          </View>
+        )}
+
         {/* Lista de Transações */}
         <View style={styles.transactionsContainer}>
           <Text style={styles.sectionTitle}>Histórico de Transações</Text>
           {isLoading ? (
             <Text style={styles.loadingText}>Carregando transações...</Text>
-          ) : transactions.length > 0 ? (
+          ) : transactions.length + pending.length > 0 ? (
             <FlatList
-              data={transactions}
+              data={[...pending.map((item, index) => ({ ...item, id: -(index + 1) })), ...transactions]}
               renderItem={renderTransaction}
               keyExtractor={(item) => item.id.toString()}
               style={styles.transactionsList}
@@ -347,6 +493,32 @@ const styles = StyleSheet.create({
     shadowRadius: 4,
     elevation: 3,
   },
+  failedContainer: {
+    padding: 15,
+    backgroundColor: 'white',
+    margin: 10,
+    borderRadius: 8,
+    shadowColor: '#000',
+    shadowOffset: {width: 0, height: 2},
+    shadowOpacity: 0.1,
+    shadowRadius: 4,
+    elevation: 3,
+  },
+  failedCard: {
+    padding: 15,
+    borderRadius: 8,
+    marginBottom: 10,
+    backgroundColor: '#fff3cd',
+  },
+  failedError: {
+    fontSize: 14,
+    color: '#856404',
+    marginBottom: 5,
+  },
+  dismissText: {
+    color: '#007bff',
+    fontWeight: 'bold',
+  },
   loadingText: {
     textAlign: 'center',
     padding: 15,